@@ -6,6 +6,13 @@ import sys
 import os
 import threading
 import time
+import json
+import queue
+import asyncio
+import collections
+import re
+import abc
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
 import numpy as np
 from ctypes import *
 
@@ -18,6 +25,596 @@ from MvImport.CameraParams_header import *
 from MvImport.MvCameraControl_class import *
 
 
+def _decode_c_string(char_array):
+    """
+    将 SDK 结构体中以 0 结尾的 c_ubyte 数组解码为字符串
+
+    一次性按字节切片解码，替代逐字符 chr() 拼接。
+    """
+    return bytes(char_array).split(b'\x00', 1)[0].decode('utf-8', errors='ignore')
+
+
+def _ip_to_str(n_ip):
+    """将 32 位整数 IP 转换为点分十进制字符串"""
+    return f"{(n_ip >> 24) & 0xff}.{(n_ip >> 16) & 0xff}.{(n_ip >> 8) & 0xff}.{n_ip & 0xff}"
+
+
+def _frame_info_to_dict(st_frame_info):
+    """
+    将 MV_FRAME_OUT_INFO_EX 中常用字段提取为字典
+
+    返回:
+        dict: 帧元数据（帧号、时间戳、触发计数、Chunk 信息等）
+    """
+    return {
+        'frame_num': st_frame_info.nFrameNum,
+        # 宽高超过 65535 或帧长超过 4GB 时 SDK 只填扩展字段
+        'width': st_frame_info.nExtendWidth or st_frame_info.nWidth,
+        'height': st_frame_info.nExtendHeight or st_frame_info.nHeight,
+        'pixel_type': st_frame_info.enPixelType,
+        'frame_len': st_frame_info.nFrameLenEx or st_frame_info.nFrameLen,
+        'dev_timestamp': (st_frame_info.nDevTimeStampHigh << 32) | st_frame_info.nDevTimeStampLow,
+        'host_timestamp': st_frame_info.nHostTimeStamp,
+        'trigger_index': st_frame_info.nTriggerIndex,
+        'frame_counter': st_frame_info.nFrameCounter,
+        'lost_packet': st_frame_info.nLostPacket,
+        'exposure_time': st_frame_info.fExposureTime,
+        'gain': st_frame_info.fGain,
+        'average_brightness': st_frame_info.nAverageBrightness,
+        'offset_x': st_frame_info.nOffsetX,
+        'offset_y': st_frame_info.nOffsetY,
+    }
+
+
+class DeviceRegistry:
+    """
+    相机设备注册表
+
+    缓存 MV_CC_EnumDevices 的枚举结果，并按序列号、IP 和用户自定义名称建立索引。
+    枚举结果超过 ttl 秒后视为过期，下次按索引查询时自动重新枚举；
+    按序列号/IP/名称打开相机时直接使用缓存的 MV_CC_DEVICE_INFO，无需重新广播枚举。
+
+    支持的设备标识:
+        0, 1, 2...              # 枚举顺序索引
+        "serial:DA1234"         # 序列号
+        "ip:192.168.1.10"       # GigE 相机 IP
+        "name:Line1_Top"        # 用户自定义名称 (DeviceUserID)
+
+    使用示例:
+        registry = DeviceRegistry(ttl=60)
+        registry.refresh()
+        info = registry.resolve("serial:DA1234")
+    """
+
+    def __init__(self, ttl=30.0, tlayer_type=MV_GIGE_DEVICE | MV_USB_DEVICE):
+        """
+        参数:
+            ttl: float, 枚举结果有效期（秒），None 表示永不过期
+            tlayer_type: int, 枚举的传输层类型
+        """
+        self.ttl = ttl
+        self.tlayer_type = tlayer_type
+
+        self._lock = threading.RLock()
+        self._devices = []
+        self._by_serial = {}
+        self._by_ip = {}
+        self._by_name = {}
+        self._timestamp = None
+
+    def is_stale(self):
+        """
+        检查缓存是否过期
+
+        返回:
+            bool: 从未枚举或已超过 ttl 时返回 True
+        """
+        if self._timestamp is None:
+            return True
+        if self.ttl is None:
+            return False
+        return (time.time() - self._timestamp) > self.ttl
+
+    def invalidate(self):
+        """使缓存失效，下次查询时重新枚举"""
+        with self._lock:
+            self._timestamp = None
+
+    def refresh(self, force=False):
+        """
+        枚举设备并更新缓存
+
+        参数:
+            force: bool, 为 True 时忽略 ttl 强制重新枚举
+
+        返回:
+            list: 相机信息列表（同 devices()）
+        """
+        with self._lock:
+            if not force and not self.is_stale():
+                return self.devices()
+
+            deviceList = MV_CC_DEVICE_INFO_LIST()
+            ret = MvCamera.MV_CC_EnumDevices(self.tlayer_type, deviceList)
+            if ret != 0:
+                print(f"枚举设备失败! ret[0x{ret:x}]")
+                return []
+
+            devices = []
+            for i in range(deviceList.nDeviceNum):
+                # 复制一份设备信息，避免下次枚举后 SDK 内部指针失效
+                dev_info = MV_CC_DEVICE_INFO.from_buffer_copy(deviceList.pDeviceInfo[i].contents)
+                info = {'index': i}
+
+                if dev_info.nTLayerType == MV_GIGE_DEVICE:
+                    gige_info = dev_info.SpecialInfo.stGigEInfo
+                    info['type'] = 'GigE'
+                    info['model'] = _decode_c_string(gige_info.chModelName)
+                    info['serial'] = _decode_c_string(gige_info.chSerialNumber)
+                    info['name'] = _decode_c_string(gige_info.chUserDefinedName)
+                    info['ip'] = _ip_to_str(gige_info.nCurrentIp)
+                elif dev_info.nTLayerType == MV_USB_DEVICE:
+                    usb_info = dev_info.SpecialInfo.stUsb3VInfo
+                    info['type'] = 'USB'
+                    info['model'] = _decode_c_string(usb_info.chModelName)
+                    info['serial'] = _decode_c_string(usb_info.chSerialNumber)
+                    info['name'] = _decode_c_string(usb_info.chUserDefinedName)
+
+                devices.append((info, dev_info))
+
+            self._devices = devices
+            self._by_serial = {}
+            self._by_ip = {}
+            self._by_name = {}
+            for entry in devices:
+                info = entry[0]
+                if info.get('serial'):
+                    self._by_serial[info['serial']] = entry
+                if info.get('ip'):
+                    self._by_ip[info['ip']] = entry
+                if info.get('name'):
+                    self._by_name[info['name']] = entry
+            self._timestamp = time.time()
+
+            return self.devices()
+
+    def devices(self):
+        """
+        获取缓存的相机信息列表（不触发枚举）
+
+        返回:
+            list: 每个元素为 {'index', 'type', 'model', 'serial', 'name'[, 'ip']}
+        """
+        with self._lock:
+            return [dict(info) for info, _ in self._devices]
+
+    def _lookup(self, source):
+        """在缓存中查找设备，返回 (info, dev_info) 或 None"""
+        if isinstance(source, int):
+            if 0 <= source < len(self._devices):
+                return self._devices[source]
+            return None
+
+        key, _, value = str(source).partition(':')
+        if key == 'serial':
+            return self._by_serial.get(value)
+        elif key == 'ip':
+            return self._by_ip.get(value)
+        elif key == 'name':
+            return self._by_name.get(value)
+        raise ValueError(f"无效的设备标识: {source!r} (应为索引或 serial:/ip:/name: 前缀)")
+
+    def resolve(self, source, refresh=True):
+        """
+        查找设备
+
+        按索引查找时，缓存过期会先重新枚举（索引顺序本身不稳定）；
+        按序列号/IP/名称查找时优先使用缓存，未命中才重新枚举。
+
+        参数:
+            source: int 或 str, 设备标识
+            refresh: bool, 未命中时是否允许重新枚举
+
+        返回:
+            tuple: (info, MV_CC_DEVICE_INFO)，未找到返回 None
+        """
+        with self._lock:
+            if isinstance(source, int) and refresh:
+                self.refresh()
+
+            entry = self._lookup(source)
+            if entry is None and refresh and not isinstance(source, int):
+                self.refresh(force=self._timestamp is not None)
+                entry = self._lookup(source)
+            return entry
+
+
+class PixelFormat:
+    """
+    GVSP 像素格式描述
+
+    由像素格式码（高 8 位标志、16-23 位每像素位数）和常量名解码得到，
+    模块加载时为所有 PixelType_Gvsp_* 常量建好，之后用 get_pixel_format() O(1) 查表。
+
+    属性:
+        code: int, 像素格式码（按无符号 32 位整数）
+        name: str, 常量名（去掉 PixelType_Gvsp_ 前缀）
+        bpp: int, 每像素占用位数
+        bit_depth: int, 每个分量的有效位数
+        channels: int, 每像素分量数（Mono/Bayer 为 1，YUV422 为 2，RGB 为 3，RGBA 为 4）；
+                  YUV411/420 等色度子采样格式和 Jpeg 为 0
+        dtype: numpy.dtype, 单个分量的存储类型；分量不按字节对齐（Packed）时为 None
+        packed: bool, 分量按位紧密排列（Mono12_Packed、RGB10V1_Packed 等）
+        planar: bool, 各分量分平面存储
+        compressed: bool, HB 无损压缩或 Jpeg 格式，数据长度不固定
+        bayer_pattern: str, 'RG' / 'GR' / 'GB' / 'BG'，非 Bayer 格式为 None
+        is_mono / is_bayer / is_color / is_yuv / is_3d: bool, 格式类别
+    """
+
+    def __init__(self, name, code):
+        code &= 0xffffffff
+        base = name[3:] if name.startswith('HB_') else name
+        head, _, tail = base.partition('_')
+
+        self.code = code
+        self.name = name
+        self.bpp = (code >> 16) & 0xff
+        self.compressed = name.startswith('HB_') or base == 'Jpeg'
+        self.planar = 'Planar' in base
+        self.is_3d = head.upper() == 'COORD3D'
+        self.is_bayer = head.startswith('Bayer')
+        self.is_yuv = head.startswith(('YUV', 'YCBCR'))
+        self.is_mono = bool(code & 0x01000000) and not self.is_bayer and not self.is_3d
+        self.is_color = bool(code & 0x02000000) and not self.is_3d
+        self.bayer_pattern = head[5:7] if self.is_bayer and head[5:7] in ('RG', 'GR', 'GB', 'BG') \
+            and head[7:8].isdigit() else None
+
+        # 分量位数取名字中的第一个数字（3D 格式取坐标后缀）；YUV422、RGB565 这类数字不是位数的按 8 位
+        digits = re.search(r'\d+', tail if self.is_3d else head)
+        self.bit_depth = int(digits.group()) if digits else 8
+        if self.bit_depth > self.bpp:
+            self.bit_depth = 8
+
+        if self.is_3d:
+            axes = re.match(r'[ABC]+', tail)
+            self.channels = len(axes.group()) if axes else 0
+        elif self.is_yuv:
+            self.channels = 0 if ('411' in base or '420' in base) else 2 if '422' in base else 3
+        elif self.is_mono or self.is_bayer:
+            self.channels = 1
+        elif head.startswith(('RGBA', 'BGRA')):
+            self.channels = 4
+        elif head.startswith(('RGB', 'BGR')):
+            self.channels = 3
+        else:
+            self.channels = 0
+
+        sample_bits = self.bpp // self.channels if self.channels and self.bpp % self.channels == 0 else 0
+        self.packed = self.channels > 0 and sample_bits not in (8, 16, 32)
+        if self.packed or self.channels == 0:
+            self.dtype = None
+        elif sample_bits == 32:
+            self.dtype = np.dtype(np.float32 if 'f' in tail else np.int32)
+        elif sample_bits == 8:
+            self.dtype = np.dtype(np.int8 if 'Signed' in base else np.uint8)
+        else:
+            self.dtype = np.dtype(np.uint16)
+
+    def __repr__(self):
+        return f"PixelFormat({self.name}, 0x{self.code:08x}, {self.bpp} bpp)"
+
+    def frame_size(self, width, height):
+        """
+        单帧数据的字节数
+
+        参数:
+            width, height: int, 图像宽高（大靶面相机可超过 65535）
+
+        返回:
+            int: 精确字节数；压缩格式（HB / Jpeg）为解压后的大小，即数据长度上限
+        """
+        return (width * height * self.bpp + 7) // 8
+
+    def layout(self, width, height):
+        """
+        单帧数据的数组布局
+
+        返回:
+            tuple: (shape, dtype)；Packed、子采样、压缩等无法按像素排布的格式返回按字节排布的一维形状
+        """
+        if self.dtype is None or self.compressed:
+            return (self.frame_size(width, height),), np.uint8
+        if self.channels == 1:
+            return (height, width), self.dtype.type
+        if self.planar:
+            return (self.channels, height, width), self.dtype.type
+        return (height, width, self.channels), self.dtype.type
+
+
+# 像素格式码 -> PixelFormat
+PIXEL_FORMATS = {}
+for _name, _code in list(globals().items()):
+    if _name.startswith('PixelType_Gvsp_') and isinstance(_code, int) and _code != PixelType_Gvsp_Undefined:
+        PIXEL_FORMATS.setdefault(_code & 0xffffffff, PixelFormat(_name[len('PixelType_Gvsp_'):], _code))
+del _name, _code
+
+
+def get_pixel_format(pixel_type):
+    """
+    查询像素格式描述
+
+    参数:
+        pixel_type: int, GVSP 像素格式（SDK 结构体中可能是有符号整数，内部按无符号处理）
+
+    返回:
+        PixelFormat: 像素格式描述，未知格式返回 None
+    """
+    return PIXEL_FORMATS.get(pixel_type & 0xffffffff)
+
+
+def get_frame_size(width, height, pixel_type):
+    """
+    计算给定像素格式单帧数据的精确字节数（用于分配源 / 目标缓冲）
+
+    返回:
+        int: 字节数；未知格式按像素格式码中的每像素位数计算
+    """
+    fmt = get_pixel_format(pixel_type)
+    if fmt is not None:
+        return fmt.frame_size(width, height)
+    return (width * height * ((pixel_type >> 16) & 0xff) + 7) // 8
+
+
+def _raw_frame_layout(width, height, pixel_type):
+    """
+    根据 GVSP 像素格式推断单帧原始数据的数组布局
+
+    返回:
+        tuple: (shape, dtype)；无法按像素排布的格式（如 Packed）返回按字节排布的一维形状
+    """
+    fmt = get_pixel_format(pixel_type)
+    if fmt is None:
+        return (get_frame_size(width, height, pixel_type),), np.uint8
+    return fmt.layout(width, height)
+
+
+def _sdk_convert_pixel_type(cam, src, src_len, info, dst_pixel_type=PixelType_Gvsp_BGR8_Packed, out=None):
+    """
+    内部方法：用 SDK（MV_CC_ConvertPixelTypeEx）转换像素格式
+
+    输出数组按目标像素格式的精确大小分配；Ex 接口的宽高为 32 位，宽或高超过 65535 的大靶面相机也能转换。
+
+    参数:
+        cam: MvCamera, 相机句柄
+        src: 源数据（ctypes 缓冲或 POINTER(c_ubyte)）
+        src_len: int, 源数据字节数
+        info: dict, 帧信息（width / height / pixel_type）
+        dst_pixel_type: int, 目标像素格式
+        out: numpy.ndarray, 可选的输出数组，形状类型匹配且 C 连续时直接写入
+
+    返回:
+        numpy.ndarray: 转换结果，失败返回 None
+    """
+    width, height = info['width'], info['height']
+    shape, dtype = _raw_frame_layout(width, height, dst_pixel_type)
+    if not isinstance(out, np.ndarray) or out.shape != shape or out.dtype != dtype or not out.flags.c_contiguous:
+        out = np.empty(shape, dtype=dtype)
+
+    stConvertParam = MV_CC_PIXEL_CONVERT_PARAM_EX()
+    memset(byref(stConvertParam), 0, sizeof(stConvertParam))
+    stConvertParam.nWidth = width
+    stConvertParam.nHeight = height
+    stConvertParam.pSrcData = src
+    stConvertParam.nSrcDataLen = src_len
+    stConvertParam.enSrcPixelType = info['pixel_type']
+    stConvertParam.enDstPixelType = dst_pixel_type
+    stConvertParam.pDstBuffer = out.ctypes.data_as(POINTER(c_ubyte))
+    stConvertParam.nDstBufferSize = out.nbytes
+
+    ret = cam.MV_CC_ConvertPixelTypeEx(stConvertParam)
+    if ret != 0:
+        print(f"像素格式转换失败! ret[0x{ret:x}]")
+        return None
+    return out
+
+
+def _copy_to_output(frame, image=None):
+    """
+    内部方法：按 OpenCV 输出参数的语义返回帧
+
+    image 为形状、类型一致、C 连续且可写的数组时直接复制进去并返回 image（不分配内存），
+    否则像 OpenCV 一样重新分配一个新数组。
+    """
+    if isinstance(image, np.ndarray) and image.shape == frame.shape and image.dtype == frame.dtype \
+            and image.flags.c_contiguous and image.flags.writeable:
+        np.copyto(image, frame)
+        return image
+    return frame.copy()
+
+
+# 输出格式
+OUTPUT_BGR8 = 'bgr8'    # SDK 转换为 8 位 BGR（默认）
+OUTPUT_RAW = 'raw'      # 原生数据解包：8 位格式为 uint8，10/12/16 位格式为 uint16（Bayer 不去马赛克）
+OUTPUT_BGR16 = 'bgr16'  # 10/12/16 位 Bayer 去马赛克为 uint16 BGR，Mono 格式输出单通道 uint16
+
+def _packed_pair_views(raw, pairs):
+    """
+    内部方法：把 3 字节一组的 Packed 数据读成两个 uint16 数组
+
+    lo[i] = byte0 | byte1 << 8，hi[i] = byte1 | byte2 << 8（步长 3 字节的非对齐读取，各复制一次）
+    """
+    raw = np.ascontiguousarray(raw).reshape(-1)
+    lo = np.ndarray((pairs,), dtype='<u2', buffer=raw, offset=0, strides=(3,)).copy()
+    hi = np.ndarray((pairs,), dtype='<u2', buffer=raw, offset=1, strides=(3,)).copy()
+    return lo, hi
+
+
+def _interleave_pixels(even, odd, width, height, out=None):
+    """内部方法：把偶数、奇数像素交织写入 (height, width) 的 uint16 数组"""
+    if out is None or out.shape != (height, width) or out.dtype != np.uint16 or not out.flags.c_contiguous:
+        out = np.empty((height, width), dtype=np.uint16)
+    pairs = out.reshape(-1, 2)
+    pairs[:, 0] = even
+    pairs[:, 1] = odd
+    return out
+
+
+def unpack_12bit_packed(raw, width, height, out=None):
+    """
+    解包 GVSP 12 位 Packed 数据（Mono12_Packed / Bayer*12_Packed）
+
+    每 3 字节存 2 个像素: byte0 = p0[11:4], byte1 = p0[3:0] | p1[3:0] << 4, byte2 = p1[11:4]
+
+    参数:
+        raw: numpy.ndarray, 一维 uint8 原始数据
+        width, height: int, 图像宽高（像素总数需为偶数）
+        out: numpy.ndarray, 可选的 (height, width) uint16 输出数组
+
+    返回:
+        numpy.ndarray: (height, width) uint16 图像，取值 0-4095
+    """
+    lo, hi = _packed_pair_views(raw, width * height // 2)
+    # hi = byte1 | byte2 << 8，右移 4 位即 p1
+    hi >>= 4
+    # lo = byte0 | byte1 << 8，p0 = byte0 << 4 | byte1 & 0x0F
+    nibble = lo >> 8
+    nibble &= 0x0F
+    lo <<= 4
+    lo &= 0x0FF0
+    lo |= nibble
+    return _interleave_pixels(lo, hi, width, height, out)
+
+
+def unpack_10bit_packed(raw, width, height, out=None):
+    """
+    解包 GVSP 10 位 Packed 数据（Mono10_Packed / Bayer*10_Packed）
+
+    每 3 字节存 2 个像素: byte0 = p0[9:2], byte1 = p0[1:0] | p1[1:0] << 4, byte2 = p1[9:2]
+
+    参数:
+        raw: numpy.ndarray, 一维 uint8 原始数据
+        width, height: int, 图像宽高（像素总数需为偶数）
+        out: numpy.ndarray, 可选的 (height, width) uint16 输出数组
+
+    返回:
+        numpy.ndarray: (height, width) uint16 图像，取值 0-1023
+    """
+    lo, hi = _packed_pair_views(raw, width * height // 2)
+    # hi = byte1 | byte2 << 8，p1 = byte2 << 2 | (byte1 >> 4) & 0x03
+    low_bits = hi >> 4
+    low_bits &= 0x03
+    hi >>= 6
+    hi &= 0x03FC
+    hi |= low_bits
+    # lo = byte0 | byte1 << 8，p0 = byte0 << 2 | byte1 & 0x03
+    low_bits = lo >> 8
+    low_bits &= 0x03
+    lo <<= 2
+    lo &= 0x03FC
+    lo |= low_bits
+    return _interleave_pixels(lo, hi, width, height, out)
+
+
+def get_bit_depth(pixel_type):
+    """
+    获取像素格式每个分量的有效位数
+
+    返回:
+        int: 10/12/16 等；未知格式返回 8
+    """
+    fmt = get_pixel_format(pixel_type)
+    return fmt.bit_depth if fmt is not None else 8
+
+
+def unpack_raw(raw, info, out=None):
+    """
+    把原始数据解包为按像素排列的数组（不做颜色转换）
+
+    Packed 格式解包为 uint16；Mono10/12/16、Bayer10/12/16 直接按 uint16 解释；
+    8 位格式按 uint8 解释。
+
+    参数:
+        raw: numpy.ndarray, 一维 uint8 原始数据
+        info: dict, 帧信息（width / height / pixel_type）
+        out: numpy.ndarray, 可选的输出数组
+
+    返回:
+        numpy.ndarray: 解包后的新数组（或写入后的 out），不支持的格式返回 None
+    """
+    width, height, pixel_type = info['width'], info['height'], info['pixel_type']
+    fmt = get_pixel_format(pixel_type)
+    if fmt is not None and fmt.packed and not fmt.compressed and fmt.channels == 1 and fmt.bpp == 12:
+        if fmt.bit_depth == 12:
+            return unpack_12bit_packed(raw, width, height, out)
+        if fmt.bit_depth == 10:
+            return unpack_10bit_packed(raw, width, height, out)
+
+    shape, dtype = _raw_frame_layout(width, height, pixel_type)
+    if len(shape) == 1:
+        return None
+    nbytes = int(np.prod(shape)) * np.dtype(dtype).itemsize
+    return _copy_to_output(raw[:nbytes].view(dtype).reshape(shape), out)
+
+
+def _convert_native(raw, info, output_format):
+    """
+    内部方法：按 OUTPUT_RAW / OUTPUT_BGR16 转换原始数据
+
+    返回:
+        numpy.ndarray: 输出图像，不支持的格式返回 None
+    """
+    image = unpack_raw(raw, info)
+    if image is None or output_format == OUTPUT_RAW:
+        return image
+
+    pattern = get_bayer_pattern(info['pixel_type'])
+    if pattern is None:
+        # Mono 格式保持单通道
+        return image if image.ndim == 2 else None
+
+    image = image.astype(np.uint16, copy=False)
+    try:
+        cv2 = _require_cv2()
+    except ImportError:
+        return demosaic(image, pattern)
+    return cv2.cvtColor(image, getattr(cv2, _CV2_BAYER_CODES[pattern]))
+
+
+# capture_burst() 元数据数组的结构
+BURST_META_DTYPE = np.dtype([
+    ('frame_num', np.uint32),
+    ('dev_timestamp', np.uint64),
+    ('host_timestamp', np.int64),
+    ('trigger_index', np.uint32),
+    ('lost_packet', np.uint32),
+    ('recv_time', np.float64),
+])
+
+
+# frames() 缓冲策略（都会丢帧：取图线程从不等待 frames() 的消费者）
+BUFFER_LATEST = 'latest'  # 只保留最新一帧
+BUFFER_RING = 'ring'      # 环形缓冲 size 帧，满时覆盖最旧的帧
+
+# 累加模式
+ACCUMULATE_MEAN = 'mean'      # N 帧均值（uint32 累加，结果为 float32）
+ACCUMULATE_SUM = 'sum'        # N 帧累加和（uint32）
+ACCUMULATE_EWMA = 'ewma'      # 指数加权滑动平均（float32，持续更新）
+ACCUMULATE_MIN = 'min'        # N 帧逐像素最小值
+ACCUMULATE_MAX = 'max'        # N 帧逐像素最大值
+ACCUMULATE_MEDIAN = 'median'  # N 帧逐像素中值
+
+# 累加数据来源
+SOURCE_RAW = 'raw'      # 原始数据（相机原生像素格式，平场校正之前）
+SOURCE_FRAME = 'frame'  # 转换后的输出帧（BGR8 / 高位深输出）
+
+_ACCUMULATE_MODES = (ACCUMULATE_MEAN, ACCUMULATE_SUM, ACCUMULATE_EWMA,
+                     ACCUMULATE_MIN, ACCUMULATE_MAX, ACCUMULATE_MEDIAN)
+
+# 帧变化检测处理方式
+GATE_MARK = 'mark'  # 只在帧信息中标记 changed / change_score，所有帧照常转换
+GATE_DROP = 'drop'  # 变化不足的帧在转换前丢弃，不更新最新帧、不通知帧监听器
+
+
 class HikCamera:
     """
     海康工业相机封装类
@@ -46,27 +643,70 @@ class HikCamera:
         cam.release()
     """
 
-    # 类变量：存储设备列表
-    _device_list = None
-    _device_count = 0
+    # 类变量：设备注册表（所有实例共享）
+    registry = DeviceRegistry()
 
-    def __init__(self, index=0):
+    def __init__(self, index=0, auto_start=True):
         """
         初始化海康相机
 
         参数:
-            index: 相机索引，从0开始
+            index: 相机索引（从0开始），或 "serial:xxx" / "ip:x.x.x.x" / "name:xxx" 形式的设备标识
+            auto_start: bool, 打开后是否自动开始采集（为 False 时可先配置参数再调用 start()）
         """
         self.index = index
+        self.auto_start = auto_start
         self.cam = None
+        self.device_info = None
         self.is_opened = False
         self.is_grabbing = False
 
         # 图像缓存相关
         self.latest_frame = None
+        self.latest_info = None
+        self.frame_seq = 0
         self.frame_lock = threading.Lock()
+        self.frame_cond = threading.Condition(self.frame_lock)
         self.buffer_lock = threading.Lock()
 
+        # 帧监听器与原始数据监听器（在取图线程中调用）
+        self._frame_listeners = []
+        self._raw_listeners = []
+
+        # 输出格式与转换引擎（None 表示 SDK 转换）
+        self.output_format = OUTPUT_BGR8
+        self.conversion_engine = None
+
+        # frames() 缓冲策略与 SDK 图像节点数
+        self.buffer_policy = BUFFER_LATEST
+        self.buffer_ring_size = 1
+        self.image_node_num = None
+
+        # 软触发
+        self.software_trigger = False
+        self._trigger_lock = threading.Lock()
+        self._last_trigger_index = None  # 最后收到的触发计数
+        self._pending_triggers = 0  # 此后已发送但没有收到对应帧的触发次数
+        self._trigger_stats = {'triggers': 0, 'timeouts': 0, 'latency_sum': 0.0, 'latency_max': 0.0}
+
+        # SDK 录像与低分辨率预览
+        self.recorder = None
+        self.preview = None
+
+        # 平场 / 暗场校正
+        self.flat_field = None
+        self._flat_field_mismatch = False
+
+        # 镜头畸变校正（_roi_offset 缓存当前 ROI 偏移，ROI 变化后清空）
+        self.undistort = None
+        self._roi_offset = None
+
+        # 软件自动曝光
+        self.auto_exposure = None
+
+        # 帧变化检测
+        self.change_gate = None
+
         # 内部缓存
         self.buf_save_image = None
         self.buf_save_image_len = 0
@@ -76,88 +716,38 @@ class HikCamera:
         self.grab_thread = None
         self.thread_running = False
 
+        # 首帧统计
+        self.first_frame_event = threading.Event()
+        self.start_time = None
+        self.first_frame_time = None
+
         # 自动打开相机
         self.open()
 
     @staticmethod
-    def enumerate_devices():
+    def enumerate_devices(force=True, verbose=True):
         """
         枚举所有可用的海康相机
 
+        参数:
+            force: bool, 为 True 时强制重新枚举，为 False 时在缓存未过期时直接返回缓存
+            verbose: bool, 是否打印设备列表
+
         返回:
-            list: 相机信息列表，每个元素包含 {'index': int, 'model': str, 'serial': str}
+            list: 相机信息列表，每个元素包含 {'index', 'type', 'model', 'serial', 'name'[, 'ip']}
         """
-        deviceList = MV_CC_DEVICE_INFO_LIST()
-        tlayerType = MV_GIGE_DEVICE | MV_USB_DEVICE
-
-        ret = MvCamera.MV_CC_EnumDevices(tlayerType, deviceList)
-        if ret != 0:
-            print(f"枚举设备失败! ret[0x{ret:x}]")
-            return []
-
-        # 保存设备列表到类变量
-        HikCamera._device_list = deviceList
-        HikCamera._device_count = deviceList.nDeviceNum
-
-        if deviceList.nDeviceNum == 0:
-            print("没有找到相机设备!")
-            return []
-
-        print(f"找到 {deviceList.nDeviceNum} 个相机设备")
-
-        camera_info_list = []
-        for i in range(deviceList.nDeviceNum):
-            mvcc_dev_info = cast(deviceList.pDeviceInfo[i], POINTER(MV_CC_DEVICE_INFO)).contents
-
-            info = {'index': i}
-
-            if mvcc_dev_info.nTLayerType == MV_GIGE_DEVICE:
-                # GigE相机
-                strModeName = ""
-                for per in mvcc_dev_info.SpecialInfo.stGigEInfo.chModelName:
-                    if per == 0:
-                        break
-                    strModeName = strModeName + chr(per)
+        camera_info_list = HikCamera.registry.refresh(force=force)
 
-                strSerialNumber = ""
-                for per in mvcc_dev_info.SpecialInfo.stGigEInfo.chSerialNumber:
-                    if per == 0:
-                        break
-                    strSerialNumber = strSerialNumber + chr(per)
-
-                info['type'] = 'GigE'
-                info['model'] = strModeName
-                info['serial'] = strSerialNumber
-
-                nip1 = ((mvcc_dev_info.SpecialInfo.stGigEInfo.nCurrentIp & 0xff000000) >> 24)
-                nip2 = ((mvcc_dev_info.SpecialInfo.stGigEInfo.nCurrentIp & 0x00ff0000) >> 16)
-                nip3 = ((mvcc_dev_info.SpecialInfo.stGigEInfo.nCurrentIp & 0x0000ff00) >> 8)
-                nip4 = (mvcc_dev_info.SpecialInfo.stGigEInfo.nCurrentIp & 0x000000ff)
-                info['ip'] = f"{nip1}.{nip2}.{nip3}.{nip4}"
-
-                print(f"  [{i}] GigE: {strModeName} ({strSerialNumber}) - {info['ip']}")
-
-            elif mvcc_dev_info.nTLayerType == MV_USB_DEVICE:
-                # USB相机
-                strModeName = ""
-                for per in mvcc_dev_info.SpecialInfo.stUsb3VInfo.chModelName:
-                    if per == 0:
-                        break
-                    strModeName = strModeName + chr(per)
-
-                strSerialNumber = ""
-                for per in mvcc_dev_info.SpecialInfo.stUsb3VInfo.chSerialNumber:
-                    if per == 0:
-                        break
-                    strSerialNumber = strSerialNumber + chr(per)
-
-                info['type'] = 'USB'
-                info['model'] = strModeName
-                info['serial'] = strSerialNumber
-
-                print(f"  [{i}] USB: {strModeName} ({strSerialNumber})")
-
-            camera_info_list.append(info)
+        if verbose:
+            if len(camera_info_list) == 0:
+                print("没有找到相机设备!")
+            else:
+                print(f"找到 {len(camera_info_list)} 个相机设备")
+                for info in camera_info_list:
+                    if info.get('type') == 'GigE':
+                        print(f"  [{info['index']}] GigE: {info['model']} ({info['serial']}) - {info['ip']}")
+                    elif info.get('type') == 'USB':
+                        print(f"  [{info['index']}] USB: {info['model']} ({info['serial']})")
 
         return camera_info_list
 
@@ -172,36 +762,34 @@ class HikCamera:
             print("相机已经打开")
             return True
 
-        # 如果没有枚举设备，先枚举
-        if HikCamera._device_list is None:
-            HikCamera.enumerate_devices()
-
-        if HikCamera._device_count == 0:
-            print("没有可用的相机设备")
-            return False
-
-        if self.index >= HikCamera._device_count:
-            print(f"相机索引 {self.index} 超出范围 (0-{HikCamera._device_count-1})")
+        try:
+            entry = HikCamera.registry.resolve(self.index)
+        except ValueError as e:
+            print(e)
             return False
 
-        # 创建相机句柄
-        stDeviceList = cast(HikCamera._device_list.pDeviceInfo[self.index],
-                           POINTER(MV_CC_DEVICE_INFO)).contents
-        self.cam = MvCamera()
-        ret = self.cam.MV_CC_CreateHandle(stDeviceList)
-        if ret != 0:
-            print(f"创建句柄失败! ret[0x{ret:x}]")
+        if entry is None:
+            if isinstance(self.index, int) and len(HikCamera.registry.devices()) > 0:
+                print(f"相机索引 {self.index} 超出范围 (0-{len(HikCamera.registry.devices())-1})")
+            else:
+                print(f"没有找到相机设备: {self.index}")
             return False
 
-        # 打开设备
-        ret = self.cam.MV_CC_OpenDevice()
+        stDeviceList = entry[1]
+        ret = self._open_handle(stDeviceList)
+        if ret != 0 and not isinstance(self.index, int):
+            # 缓存的设备信息可能已失效（IP 变更、重新上电等），强制重新枚举后重试一次
+            HikCamera.registry.refresh(force=True)
+            entry = HikCamera.registry.resolve(self.index, refresh=False)
+            if entry is not None:
+                stDeviceList = entry[1]
+                ret = self._open_handle(stDeviceList)
         if ret != 0:
-            print(f"打开设备失败! ret[0x{ret:x}]")
-            self.cam.MV_CC_DestroyHandle()
             return False
 
         print(f"成功打开相机 [{self.index}]")
         self.is_opened = True
+        self.device_info = dict(entry[0])
 
         # 对于GigE相机，设置最佳包大小
         if stDeviceList.nTLayerType == MV_GIGE_DEVICE:
@@ -217,15 +805,64 @@ class HikCamera:
             print(f"警告: 设置触发模式失败! ret[0x{ret:x}]")
 
         # 自动开始采集
-        self._start_grabbing()
+        if self.auto_start:
+            self._start_grabbing()
 
         return True
 
+    def start(self):
+        """
+        开始图像采集（auto_start=False 时在配置完成后调用）
+
+        返回:
+            bool: 是否成功开始采集
+        """
+        return self._start_grabbing()
+
+    def wait_first_frame(self, timeout=None):
+        """
+        等待采集开始后的第一帧图像
+
+        参数:
+            timeout: float, 超时时间（秒），None 表示一直等待
+
+        返回:
+            bool: 超时前是否收到首帧
+        """
+        return self.first_frame_event.wait(timeout)
+
+    def _open_handle(self, stDeviceList):
+        """
+        内部方法：根据设备信息创建句柄并打开设备
+
+        返回:
+            int: SDK 返回码，0 表示成功
+        """
+        self.cam = MvCamera()
+        ret = self.cam.MV_CC_CreateHandle(stDeviceList)
+        if ret != 0:
+            print(f"创建句柄失败! ret[0x{ret:x}]")
+            self.cam = None
+            return ret
+
+        ret = self.cam.MV_CC_OpenDevice()
+        if ret != 0:
+            print(f"打开设备失败! ret[0x{ret:x}]")
+            self.cam.MV_CC_DestroyHandle()
+            self.cam = None
+            return ret
+
+        return 0
+
     def _start_grabbing(self):
         """内部方法：开始图像采集"""
         if self.is_grabbing or not self.is_opened:
             return False
 
+        self.first_frame_event.clear()
+        self.first_frame_time = None
+        self.start_time = time.perf_counter()
+
         ret = self.cam.MV_CC_StartGrabbing()
         if ret != 0:
             print(f"开始取流失败! ret[0x{ret:x}]")
@@ -269,20 +906,31 @@ class HikCamera:
 
         frame_count = 0
         error_count = 0
+        format_error_count = 0
 
         while self.thread_running:
             ret = self.cam.MV_CC_GetImageBuffer(stOutFrame, 1000)
             if ret == 0:
+                recv_time = time.perf_counter()
                 try:
+                    info = _frame_info_to_dict(stOutFrame.stFrameInfo)
+                    info['recv_time'] = recv_time
+
+                    # 原始数据监听器返回 True 时该帧已被消费，跳过转换
+                    if self._raw_listeners and self._dispatch_raw(stOutFrame, info):
+                        continue
+
                     # 获取缓存锁
                     self.buffer_lock.acquire()
 
-                    # 确保缓存足够大
-                    if self.buf_save_image_len < stOutFrame.stFrameInfo.nFrameLen:
+                    # 确保缓存足够大（按像素格式算出的整帧大小分配，压缩格式帧长变化时不反复重新分配）
+                    frame_len = info['frame_len']
+                    if self.buf_save_image_len < frame_len:
                         if self.buf_save_image is not None:
                             del self.buf_save_image
-                        self.buf_save_image = (c_ubyte * stOutFrame.stFrameInfo.nFrameLen)()
-                        self.buf_save_image_len = stOutFrame.stFrameInfo.nFrameLen
+                        buffer_len = max(frame_len, get_frame_size(info['width'], info['height'], info['pixel_type']))
+                        self.buf_save_image = (c_ubyte * buffer_len)()
+                        self.buf_save_image_len = buffer_len
 
                     # 复制帧信息和数据
                     cdll.msvcrt.memcpy(byref(self.st_frame_info),
@@ -290,41 +938,40 @@ class HikCamera:
                                       sizeof(MV_FRAME_OUT_INFO_EX))
                     cdll.msvcrt.memcpy(byref(self.buf_save_image),
                                       stOutFrame.pBufAddr,
-                                      self.st_frame_info.nFrameLen)
-
-                    # 转换为BGR格式
-                    nBGRSize = self.st_frame_info.nWidth * self.st_frame_info.nHeight * 3
-                    buf_bgr = (c_ubyte * nBGRSize)()
-
-                    stConvertParam = MV_CC_PIXEL_CONVERT_PARAM()
-                    memset(byref(stConvertParam), 0, sizeof(stConvertParam))
-                    stConvertParam.nWidth = self.st_frame_info.nWidth
-                    stConvertParam.nHeight = self.st_frame_info.nHeight
-                    stConvertParam.pSrcData = self.buf_save_image
-                    stConvertParam.nSrcDataLen = self.st_frame_info.nFrameLen
-                    stConvertParam.enSrcPixelType = self.st_frame_info.enPixelType
-                    stConvertParam.enDstPixelType = PixelType_Gvsp_BGR8_Packed
-                    stConvertParam.pDstBuffer = buf_bgr
-                    stConvertParam.nDstBufferSize = nBGRSize
-
-                    ret = self.cam.MV_CC_ConvertPixelType(stConvertParam)
-                    if ret == 0:
-                        # 转换为numpy数组
-                        image_array = np.frombuffer(buf_bgr, dtype=np.uint8)
-                        image = image_array.reshape(
-                            (self.st_frame_info.nHeight, self.st_frame_info.nWidth, 3)
-                        ).copy()
-
-                        # 更新最新帧
-                        self.frame_lock.acquire()
-                        self.latest_frame = image
-                        self.frame_lock.release()
+                                      frame_len)
+
+                    # 平场 / 暗场校正（原地修改缓存中的原始数据）
+                    if self.flat_field is not None:
+                        self._apply_flat_field(info, frame_len)
+
+                    # 转换为输出格式
+                    engine = self.conversion_engine
+                    if self.output_format == OUTPUT_BGR8 and engine is not None and engine.supports(info['pixel_type']):
+                        raw = np.ctypeslib.as_array(self.buf_save_image)[:frame_len]
+                        image = engine.convert(raw, info)
+                    elif self.output_format == OUTPUT_BGR8:
+                        image = self._convert_bgr8(info)
+                    else:
+                        raw = np.ctypeslib.as_array(self.buf_save_image)[:frame_len]
+                        image = _convert_native(raw, info, self.output_format)
+                        if image is None and format_error_count < 5:
+                            format_error_count += 1
+                            print(f"输出格式 {self.output_format} 不支持像素格式 0x{info['pixel_type']:x}")
+                        info['bit_depth'] = get_bit_depth(info['pixel_type'])
+
+                    # 镜头畸变校正
+                    if image is not None and self.undistort is not None:
+                        image = self._apply_undistort(image, info)
+
+                    if image is not None:
+                        # 更新最新帧并通知监听器
+                        self._publish_frame(image, info)
 
                         frame_count += 1
                         if frame_count == 1:
-                            print(f"成功获取第一帧图像: {self.st_frame_info.nWidth}x{self.st_frame_info.nHeight}")
-                    else:
-                        print(f"像素格式转换失败! ret[0x{ret:x}]")
+                            self.first_frame_time = time.perf_counter()
+                            self.first_frame_event.set()
+                            print(f"成功获取第一帧图像: {info['width']}x{info['height']}")
 
                     self.buffer_lock.release()
 
@@ -345,418 +992,5074 @@ class HikCamera:
                         print(f"获取图像缓冲失败! ret[0x{ret:x}]")
                     time.sleep(0.01)  # 避免CPU占用过高
 
-    def read(self):
+    def _convert_bgr8(self, info):
         """
-        读取一帧图像（类似OpenCV的cap.read()）
+        内部方法：用 SDK 把 buf_save_image 中的当前帧转换为 8 位 BGR
+
+        转换结果直接写入该帧独立的 numpy 数组，不经过中间缓冲和复制。
 
         返回:
-            tuple: (ret, frame)
-                ret: bool, 是否成功读取
-                frame: numpy.ndarray, BGR格式的图像，如果失败则为None
+            numpy.ndarray: BGR 图像，失败返回 None
         """
-        if not self.is_opened or not self.is_grabbing:
-            return False, None
+        return _sdk_convert_pixel_type(self.cam, self.buf_save_image, info['frame_len'], info)
 
-        # 等待第一帧图像（最多等待3秒）
-        timeout = 3.0
-        start_time = time.time()
-        while self.latest_frame is None and (time.time() - start_time) < timeout:
-            time.sleep(0.01)
+    def set_output_format(self, output_format):
+        """
+        设置 read() 等接口输出的图像格式
 
-        self.frame_lock.acquire()
-        frame = self.latest_frame
-        self.frame_lock.release()
+        参数:
+            output_format: str
+                - OUTPUT_BGR8: SDK 转换为 8 位 BGR（默认，高位深数据会被截断）
+                - OUTPUT_RAW: 原生数据，10/12/16 位格式（含 Packed）解包为 uint16，Bayer 不去马赛克
+                - OUTPUT_BGR16: 10/12/16 位 Bayer 去马赛克为 uint16 BGR，Mono 格式为单通道 uint16
 
-        if frame is None:
-            return False, None
+        高位深输出保持传感器原始取值范围（如 12 位为 0-4095），有效位数见帧信息中的 bit_depth。
 
-        return True, frame.copy()
+        返回:
+            bool: 是否设置成功
+        """
+        if output_format not in (OUTPUT_BGR8, OUTPUT_RAW, OUTPUT_BGR16):
+            print(f"不支持的输出格式: {output_format}")
+            return False
+        self.output_format = output_format
+        return True
 
-    def isOpened(self):
+    def set_conversion_engine(self, engine):
         """
-        检查相机是否已打开（类似OpenCV的cap.isOpened()）
+        设置 BGR8 输出使用的像素格式转换引擎
 
-        返回:
-            bool: 相机是否已打开
+        参数:
+            engine: ConversionEngine, 例如 NumpyConversionEngine(strips=4)；
+                    None 恢复 SDK 转换（MV_CC_ConvertPixelTypeEx）。
+                    引擎不支持的像素格式自动退回 SDK 转换；引擎由调用方负责 close()。
         """
-        return self.is_opened
+        self.conversion_engine = engine
 
-    def release(self):
+    def _dispatch_raw(self, stOutFrame, info):
         """
-        释放相机资源（类似OpenCV的cap.release()）
+        内部方法：把 SDK 缓存中的原始数据交给原始数据监听器
+
+        返回:
+            bool: 是否有监听器消费了该帧
         """
-        if not self.is_opened:
-            return
+        raw = np.ctypeslib.as_array(stOutFrame.pBufAddr, shape=(info['frame_len'],))
+        consumed = False
+        for listener in self._raw_listeners:
+            try:
+                if listener(raw, info):
+                    consumed = True
+            except Exception as e:
+                print(f"原始帧监听器出错: {e}")
+        return consumed
+
+    def add_raw_listener(self, callback):
+        """
+        注册原始数据监听器
 
-        # 停止采集
-        if self.is_grabbing:
-            self._stop_grabbing()
+        参数:
+            callback: callable(raw, info), 在取图线程中、像素格式转换之前调用。
+                      raw 为直接映射 SDK 图像缓存的一维 uint8 数组，仅在回调期间有效，需要保留时必须复制；
+                      返回 True 表示该帧已被消费，跳过后续的转换和最新帧更新
+        """
+        self._raw_listeners = self._raw_listeners + [callback]
 
-        # 关闭设备
-        ret = self.cam.MV_CC_CloseDevice()
-        if ret != 0:
-            print(f"关闭设备失败! ret[0x{ret:x}]")
+    def remove_raw_listener(self, callback):
+        """
+        注销原始数据监听器
 
-        # 销毁句柄
+        参数:
+            callback: callable, 之前注册的回调
+        """
+        self._raw_listeners = [cb for cb in self._raw_listeners if cb is not callback]
+
+    def read_raw(self, timeout=1.0):
+        """
+        读取下一帧的原始数据（相机原生像素格式，不做 BGR 转换）
+
+        BayerRG8 等格式每像素只占 1 字节，保存原始数据比保存 BGR 图像小 3 倍，
+        需要时再用 convert_raw() 或 demosaic() 转换。
+
+        参数:
+            timeout: float, 最长等待时间（秒）
+
+        返回:
+            Tuple[bool, np.ndarray, dict]: (是否成功, 原始数据副本, 帧信息)
+        """
+        if not self.is_grabbing:
+            return False, None, None
+
+        done = threading.Event()
+        result = {}
+
+        def on_raw(raw, info):
+            if not done.is_set():
+                result['raw'] = raw.copy()
+                result['info'] = info
+                done.set()
+            return False
+
+        self.add_raw_listener(on_raw)
+        try:
+            if not done.wait(timeout):
+                return False, None, None
+        finally:
+            self.remove_raw_listener(on_raw)
+        return True, result['raw'], result['info']
+
+    def convert_raw(self, raw, info, out=None):
+        """
+        用 SDK（MV_CC_ConvertPixelTypeEx）把原始数据转换为 BGR 图像
+
+        参数:
+            raw: numpy.ndarray, 原始数据（read_raw()、录制文件或 load_raw_frame() 得到）
+            info: dict, 帧信息（width / height / pixel_type）
+            out: numpy.ndarray, 可选的输出数组，形状类型匹配且 C 连续时直接写入
+
+        返回:
+            numpy.ndarray: BGR 图像，失败返回 None
+        """
+        if self.cam is None:
+            return None
+
+        raw = np.ascontiguousarray(raw)
+        return _sdk_convert_pixel_type(self.cam, raw.ctypes.data_as(POINTER(c_ubyte)), raw.nbytes, info, out=out)
+
+    def get_calibration_key(self):
+        """
+        获取标定数据的匹配键（平场校正图、畸变映射表等按此缓存）
+
+        返回:
+            dict: {'serial', 'offset_x', 'offset_y', 'width', 'height', 'pixel_type'}，读取失败返回 None
+        """
+        roi = self.get_roi()
+        if roi is None:
+            return None
+        _, _, pixel_type = self._query_geometry()
+        serial = self.device_info.get('serial') if self.device_info else None
+        return {'serial': serial, 'offset_x': roi[0], 'offset_y': roi[1], 'width': roi[2], 'height': roi[3],
+                'pixel_type': pixel_type}
+
+    def accumulate(self, frames=16, mode=ACCUMULATE_MEAN, timeout=None, alpha=0.1, source=SOURCE_RAW):
+        """
+        采集 N 帧并累加（阻塞直到完成），用于低照度多帧降噪等
+
+        参数:
+            frames: int, 累加帧数
+            mode: str, ACCUMULATE_MEAN / SUM / EWMA / MIN / MAX / MEDIAN
+            timeout: float, 最长等待时间（秒），None 表示按每帧 1 秒计
+            alpha: float, EWMA 模式新帧的权重
+            source: str, SOURCE_RAW 累加原始数据，SOURCE_FRAME 累加转换后的输出帧
+
+        返回:
+            numpy.ndarray: 累加结果（见 FrameAccumulator.get_result()），失败返回 None
+        """
+        if not self.is_grabbing:
+            print("相机未在采集，无法累加")
+            return None
+
+        accumulator = FrameAccumulator(self, frames, mode, alpha, source)
+        accumulator.start()
+        try:
+            return accumulator.wait(timeout if timeout is not None else accumulator.frames * 1.0)
+        finally:
+            accumulator.stop()
+
+    def acquire_calibration_frame(self, frames=16, timeout=None):
+        """
+        采集多帧原始数据并求均值（用于暗场 / 平场标定）
+
+        累加的是原始数据，不经过平场校正和像素格式转换；Packed 格式先解包。
+
+        参数:
+            frames: int, 平均帧数
+            timeout: float, 最长等待时间（秒），None 表示按每帧 1 秒计
+
+        返回:
+            numpy.ndarray: (height, width) float32 均值图，失败返回 None
+        """
+        return self.accumulate(frames, ACCUMULATE_MEAN, timeout)
+
+    def set_flat_field(self, correction):
+        """
+        设置平场 / 暗场校正
+
+        校正在取图线程中、像素格式转换之前原地作用于原始数据，之后的 BGR 转换、转换引擎
+        和高位深输出都基于校正后的数据；原始数据监听器（录制、预览、read_raw()）仍得到相机原始数据。
+
+        参数:
+            correction: FlatFieldCorrection, None 表示关闭校正
+        """
+        self._flat_field_mismatch = False
+        self.flat_field = correction
+
+    def calibrate_flat_field(self, dark, flat, directory=None):
+        """
+        由暗场、平场均值图计算校正图并启用（可选保存到缓存目录）
+
+        参数:
+            dark: numpy.ndarray, acquire_calibration_frame() 得到的暗场均值图，None 表示不减暗场
+            flat: numpy.ndarray, acquire_calibration_frame() 得到的平场均值图，None 表示只做暗场校正
+            directory: str, 缓存目录，按序列号 + ROI + 像素格式保存
+
+        返回:
+            FlatFieldCorrection: 校正对象，失败返回 None
+        """
+        key = self.get_calibration_key()
+        if key is None:
+            print("读取相机 ROI 和像素格式失败")
+            return None
+        try:
+            correction = compute_flat_field(dark, flat, key['pixel_type'], key)
+        except ValueError as e:
+            print(f"计算平场校正图失败: {e}")
+            return None
+
+        if directory is not None:
+            correction.save(_calibration_path(directory, 'flat_field', key))
+        self.set_flat_field(correction)
+        return correction
+
+    def restore_flat_field(self, directory):
+        """
+        从缓存目录加载与当前序列号、ROI、像素格式匹配的校正图并启用
+
+        参数:
+            directory: str, calibrate_flat_field() 使用的缓存目录
+
+        返回:
+            bool: 是否找到并启用了校正图（缓存文件损坏或与当前版本不兼容时返回 False）
+        """
+        key = self.get_calibration_key()
+        if key is None:
+            return False
+        path = _calibration_path(directory, 'flat_field', key)
+        if not os.path.exists(path):
+            print(f"没有找到平场校正缓存: {path}")
+            return False
+        try:
+            correction = load_flat_field(path)
+        except (OSError, KeyError, ValueError) as e:
+            print(f"读取平场校正缓存失败: {e}")
+            return False
+        self.set_flat_field(correction)
+        return True
+
+    def _apply_flat_field(self, info, frame_len):
+        """内部方法：对 buf_save_image 中的当前帧原地做平场校正"""
+        correction = self.flat_field
+        shape, dtype = _raw_frame_layout(info['width'], info['height'], info['pixel_type'])
+        nbytes = int(np.prod(shape)) * np.dtype(dtype).itemsize
+        if shape != correction.offset.shape or np.dtype(dtype) != correction.offset.dtype or nbytes > frame_len:
+            if not self._flat_field_mismatch:
+                self._flat_field_mismatch = True
+                print(f"平场校正图 {correction} 与当前帧 {info['width']}x{info['height']} "
+                      f"{_pixel_type_name(info['pixel_type'])} 不匹配，跳过校正")
+            return
+        raw = np.ctypeslib.as_array(self.buf_save_image)[:nbytes].view(dtype).reshape(shape)
+        correction.apply(raw)
+
+    def set_undistort(self, undistortion):
+        """
+        设置镜头畸变校正
+
+        校正在取图线程中、像素格式转换之后作用于输出帧，read() 等接口得到的都是校正后的图像。
+        OUTPUT_RAW 输出的 Bayer / YUV 数据不做校正（重映射会打乱颜色排列）。
+
+        参数:
+            undistortion: LensUndistortion, None 表示关闭校正；未指定序列号时自动填写本相机的序列号
+        """
+        if undistortion is not None and undistortion.serial is None and self.device_info:
+            undistortion.serial = self.device_info.get('serial')
+        self._roi_offset = None
+        self.undistort = undistortion
+
+    def _apply_undistort(self, image, info):
+        """内部方法：对转换后的帧做畸变校正"""
+        undistortion = self.undistort
+        if self.output_format == OUTPUT_RAW:
+            fmt = get_pixel_format(info['pixel_type'])
+            if fmt is None or not fmt.is_mono:
+                return image
+
+        offset = self._roi_offset
+        if offset is None:
+            roi = self.get_roi()
+            offset = (roi[0], roi[1]) if roi is not None else (info.get('offset_x', 0), info.get('offset_y', 0))
+            self._roi_offset = offset
+        return undistortion.apply(image, offset[0], offset[1])
+
+    def _publish_frame(self, image, info):
+        """内部方法：更新最新帧、唤醒等待者并回调帧监听器"""
+        with self.frame_cond:
+            self.latest_frame = image
+            self.latest_info = info
+            self.frame_seq += 1
+            info['seq'] = self.frame_seq
+            self.frame_cond.notify_all()
+
+        for listener in self._frame_listeners:
+            try:
+                listener(image, info)
+            except Exception as e:
+                print(f"帧监听器出错: {e}")
+
+    def add_frame_listener(self, callback):
+        """
+        注册帧监听器
+
+        参数:
+            callback: callable(image, info), 每帧转换完成后在取图线程中调用；
+                      image 为该帧独立的数组（不会被后续帧覆盖），回调应尽快返回
+        """
+        self._frame_listeners = self._frame_listeners + [callback]
+
+    def remove_frame_listener(self, callback):
+        """
+        注销帧监听器
+
+        参数:
+            callback: callable, 之前注册的回调
+        """
+        self._frame_listeners = [cb for cb in self._frame_listeners if cb is not callback]
+
+    def _peek_frame(self):
+        """
+        内部方法：取最新帧的引用（不复制，调用方不得修改）
+
+        返回:
+            numpy.ndarray: 最新帧，等待 3 秒仍没有图像时返回 None
+        """
+        if not self.is_opened or not self.is_grabbing:
+            return None
+
+        # 等待第一帧图像（最多等待3秒）
+        with self.frame_cond:
+            self.frame_cond.wait_for(lambda: self.latest_frame is not None, 3.0)
+            return self.latest_frame
+
+    def read(self, image=None):
+        """
+        读取一帧图像（类似OpenCV的cap.read()）
+
+        参数:
+            image: numpy.ndarray, 可选的输出数组；形状和类型匹配且 C 连续时直接写入并返回它，
+                   循环中复用同一个数组即可做到每帧不分配内存；不匹配时重新分配
+
+        返回:
+            tuple: (ret, frame)
+                ret: bool, 是否成功读取
+                frame: numpy.ndarray, BGR格式的图像，如果失败则为None
+        """
+        frame = self._peek_frame()
+        if frame is None:
+            return False, None
+
+        return True, _copy_to_output(frame, image)
+
+    def enable_preview(self, factor=4, max_fps=15.0, callback=None):
+        """
+        开启低分辨率预览输出
+
+        预览帧直接由原始 Bayer 数据按 2x2 超像素去马赛克再抽样生成，
+        在独立线程中按限定帧率产生，成本只有完整转换的一小部分，不影响 read() 等全分辨率输出。
+
+        参数:
+            factor: int, 缩小倍数（2/4/8...），Bayer 格式下最小为 2
+            max_fps: float, 预览最大帧率
+            callback: callable(preview, info), 每个预览帧在预览线程中回调（如发送 Qt 信号）
+
+        返回:
+            bool: 是否成功开启
+        """
+        if not self.is_opened:
+            return False
+        self.disable_preview()
+        self.preview = PreviewStream(self, factor=factor, max_fps=max_fps, callback=callback)
+        self.preview.start()
+        return True
+
+    def disable_preview(self):
+        """关闭低分辨率预览输出"""
+        if self.preview is not None:
+            self.preview.stop()
+            self.preview = None
+
+    def enable_auto_exposure(self, target=110.0, **kwargs):
+        """
+        开启软件自动曝光 / 自动增益
+
+        在取图线程中按 Chunk 平均亮度或稀疏抽样直方图测光，几帧内收敛到目标亮度，
+        参数在独立线程中写入，不阻塞取图。其它参数见 AutoExposureController。
+
+        参数:
+            target: float, 目标平均亮度（0-255）
+
+        返回:
+            bool: 是否成功开启
+        """
+        if not self.is_opened:
+            return False
+        self.disable_auto_exposure()
+        controller = AutoExposureController(self, target=target, **kwargs)
+        if not controller.start():
+            return False
+        self.auto_exposure = controller
+        return True
+
+    def disable_auto_exposure(self):
+        """关闭软件自动曝光（保持当前曝光和增益）"""
+        if self.auto_exposure is not None:
+            self.auto_exposure.stop()
+            self.auto_exposure = None
+
+    def enable_change_gate(self, threshold=4.0, mode=GATE_DROP, **kwargs):
+        """
+        开启帧变化检测
+
+        在像素格式转换之前用原始数据的网格签名判断帧是否有变化，
+        GATE_DROP 模式下没有变化的帧不做转换、不更新最新帧。其它参数见 FrameChangeGate。
+
+        参数:
+            threshold: float, 变化阈值（任一格平均亮度差，0-255）
+            mode: str, GATE_MARK（只标记）/ GATE_DROP（丢弃）
+
+        返回:
+            bool: 是否成功开启
+        """
+        if not self.is_opened:
+            return False
+        self.disable_change_gate()
+        self.change_gate = FrameChangeGate(self, threshold=threshold, mode=mode, **kwargs)
+        self.change_gate.start()
+        return True
+
+    def disable_change_gate(self):
+        """关闭帧变化检测"""
+        if self.change_gate is not None:
+            self.change_gate.stop()
+            self.change_gate = None
+
+    def read_preview(self, timeout=1.0):
+        """
+        读取下一帧预览图像
+
+        参数:
+            timeout: float, 最长等待时间（秒）
+
+        返回:
+            tuple: (ret, preview) 预览图像为缩小后的 BGR 图像
+        """
+        if self.preview is None:
+            return False, None
+        return self.preview.read(timeout)
+
+    def set_software_trigger(self, enable):
+        """
+        切换软触发模式
+
+        参数:
+            enable: bool, True 为软触发模式，False 恢复连续采集
+
+        返回:
+            bool: 是否设置成功
+        """
+        if not self.is_opened:
+            return False
+
+        if enable:
+            ret = self.cam.MV_CC_SetEnumValue("TriggerMode", MV_TRIGGER_MODE_ON)
+            if ret == 0:
+                ret = self.cam.MV_CC_SetEnumValue("TriggerSource", MV_TRIGGER_SOURCE_SOFTWARE)
+            if ret == 0:
+                # 等待切换前已在传输中的连续采集帧到达后再清空
+                time.sleep(0.1)
+                self.cam.MV_CC_ClearImageBuffer()
+        else:
+            ret = self.cam.MV_CC_SetEnumValue("TriggerMode", MV_TRIGGER_MODE_OFF)
+        if ret != 0:
+            print(f"设置触发模式失败! ret[0x{ret:x}]")
+            return False
+
+        self.software_trigger = bool(enable)
+        self._last_trigger_index = None
+        self._pending_triggers = 0
+        return True
+
+    def trigger_and_wait(self, timeout=1.0):
+        """
+        软触发一次并等待该次触发对应的帧
+
+        首次调用时切换到软触发模式。每次触发前清空 SDK 缓存中的旧帧，
+        并记录上次收到的触发计数和此后发送的触发次数，只接受 nTriggerIndex 恰好等于
+        上次计数 + 已发送次数（32 位回绕）的帧；之前超时的触发迟到的帧计数更小，会被丢弃。
+        超时后如果等待期间收到过其他计数的帧（相机没有收到之前的触发、计数被其他触发推进或复位），
+        以最后收到的计数重新同步；本次调用不会返回无法确认对应关系的帧。
+        首次触发或相机未输出触发计数（Chunk 未开启，恒为 0）时，接受触发后到达的第一帧。
+
+        参数:
+            timeout: float, 等待帧的超时时间（秒）
+
+        返回:
+            tuple: (ret, frame, info)
+                ret: bool, 是否在超时前收到对应帧
+                frame: numpy.ndarray, BGR 图像
+                info: dict, 帧元数据，'trigger_latency' 为从发送触发到帧到达主机的时间（秒）
+        """
+        if not self.is_opened or not self.is_grabbing:
+            return False, None, None
+
+        with self._trigger_lock:
+            if not self.software_trigger and not self.set_software_trigger(True):
+                return False, None, None
+
+            ret = self.cam.MV_CC_ClearImageBuffer()
+            if ret != 0:
+                print(f"警告: 清空图像缓存失败! ret[0x{ret:x}]")
+
+            last_index = self._last_trigger_index
+            expected_index = None
+            if last_index is not None:
+                expected_index = (last_index + self._pending_triggers + 1) & 0xffffffff
+
+            cond = threading.Condition()
+            result = []
+            seen = []
+            fire_time = [None]
+
+            def listener(image, info):
+                with cond:
+                    if result or fire_time[0] is None or info['recv_time'] < fire_time[0]:
+                        return
+                    index = info['trigger_index']
+                    # 上次和这次都是 0 说明相机没有输出触发计数，不做比较
+                    if expected_index is not None and (last_index or index) and index != expected_index:
+                        seen.append(index)
+                        return
+                    result.append((image, info))
+                    cond.notify_all()
+
+            self.add_frame_listener(listener)
+            try:
+                with cond:
+                    fire_time[0] = time.perf_counter()
+                ret = self.cam.MV_CC_SetCommandValue("TriggerSoftware")
+                if ret != 0:
+                    # 触发没有发出，不计入已发送次数
+                    print(f"发送软触发失败! ret[0x{ret:x}]")
+                    return False, None, None
+
+                with cond:
+                    cond.wait_for(lambda: result, timeout)
+            finally:
+                self.remove_frame_listener(listener)
+
+            if not result:
+                self._trigger_stats['timeouts'] += 1
+                if seen:
+                    # 相机计数与预期不一致（漏收触发、计数被推进或复位），以最后收到的计数重新同步
+                    self._last_trigger_index = seen[-1]
+                    self._pending_triggers = 0
+                elif last_index is not None:
+                    # 这次触发的帧可能迟到或丢失，下次预期计数顺延
+                    self._pending_triggers += 1
+                return False, None, None
+
+            image, info = result[0]
+            info = dict(info)
+            info['trigger_latency'] = info['recv_time'] - fire_time[0]
+            self._last_trigger_index = info['trigger_index']
+            self._pending_triggers = 0
+
+            self._trigger_stats['triggers'] += 1
+            self._trigger_stats['latency_sum'] += info['trigger_latency']
+            self._trigger_stats['latency_max'] = max(self._trigger_stats['latency_max'],
+                                                     info['trigger_latency'])
+
+        return True, image.copy(), info
+
+    def get_trigger_stats(self):
+        """
+        获取 trigger_and_wait() 的统计
+
+        返回:
+            dict: triggers / timeouts / latency_avg / latency_max(秒) /
+                  max_rate(按平均延迟估算的最高触发频率, Hz)
+        """
+        stats = dict(self._trigger_stats)
+        latency_sum = stats.pop('latency_sum')
+        stats['latency_avg'] = latency_sum / stats['triggers'] if stats['triggers'] else 0.0
+        stats['max_rate'] = 1.0 / stats['latency_avg'] if stats['latency_avg'] > 0 else 0.0
+        return stats
+
+    def _set_image_node_num(self, num, remember=True):
+        """
+        内部方法：设置 SDK 图像缓存节点数
+
+        该设置只在 MV_CC_StartGrabbing 前生效，采集中调用时会先停止采集、设置后再恢复。
+        """
+        was_grabbing = self.is_grabbing
+        if was_grabbing:
+            self._stop_grabbing()
+
+        ret = self.cam.MV_CC_SetImageNodeNum(num)
+        if ret != 0:
+            print(f"设置图像缓存节点数失败! ret[0x{ret:x}]")
+        elif remember:
+            self.image_node_num = num
+
+        if was_grabbing:
+            self._start_grabbing()
+        return ret == 0
+
+    def _query_geometry(self):
+        """
+        内部方法：从相机节点读取当前图像宽、高和像素格式
+
+        返回:
+            tuple: (width, height, pixel_type)，读取失败时使用最近一帧的信息
+        """
+        stWidth = MVCC_INTVALUE_EX()
+        stHeight = MVCC_INTVALUE_EX()
+        stPixelFormat = MVCC_ENUMVALUE()
+        if self.cam.MV_CC_GetIntValueEx("Width", stWidth) == 0 and \
+                self.cam.MV_CC_GetIntValueEx("Height", stHeight) == 0 and \
+                self.cam.MV_CC_GetEnumValue("PixelFormat", stPixelFormat) == 0:
+            return int(stWidth.nCurValue), int(stHeight.nCurValue), int(stPixelFormat.nCurValue)
+
+        info = self.latest_info
+        if info is not None:
+            return info['width'], info['height'], info['pixel_type']
+        return None, None, None
+
+    def _get_int_node(self, name):
+        """内部方法：读取整型节点（含范围和步进），失败返回 None"""
+        stIntValue = MVCC_INTVALUE_EX()
+        if self.cam.MV_CC_GetIntValueEx(name, stIntValue) != 0:
+            return None
+        return stIntValue
+
+    @staticmethod
+    def _align_int_value(value, stIntValue):
+        """内部方法：把数值限制到节点范围内并按步进向下取整"""
+        minimum, maximum = int(stIntValue.nMin), int(stIntValue.nMax)
+        inc = max(int(stIntValue.nInc), 1)
+        value = min(max(int(value), minimum), maximum)
+        return minimum + (value - minimum) // inc * inc
+
+    def _set_int_node_aligned(self, name, value):
+        """
+        内部方法：按节点范围和步进设置整型节点
+
+        返回:
+            int: 实际设置的值，失败返回 None
+        """
+        stIntValue = self._get_int_node(name)
+        if stIntValue is None:
+            return None
+        value = self._align_int_value(value, stIntValue)
+        ret = self.cam.MV_CC_SetIntValue(name, value)
+        if ret != 0:
+            print(f"设置 {name}={value} 失败! ret[0x{ret:x}]")
+            return None
+        return value
+
+    def _reset_frame_cache(self):
+        """内部方法：图像尺寸变化后丢弃旧尺寸的缓存帧和转换缓冲"""
+        self._roi_offset = None
+        with self.buffer_lock:
+            self.buf_save_image = None
+            self.buf_save_image_len = 0
+        with self.frame_cond:
+            self.latest_frame = None
+            self.latest_info = None
+
+    def get_roi(self):
+        """
+        获取当前 ROI
+
+        返回:
+            tuple: (offset_x, offset_y, width, height)，读取失败返回 None
+        """
+        if not self.is_opened:
+            return None
+        values = [self._get_int_node(name) for name in ("OffsetX", "OffsetY", "Width", "Height")]
+        if any(v is None for v in values):
+            return None
+        return tuple(int(v.nCurValue) for v in values)
+
+    def set_roi(self, x=0, y=0, width=None, height=None):
+        """
+        设置硬件 ROI（减少传感器读出量，提高帧率、降低带宽）
+
+        采集中调用时会先停止采集，按"偏移清零 -> 宽高 -> 偏移"的顺序设置
+        （宽高的最大值受当前偏移限制），数值按节点范围和步进对齐，
+        然后丢弃旧尺寸的缓存并恢复采集。
+
+        参数:
+            x, y: int, ROI 左上角偏移
+            width, height: int, ROI 宽高，None 表示取最大值
+
+        返回:
+            bool: 是否全部设置成功（实际值可能因步进对齐而略小于请求值，见 get_roi()）
+        """
+        if not self.is_opened:
+            return False
+
+        was_grabbing = self.is_grabbing
+        if was_grabbing:
+            self._stop_grabbing()
+
+        try:
+            # 先把偏移清零，宽高才能取到完整范围
+            self.cam.MV_CC_SetIntValue("OffsetX", 0)
+            self.cam.MV_CC_SetIntValue("OffsetY", 0)
+
+            applied = [
+                self._set_int_node_aligned("Width", width if width is not None else 1 << 30),
+                self._set_int_node_aligned("Height", height if height is not None else 1 << 30),
+                self._set_int_node_aligned("OffsetX", x),
+                self._set_int_node_aligned("OffsetY", y),
+            ]
+            ok = all(v is not None for v in applied)
+            if ok:
+                print(f"ROI 已设置: offset=({applied[2]}, {applied[3]}), size={applied[0]}x{applied[1]}")
+        finally:
+            self._reset_frame_cache()
+            if was_grabbing:
+                self._start_grabbing()
+        return ok
+
+    def reset_roi(self):
+        """
+        恢复全幅图像
+
+        返回:
+            bool: 是否设置成功
+        """
+        return self.set_roi(0, 0, None, None)
+
+    def move_roi(self, x, y):
+        """
+        移动 ROI 偏移（宽高不变）
+
+        图像尺寸不变，多数设备允许在采集中直接修改 OffsetX/OffsetY，不需要停止采集；
+        设备不允许时自动退回为停止、设置、恢复。
+
+        参数:
+            x, y: int, 新的 ROI 左上角偏移
+
+        返回:
+            bool: 是否设置成功
+        """
+        if not self.is_opened:
+            return False
+
+        if self._set_int_node_aligned("OffsetX", x) is not None and \
+                self._set_int_node_aligned("OffsetY", y) is not None:
+            self._roi_offset = None
+            return True
+
+        if not self.is_grabbing:
+            return False
+        self._stop_grabbing()
+        try:
+            ok = self._set_int_node_aligned("OffsetX", x) is not None and \
+                self._set_int_node_aligned("OffsetY", y) is not None
+        finally:
+            self._roi_offset = None
+            self._start_grabbing()
+        return ok
+
+    def _set_readout_nodes(self, nodes):
+        """
+        内部方法：停止采集后设置会改变图像尺寸的节点（Binning / Decimation），再恢复采集
+
+        参数:
+            nodes: list of (节点名, 值)
+        """
+        if not self.is_opened:
+            return False
+
+        was_grabbing = self.is_grabbing
+        if was_grabbing:
+            self._stop_grabbing()
+
+        ok = True
+        try:
+            for name, value in nodes:
+                # 不同型号分别以枚举或整型节点实现
+                ret = self.cam.MV_CC_SetEnumValue(name, int(value))
+                if ret != 0:
+                    ret = self.cam.MV_CC_SetIntValue(name, int(value))
+                if ret != 0:
+                    print(f"设置 {name}={value} 失败! ret[0x{ret:x}]")
+                    ok = False
+        finally:
+            self._reset_frame_cache()
+            if was_grabbing:
+                self._start_grabbing()
+        return ok
+
+    def set_binning(self, horizontal, vertical=None):
+        """
+        设置像素合并（Binning），图像尺寸随之缩小
+
+        参数:
+            horizontal: int, 水平合并数（1/2/4 等，取决于型号）
+            vertical: int, 垂直合并数，None 时与水平相同
+
+        返回:
+            bool: 是否设置成功
+        """
+        vertical = horizontal if vertical is None else vertical
+        return self._set_readout_nodes([("BinningHorizontal", horizontal), ("BinningVertical", vertical)])
+
+    def set_decimation(self, horizontal, vertical=None):
+        """
+        设置抽样（Decimation），图像尺寸随之缩小
+
+        参数:
+            horizontal: int, 水平抽样数
+            vertical: int, 垂直抽样数，None 时与水平相同
+
+        返回:
+            bool: 是否设置成功
+        """
+        vertical = horizontal if vertical is None else vertical
+        return self._set_readout_nodes([("DecimationHorizontal", horizontal), ("DecimationVertical", vertical)])
+
+    def capture_burst(self, n, into=None, timeout=10.0, image_nodes=None):
+        """
+        连续采集 n 帧原始图像到预分配的帧栈
+
+        采集期间临时把 SDK 图像缓存节点数提高到 image_nodes（默认 n），
+        原始数据在取图线程中直接拷贝进 into[i]，不经过像素格式转换和最新帧路径。
+        结束后恢复之前通过 CAP_PROP_BUFFERSIZE 设置的节点数（未设置过则保持 image_nodes）。
+
+        参数:
+            n: int, 帧数
+            into: numpy.ndarray, 可选的预分配数组，形状 (>=n, H, W[, C])，需 C 连续且类型匹配；
+                  None 时自动分配
+            timeout: float, 等待 n 帧的超时时间（秒）
+            image_nodes: int, 采集期间的 SDK 图像缓存节点数，默认为 n
+
+        返回:
+            tuple: (ret, frames, meta, report)
+                ret: bool, 是否采满 n 帧
+                frames: numpy.ndarray, 原始帧栈（Mono8/Bayer8 为 (n, H, W) uint8，
+                        Mono16/Bayer16 及 10/12 位非 Packed 格式为 uint16，RGB8 为 (n, H, W, 3)）
+                meta: numpy.ndarray, BURST_META_DTYPE 结构化数组，与 frames 一一对应
+                report: dict, {'captured', 'lost_frames', 'gaps', 'incomplete_frames',
+                               'mismatched', 'duration', 'fps'}
+        """
+        if not self.is_opened:
+            return False, None, None, None
+
+        width, height, pixel_type = self._query_geometry()
+        if width is None:
+            print("无法获取图像尺寸")
+            return False, None, None, None
+
+        shape, dtype = _raw_frame_layout(width, height, pixel_type)
+        if into is None:
+            into = np.empty((n,) + shape, dtype=dtype)
+        elif into.shape[0] < n or into.shape[1:] != shape or into.dtype != dtype or \
+                not into.flags['C_CONTIGUOUS']:
+            raise ValueError(f"预分配数组不匹配: 需要 (>={n},)+{shape} {np.dtype(dtype)} 且 C 连续，"
+                             f"实际 {into.shape} {into.dtype}")
+
+        meta = np.zeros(n, dtype=BURST_META_DTYPE)
+        frame_bytes = into[0].nbytes
+        state = {'index': 0, 'mismatched': 0}
+        done = threading.Event()
+
+        def sink(raw, info):
+            i = state['index']
+            if i >= n:
+                return True
+            if raw.size < frame_bytes:
+                state['mismatched'] += 1
+                return True
+            memmove(into[i].ctypes.data, raw.ctypes.data, frame_bytes)
+            meta[i] = (info['frame_num'], info['dev_timestamp'], info['host_timestamp'],
+                       info['trigger_index'], info['lost_packet'], info['recv_time'])
+            state['index'] = i + 1
+            if i + 1 == n:
+                done.set()
+            return True
+
+        was_grabbing = self.is_grabbing
+        if was_grabbing:
+            self._stop_grabbing()
+        ret = self.cam.MV_CC_SetImageNodeNum(image_nodes or n)
+        if ret != 0:
+            print(f"警告: 设置图像缓存节点数失败! ret[0x{ret:x}]")
+
+        self.add_raw_listener(sink)
+        try:
+            self._start_grabbing()
+            done.wait(timeout)
+        finally:
+            self.remove_raw_listener(sink)
+            self._stop_grabbing()
+            if self.image_node_num is not None:
+                self.cam.MV_CC_SetImageNodeNum(self.image_node_num)
+            if was_grabbing:
+                self._start_grabbing()
+
+        captured = state['index']
+        frame_nums = meta['frame_num'][:captured].astype(np.int64)
+        steps = (np.diff(frame_nums) & 0xffffffff) - 1
+        gap_idx = np.nonzero(steps > 0)[0]
+        duration = float(meta['recv_time'][captured - 1] - meta['recv_time'][0]) if captured > 1 else 0.0
+        report = {
+            'captured': captured,
+            'lost_frames': int(steps[gap_idx].sum()),
+            'gaps': [(int(frame_nums[i]), int(steps[i])) for i in gap_idx],
+            'incomplete_frames': int(np.count_nonzero(meta['lost_packet'][:captured])),
+            'mismatched': state['mismatched'],
+            'duration': duration,
+            'fps': (captured - 1) / duration if duration > 0 else 0.0,
+        }
+        if captured < n:
+            print(f"连拍未完成: {captured}/{n} 帧")
+
+        return captured == n, into[:n], meta, report
+
+    def set_buffer_policy(self, policy, size=1):
+        """
+        设置 frames() 迭代器的缓冲策略
+
+        参数:
+            policy: str
+                BUFFER_LATEST - 只保留最新帧，消费者处理慢时跳过中间帧（info['dropped'] 记录跳过数）
+                BUFFER_RING   - 环形缓冲最多 size 帧，吸收消费者处理的短时波动；
+                                缓冲满时覆盖最旧的帧（info['dropped'] 记录跳过数）
+            size: int, BUFFER_RING 策略下的缓冲帧数
+
+        两种策略都不形成背压：取图线程从不等待 frames() 的消费者，
+        慢的或未关闭的生成器不影响 read()、其他监听器和录制，但平均处理速度低于帧率时一定会丢帧。
+        需要不丢帧时应保证消费者跟得上帧率，或用 add_raw_listener() 在取图线程中直接处理。
+        """
+        if policy not in (BUFFER_LATEST, BUFFER_RING):
+            raise ValueError(f"无效的缓冲策略: {policy!r}")
+        self.buffer_policy = policy
+        self.buffer_ring_size = max(1, int(size))
+
+    def frames(self, max_frames=None, timeout=1.0, copy=False):
+        """
+        帧生成器：每个新帧最多输出一次，并附带元数据
+
+        按 set_buffer_policy() 配置的策略缓冲，消费者跟不上帧率时丢帧（不会阻塞取图线程），
+        丢帧数记录在 info['dropped'] 中。无忙等待，可直接用普通生成器组合处理流水线：
+            frames = cam.frames()
+            good = (f for f in frames if f[1]['lost_packet'] == 0)
+            for image, info in good:
+                ...
+
+        参数:
+            max_frames: int, 最多输出的帧数，None 表示不限
+            timeout: float, 等待单帧的超时时间（秒），超时或相机停止采集时迭代结束；None 表示一直等待
+            copy: bool, 是否输出图像副本（默认输出与其他消费者共享的数组，需原地修改时应设为 True）
+
+        生成:
+            tuple: (frame, info)，info['dropped'] 为与上一次输出之间跳过的帧数
+        """
+        if not self.is_opened:
+            return
+
+        # 环形缓冲：满时覆盖最旧的帧，监听器在取图线程中调用，不能等待消费者
+        queue_size = 1 if self.buffer_policy == BUFFER_LATEST else self.buffer_ring_size
+        pending = collections.deque(maxlen=queue_size)
+        cond = threading.Condition()
+
+        def listener(image, info):
+            with cond:
+                pending.append((image, info))
+                cond.notify_all()
+
+        self.add_frame_listener(listener)
+        try:
+            count = 0
+            last_seq = None
+            while max_frames is None or count < max_frames:
+                with cond:
+                    if not cond.wait_for(lambda: pending or not self.is_grabbing, timeout):
+                        return
+                    if not pending:
+                        return
+                    image, info = pending.popleft()
+
+                info = dict(info)
+                info['dropped'] = 0 if last_seq is None else info['seq'] - last_seq - 1
+                last_seq = info['seq']
+                count += 1
+                yield (image.copy() if copy else image), info
+        finally:
+            self.remove_frame_listener(listener)
+
+    def start_record(self, path, fps=None, bitrate=4096, queue_size=16):
+        """
+        开始 SDK 录像（AVI）
+
+        原始数据由独立线程送入 SDK 编码器，不影响 read() 等正常取图。
+
+        参数:
+            path: str, 录像文件路径（.avi）
+            fps: float, 录像帧率，None 时使用相机当前帧率
+            bitrate: int, 码率 kbps [128-16384]
+            queue_size: int, 等待编码的最大帧数，超出时丢帧
+
+        返回:
+            bool: 是否成功开始
+        """
+        if self.recorder is not None and self.recorder.is_recording():
+            print("已经在录像中")
+            return False
+
+        self.recorder = AviRecorder(self, path, fps=fps, bitrate=bitrate, queue_size=queue_size)
+        if not self.recorder.start():
+            self.recorder = None
+            return False
+        return True
+
+    def stop_record(self):
+        """停止 SDK 录像"""
+        if self.recorder is not None:
+            self.recorder.stop()
+
+    def get_record_stats(self):
+        """
+        获取录像统计（见 AviRecorder.get_stats()）
+
+        返回:
+            dict: 统计信息，从未录像时返回 None
+        """
+        return self.recorder.get_stats() if self.recorder is not None else None
+
+    def isOpened(self):
+        """
+        检查相机是否已打开（类似OpenCV的cap.isOpened()）
+
+        返回:
+            bool: 相机是否已打开
+        """
+        return self.is_opened
+
+    def release(self):
+        """
+        释放相机资源（类似OpenCV的cap.release()）
+        """
+        if not self.is_opened:
+            return
+
+        # 停止录像、预览、软件自动曝光和帧变化检测
+        self.stop_record()
+        self.disable_preview()
+        self.disable_auto_exposure()
+        self.disable_change_gate()
+
+        # 停止采集
+        if self.is_grabbing:
+            self._stop_grabbing()
+
+        # 关闭设备
+        ret = self.cam.MV_CC_CloseDevice()
+        if ret != 0:
+            print(f"关闭设备失败! ret[0x{ret:x}]")
+
+        # 销毁句柄
         self.cam.MV_CC_DestroyHandle()
 
-        self.is_opened = False
-        self.cam = None
+        self.is_opened = False
+        self.cam = None
+
+        # 清理缓存
+        if self.buf_save_image is not None:
+            del self.buf_save_image
+            self.buf_save_image = None
+
+        print(f"相机 [{self.index}] 已释放")
+
+    def get(self, propId):
+        """
+        获取相机属性（类似OpenCV的cap.get()）
+
+        参数:
+            propId: 属性ID
+                - 3: CV_CAP_PROP_FRAME_WIDTH (宽度)
+                - 4: CV_CAP_PROP_FRAME_HEIGHT (高度)
+                - 5: CV_CAP_PROP_FPS (帧率)
+                - 15: CV_CAP_PROP_EXPOSURE (曝光时间)
+                - 16: CV_CAP_PROP_CONVERT_RGB (1 为 BGR8 输出，0 为原生数据输出)
+                - 17: CV_CAP_PROP_GAIN (增益)
+                - 24: CV_CAP_PROP_TRIGGER (1 为软触发模式，0 为连续采集)
+                - 38: CV_CAP_PROP_BUFFERSIZE (SDK 图像节点数，未设置时为 0)
+
+        返回:
+            float: 属性值
+        """
+        if not self.is_opened:
+            return 0.0
+
+        try:
+            if propId in (3, 4):  # Width / Height
+                stIntValue = self._get_int_node("Width" if propId == 3 else "Height")
+                if stIntValue is not None:
+                    return float(stIntValue.nCurValue)
+                info = self.latest_info
+                if info is not None:
+                    return float(info['width'] if propId == 3 else info['height'])
+                return 0.0
+            elif propId == 5:  # FPS
+                stFloatValue = MVCC_FLOATVALUE()
+                ret = self.cam.MV_CC_GetFloatValue("AcquisitionFrameRate", stFloatValue)
+                if ret == 0:
+                    return stFloatValue.fCurValue
+            elif propId == 15:  # Exposure
+                stFloatValue = MVCC_FLOATVALUE()
+                ret = self.cam.MV_CC_GetFloatValue("ExposureTime", stFloatValue)
+                if ret == 0:
+                    return stFloatValue.fCurValue
+            elif propId == 17:  # Gain
+                stFloatValue = MVCC_FLOATVALUE()
+                ret = self.cam.MV_CC_GetFloatValue("Gain", stFloatValue)
+                if ret == 0:
+                    return stFloatValue.fCurValue
+            elif propId == 16:  # ConvertRGB
+                return 1.0 if self.output_format == OUTPUT_BGR8 else 0.0
+            elif propId == 24:  # Trigger
+                return 1.0 if self.software_trigger else 0.0
+            elif propId == 38:  # BufferSize
+                return float(self.image_node_num or 0)
+        except Exception as e:
+            print(f"获取属性失败: {e}")
+
+        return 0.0
+
+    def set(self, propId, value):
+        """
+        设置相机属性（类似OpenCV的cap.set()）
+
+        参数:
+            propId: 属性ID
+                - 3: CV_CAP_PROP_FRAME_WIDTH (ROI 宽度，保持当前偏移，见 set_roi())
+                - 4: CV_CAP_PROP_FRAME_HEIGHT (ROI 高度，保持当前偏移，见 set_roi())
+                - 5: CV_CAP_PROP_FPS (帧率)
+                - 15: CV_CAP_PROP_EXPOSURE (曝光时间)
+                - 16: CV_CAP_PROP_CONVERT_RGB (非 0 为 BGR8 输出，0 为原生数据输出 OUTPUT_RAW)
+                - 17: CV_CAP_PROP_GAIN (增益)
+                - 24: CV_CAP_PROP_TRIGGER (非 0 切换为软触发模式，0 恢复连续采集)
+                - 38: CV_CAP_PROP_BUFFERSIZE (SDK 图像节点数 MV_CC_SetImageNodeNum)
+            value: 属性值
+
+        返回:
+            bool: 是否设置成功
+        """
+        if not self.is_opened:
+            return False
+
+        try:
+            if propId in (3, 4):  # Width / Height
+                roi = self.get_roi()
+                if roi is None:
+                    return False
+                x, y, width, height = roi
+                if propId == 3:
+                    return self.set_roi(x, y, int(value), height)
+                return self.set_roi(x, y, width, int(value))
+            elif propId == 5:  # FPS
+                ret = self.cam.MV_CC_SetFloatValue("AcquisitionFrameRate", float(value))
+                return ret == 0
+            elif propId == 15:  # Exposure
+                self.disable_auto_exposure()
+                ret = self.cam.MV_CC_SetEnumValue("ExposureAuto", 0)  # 关闭自动曝光
+                time.sleep(0.1)
+                ret = self.cam.MV_CC_SetFloatValue("ExposureTime", float(value))
+                return ret == 0
+            elif propId == 17:  # Gain
+                self.disable_auto_exposure()
+                ret = self.cam.MV_CC_SetFloatValue("Gain", float(value))
+                return ret == 0
+            elif propId == 16:  # ConvertRGB
+                return self.set_output_format(OUTPUT_BGR8 if value else OUTPUT_RAW)
+            elif propId == 24:  # Trigger
+                return self.set_software_trigger(bool(value))
+            elif propId == 38:  # BufferSize
+                return self._set_image_node_num(int(value))
+        except Exception as e:
+            print(f"设置属性失败: {e}")
+
+        return False
+
+    def __del__(self):
+        """析构函数：确保资源被释放"""
+        if self.is_opened:
+            self.release()
+
+
+# ================================
+# OpenCV 完整常量定义（参考 cv2.__init__.pyi）
+# ================================
+
+# VideoCaptureProperties - 基础属性
+CAP_PROP_POS_MSEC = 0
+CAP_PROP_POS_FRAMES = 1
+CAP_PROP_POS_AVI_RATIO = 2
+CAP_PROP_FRAME_WIDTH = 3
+CAP_PROP_FRAME_HEIGHT = 4
+CAP_PROP_FPS = 5
+CAP_PROP_FOURCC = 6
+CAP_PROP_FRAME_COUNT = 7
+CAP_PROP_FORMAT = 8
+CAP_PROP_MODE = 9
+CAP_PROP_BRIGHTNESS = 10
+CAP_PROP_CONTRAST = 11
+CAP_PROP_SATURATION = 12
+CAP_PROP_HUE = 13
+CAP_PROP_GAIN = 14
+CAP_PROP_EXPOSURE = 15
+CAP_PROP_CONVERT_RGB = 16
+CAP_PROP_WHITE_BALANCE_BLUE_U = 17
+CAP_PROP_RECTIFICATION = 18
+CAP_PROP_MONOCHROME = 19
+CAP_PROP_SHARPNESS = 20
+CAP_PROP_AUTO_EXPOSURE = 21
+CAP_PROP_GAMMA = 22
+CAP_PROP_TEMPERATURE = 23
+CAP_PROP_TRIGGER = 24
+CAP_PROP_TRIGGER_DELAY = 25
+CAP_PROP_WHITE_BALANCE_RED_V = 26
+CAP_PROP_ZOOM = 27
+CAP_PROP_FOCUS = 28
+CAP_PROP_GUID = 29
+CAP_PROP_ISO_SPEED = 30
+CAP_PROP_BACKLIGHT = 32
+CAP_PROP_PAN = 33
+CAP_PROP_TILT = 34
+CAP_PROP_ROLL = 35
+CAP_PROP_IRIS = 36
+CAP_PROP_SETTINGS = 37
+CAP_PROP_BUFFERSIZE = 38
+CAP_PROP_AUTOFOCUS = 39
+CAP_PROP_SAR_NUM = 40
+CAP_PROP_SAR_DEN = 41
+CAP_PROP_BACKEND = 42
+CAP_PROP_CHANNEL = 43
+CAP_PROP_AUTO_WB = 44
+CAP_PROP_WB_TEMPERATURE = 45
+
+# VideoCaptureAPIs
+CAP_ANY = 0
+CAP_HIKVISION = 9900  # 自定义后端
+
+
+class VideoCapture:
+    """
+    OpenCV 完全兼容的 VideoCapture 类
+
+    完全实现 cv2.VideoCapture 的所有方法和接口，可以直接替代使用。
+
+    初始化方式（与 OpenCV 完全相同）：
+        VideoCapture()                    # 空初始化
+        VideoCapture(0)                   # 相机索引
+        VideoCapture(0, CAP_HIKVISION)   # 相机索引 + API
+        VideoCapture("serial:DA1234")     # 按序列号打开（也支持 "ip:..." / "name:..."）
+
+    使用示例：
+        # 就像使用 cv2.VideoCapture 一样
+        cap = VideoCapture(0)
+
+        if not cap.isOpened():
+            print("无法打开相机")
+            exit()
+
+        while True:
+            ret, frame = cap.read()
+            if ret:
+                cv2.imshow('Camera', frame)
+            if cv2.waitKey(1) & 0xFF == ord('q'):
+                break
+
+        cap.release()
+        cv2.destroyAllWindows()
+
+    支持的方法（完全兼容 OpenCV）：
+        - open(index, apiPreference=CAP_ANY) -> bool
+        - isOpened() -> bool
+        - release() -> None
+        - grab() -> bool
+        - retrieve(image=None, flag=0) -> Tuple[bool, np.ndarray]
+        - read(image=None) -> Tuple[bool, np.ndarray]
+        - set(propId, value) -> bool
+        - get(propId) -> float
+        - getBackendName() -> str
+        - setExceptionMode(enable) -> None
+        - getExceptionMode() -> bool
+    """
+
+    def __init__(self, index=None, apiPreference=CAP_ANY):
+        """
+        初始化 VideoCapture 对象
+
+        参数:
+            index: int, 相机索引（0, 1, 2...）；str, 设备标识（"serial:xxx" 等）；或 None
+            apiPreference: int, API偏好（CAP_ANY, CAP_HIKVISION等）
+        """
+        self._camera = None
+        self._exception_mode = False
+        self._grabbed_frame = None
+
+        # 如果提供了 index，自动打开
+        if index is not None:
+            self.open(index, apiPreference)
+
+    def open(self, index, apiPreference=CAP_ANY):
+        """
+        打开相机（完全兼容 OpenCV）
+
+        参数:
+            index: int 或 str, 相机索引或设备标识（"serial:xxx" / "ip:x.x.x.x" / "name:xxx"）
+            apiPreference: int, API偏好
+
+        返回:
+            bool: 是否成功打开
+        """
+        try:
+            self._camera = HikCamera(index)
+            return self._camera.isOpened()
+        except Exception as e:
+            if self._exception_mode:
+                raise
+            print(f"打开相机失败: {e}")
+            return False
+
+    def isOpened(self):
+        """
+        检查相机是否已打开（完全兼容 OpenCV）
+
+        返回:
+            bool: 相机是否已打开
+        """
+        return self._camera is not None and self._camera.isOpened()
+
+    def release(self):
+        """
+        释放相机资源（完全兼容 OpenCV）
+        """
+        if self._camera is not None:
+            self._camera.release()
+            self._camera = None
+        self._grabbed_frame = None
+
+    def grab(self):
+        """
+        抓取下一帧但不解码（完全兼容 OpenCV）
+
+        注意：多路相机依次调用 grab() 得到的帧之间没有时间对齐，
+        需要按时间戳/触发计数同步采集时请使用 MultiCapture。
+
+        返回:
+            bool: 是否成功抓取
+        """
+        if not self.isOpened():
+            return False
+
+        # 只保留最新帧的引用，复制推迟到 retrieve()
+        frame = self._camera._peek_frame()
+        if frame is not None:
+            self._grabbed_frame = frame
+            return True
+        return False
+
+    def retrieve(self, image=None, flag=0):
+        """
+        解码并返回上次 grab() 的帧（完全兼容 OpenCV）
+
+        参数:
+            image: numpy.ndarray, 可选的输出数组；形状和类型匹配且 C 连续时直接写入并返回它，
+                   不匹配时重新分配（与 OpenCV 相同）
+            flag: 标志（暂不支持）
+
+        返回:
+            Tuple[bool, np.ndarray]: (是否成功, 图像数组)
+        """
+        if self._grabbed_frame is None:
+            return False, None
+        return True, _copy_to_output(self._grabbed_frame, image)
+
+    def read(self, image=None):
+        """
+        读取一帧图像（完全兼容 OpenCV）
+
+        等同于 grab() + retrieve()
+
+        参数:
+            image: numpy.ndarray, 可选的输出数组；循环中传入上一次返回的数组即可做到每帧不分配内存：
+                       frame = None
+                       while True:
+                           ret, frame = cap.read(frame)
+
+        返回:
+            Tuple[bool, np.ndarray]: (是否成功, 图像数组)
+        """
+        if not self.isOpened():
+            return False, None
+
+        return self._camera.read(image)
+
+    def set(self, propId, value):
+        """
+        设置相机属性（完全兼容 OpenCV）
+
+        参数:
+            propId: int, 属性ID（CAP_PROP_*常量）
+            value: float, 属性值
+
+        返回:
+            bool: 是否设置成功
+        """
+        if not self.isOpened():
+            return False
+
+        return self._camera.set(propId, value)
+
+    def get(self, propId):
+        """
+        获取相机属性（完全兼容 OpenCV）
+
+        参数:
+            propId: int, 属性ID（CAP_PROP_*常量）
+
+        返回:
+            float: 属性值
+        """
+        if not self.isOpened():
+            return 0.0
+
+        # 特殊处理 BACKEND 属性
+        if propId == CAP_PROP_BACKEND:
+            return float(CAP_HIKVISION)
+
+        return self._camera.get(propId)
+
+    def startRecord(self, filename, fps=None, bitrate=4096, queue_size=16):
+        """
+        开始录像（类似 VideoWriter，但直接由 SDK 编码相机原始数据）
+
+        参数:
+            filename: str, 录像文件路径（.avi）
+            fps: float, 录像帧率，None 时使用相机当前帧率
+            bitrate: int, 码率 kbps
+            queue_size: int, 等待编码的最大帧数
+
+        返回:
+            bool: 是否成功开始
+        """
+        if not self.isOpened():
+            return False
+        return self._camera.start_record(filename, fps=fps, bitrate=bitrate, queue_size=queue_size)
+
+    def stopRecord(self):
+        """停止录像"""
+        if self._camera is not None:
+            self._camera.stop_record()
+
+    def getRecordStats(self):
+        """
+        获取录像统计（编码帧数、丢帧数、队列深度、编码帧率等）
+
+        返回:
+            dict: 统计信息，从未录像时返回 None
+        """
+        if self._camera is None:
+            return None
+        return self._camera.get_record_stats()
+
+    def getBackendName(self):
+        """
+        获取后端名称（完全兼容 OpenCV）
+
+        返回:
+            str: 后端名称 "HIKVISION"
+        """
+        return "HIKVISION"
+
+    def setExceptionMode(self, enable):
+        """
+        设置异常模式（完全兼容 OpenCV）
+
+        参数:
+            enable: bool, True=抛出异常，False=返回错误码
+        """
+        self._exception_mode = enable
+
+    def getExceptionMode(self):
+        """
+        获取异常模式状态（完全兼容 OpenCV）
+
+        返回:
+            bool: 当前异常模式
+        """
+        return self._exception_mode
+
+    def __enter__(self):
+        """上下文管理器支持"""
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        """上下文管理器支持"""
+        self.release()
+        return False
+
+    def __del__(self):
+        """析构函数"""
+        self.release()
+
+    def __repr__(self):
+        """字符串表示"""
+        if self.isOpened():
+            width = int(self.get(CAP_PROP_FRAME_WIDTH))
+            height = int(self.get(CAP_PROP_FRAME_HEIGHT))
+            return f"<VideoCapture HIKVISION [{width}x{height}]>"
+        return "<VideoCapture (closed)>"
+
+
+# ================================
+# 原始数据录制
+# ================================
+
+# 录制索引记录结构（每帧一条，按顺序追加到 .idx 文件）
+RECORD_INDEX_DTYPE = np.dtype([
+    ('segment', np.uint32),
+    ('offset', np.uint64),
+    ('length', np.uint32),
+    ('width', np.uint32),
+    ('height', np.uint32),
+    ('pixel_type', np.uint32),
+    ('frame_num', np.uint32),
+    ('dev_timestamp', np.uint64),
+    ('host_timestamp', np.int64),
+    ('trigger_index', np.uint32),
+    ('lost_packet', np.uint32),
+])
+
+RECORD_FORMAT_VERSION = 1
+
+
+class _BufferPool:
+    """
+    内部类：固定数量的可复用帧缓冲
+
+    取图线程取缓冲、后台线程用完归还；缓冲按需分配，池耗尽时 acquire() 返回 None（调用方丢帧）。
+    """
+
+    def __init__(self, size):
+        self.size = size
+        self._free = collections.deque()
+        self._allocated = 0
+
+    def acquire(self, nbytes):
+        """取一个至少 nbytes 的一维 uint8 缓冲，池耗尽时返回 None"""
+        if self._free:
+            buf = self._free.popleft()
+        elif self._allocated < self.size:
+            self._allocated += 1
+            buf = np.empty(nbytes, dtype=np.uint8)
+        else:
+            return None
+        if buf.size < nbytes:
+            buf = np.empty(nbytes, dtype=np.uint8)
+        return buf
+
+    def release(self, buf):
+        """归还缓冲"""
+        self._free.append(buf)
+
+
+class RawRecorder:
+    """
+    原始数据录制器
+
+    取图线程只把原始负载拷贝到预分配的缓冲池中（不做像素格式转换），
+    由独立的写盘线程顺序写入预分配的大分段文件，并维护每帧的偏移和元数据索引。
+    缓冲池耗尽时丢弃新帧并计数，绝不阻塞采集。
+
+    录制产物（以 path="D:/rec/line1" 为例）:
+        line1.json          录制头信息（版本、索引结构、分段列表、相机信息）
+        line1.idx           帧索引（RECORD_INDEX_DTYPE 记录顺序排列）
+        line1_00000.seg     分段数据文件，每帧起始偏移按 alignment 对齐
+
+    使用示例:
+        cam = HikCamera(0)
+        with RawRecorder(cam, "D:/rec/line1", segment_size=4 << 30) as rec:
+            time.sleep(60)
+            print(rec.get_stats())
+    """
+
+    def __init__(self, camera, path, segment_size=2 << 30, alignment=4096, pool_size=64,
+                 skip_convert=False):
+        """
+        参数:
+            camera: HikCamera, 已打开的相机
+            path: str, 录制文件路径前缀（不含扩展名）
+            segment_size: int, 单个分段文件的预分配大小（字节）
+            alignment: int, 帧起始偏移的对齐字节数（便于回放时按页映射）
+            pool_size: int, 缓冲池帧数，决定可吸收的写盘抖动
+            skip_convert: bool, 为 True 时录制的帧不再做 BGR 转换（纯录制模式，节省 CPU）
+        """
+        self.camera = camera
+        self.path = path
+        self.segment_size = segment_size
+        self.alignment = alignment
+        self.pool_size = pool_size
+        self.skip_convert = skip_convert
+
+        self._pool = _BufferPool(pool_size)
+        self._queue = queue.Queue()
+        self._writer = None
+        self._running = False
+        self._accepting = False
+
+        self._segments = []
+        self._segment_file = None
+        self._segment_offset = 0
+        self._index_file = None
+
+        self._first_info = None
+        self._stats_lock = threading.Lock()
+        self._stats = {'frames_written': 0, 'bytes_written': 0, 'frames_dropped': 0,
+                       'segments': 0, 'start_time': None, 'stop_time': None}
+
+    def _on_raw(self, raw, info):
+        """取图线程回调：拷贝原始负载并交给写盘线程"""
+        buf = self._pool.acquire(raw.size)
+        if buf is None:
+            with self._stats_lock:
+                self._stats['frames_dropped'] += 1
+            return self.skip_convert
+        memmove(buf.ctypes.data, raw.ctypes.data, raw.size)
+        with self._stats_lock:
+            # stop() 之后到达的帧不再投递
+            if not self._accepting:
+                self._pool.release(buf)
+                return False
+            self._queue.put((buf, raw.size, info))
+        return self.skip_convert
+
+    def _open_segment(self):
+        """内部方法：新建并预分配下一个分段文件"""
+        if self._segment_file is not None:
+            self._close_segment()
+
+        name = f"{os.path.basename(self.path)}_{len(self._segments):05d}.seg"
+        f = open(os.path.join(os.path.dirname(self.path) or '.', name), 'wb', buffering=0)
+        try:
+            if hasattr(os, 'posix_fallocate'):
+                os.posix_fallocate(f.fileno(), 0, self.segment_size)
+            else:
+                f.truncate(self.segment_size)
+        except OSError as e:
+            print(f"警告: 预分配分段文件失败: {e}")
+        self._segments.append(name)
+        self._segment_file = f
+        self._segment_offset = 0
+        with self._stats_lock:
+            self._stats['segments'] = len(self._segments)
+
+    def _close_segment(self):
+        """内部方法：截断分段文件到实际写入长度并关闭"""
+        self._segment_file.truncate(self._segment_offset)
+        self._segment_file.close()
+        self._segment_file = None
+
+    def _write_frame(self, buf, nbytes, info):
+        """内部方法：写入一帧并追加索引"""
+        if self._segment_file is None or self._segment_offset + nbytes > self.segment_size:
+            self._open_segment()
+
+        offset = self._segment_offset
+        self._segment_file.write(memoryview(buf)[:nbytes])
+
+        end = offset + nbytes
+        padding = (-end) % self.alignment
+        if padding and end + padding <= self.segment_size:
+            self._segment_file.write(bytes(padding))
+            end += padding
+        self._segment_offset = end
+
+        record = np.array([(len(self._segments) - 1, offset, nbytes, info['width'], info['height'],
+                            info['pixel_type'] & 0xffffffff, info['frame_num'], info['dev_timestamp'],
+                            info['host_timestamp'], info['trigger_index'], info['lost_packet'])],
+                          dtype=RECORD_INDEX_DTYPE)
+        self._index_file.write(record.tobytes())
+        if self._first_info is None:
+            self._first_info = info
+
+        with self._stats_lock:
+            self._stats['frames_written'] += 1
+            self._stats['bytes_written'] += nbytes
+
+    def _writer_func(self):
+        """写盘线程函数"""
+        while True:
+            item = self._queue.get()
+            if item is None:
+                break
+            buf, nbytes, info = item
+            try:
+                self._write_frame(buf, nbytes, info)
+            except Exception as e:
+                print(f"写入录制数据出错: {e}")
+                with self._stats_lock:
+                    self._stats['frames_dropped'] += 1
+            finally:
+                self._pool.release(buf)
+
+    def _write_header(self):
+        """内部方法：写入录制头信息"""
+        header = {
+            'format': 'hikraw',
+            'version': RECORD_FORMAT_VERSION,
+            'index_dtype': [list(field) for field in RECORD_INDEX_DTYPE.descr],
+            'segment_size': self.segment_size,
+            'alignment': self.alignment,
+            'segments': list(self._segments),
+            'frame_count': self._stats['frames_written'],
+            'pixel_type': self._first_info['pixel_type'] if self._first_info else None,
+            'bayer_pattern': get_bayer_pattern(self._first_info['pixel_type']) if self._first_info else None,
+            'camera': self.camera.device_info,
+            'created': time.strftime('%Y-%m-%d %H:%M:%S'),
+        }
+        with open(self.path + '.json', 'w', encoding='utf-8') as f:
+            json.dump(header, f, ensure_ascii=False, indent=2)
+
+    def start(self):
+        """
+        开始录制
+
+        返回:
+            bool: 是否成功开始
+        """
+        if self._running:
+            return True
+        if not self.camera.isOpened():
+            print("相机未打开，无法录制")
+            return False
+
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._index_file = open(self.path + '.idx', 'wb')
+        self._stats['start_time'] = time.perf_counter()
+
+        self._running = True
+        self._accepting = True
+        self._writer = threading.Thread(target=self._writer_func)
+        self._writer.daemon = True
+        self._writer.start()
+        self.camera.add_raw_listener(self._on_raw)
+        print(f"开始录制: {self.path}")
+        return True
+
+    def stop(self):
+        """停止录制，写完队列中剩余的帧并关闭文件"""
+        if not self._running:
+            return
+
+        self.camera.remove_raw_listener(self._on_raw)
+        with self._stats_lock:
+            self._accepting = False
+            self._queue.put(None)
+        self._writer.join()
+        self._running = False
+        self._stats['stop_time'] = time.perf_counter()
+
+        if self._segment_file is not None:
+            self._close_segment()
+        self._index_file.close()
+        self._index_file = None
+        self._write_header()
+
+        stats = self.get_stats()
+        print(f"停止录制: {stats['frames_written']} 帧, {stats['bytes_written'] / 1e6:.1f} MB, "
+              f"丢弃 {stats['frames_dropped']} 帧")
+
+    def get_stats(self):
+        """
+        获取录制统计
+
+        返回:
+            dict: frames_written / bytes_written / frames_dropped / segments /
+                  queue_depth(待写帧数) / throughput(MB/s)
+        """
+        with self._stats_lock:
+            stats = dict(self._stats)
+        start, stop = stats.pop('start_time'), stats.pop('stop_time')
+        elapsed = ((stop or time.perf_counter()) - start) if start else 0.0
+        stats['queue_depth'] = self._queue.qsize()
+        stats['throughput'] = stats['bytes_written'] / elapsed / 1e6 if elapsed > 0 else 0.0
+        return stats
+
+    def __enter__(self):
+        """上下文管理器支持"""
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        """上下文管理器支持"""
+        self.stop()
+        return False
+
+
+# ================================
+# SDK 录像
+# ================================
+
+class AviRecorder:
+    """
+    SDK 录像器（MV_CC_StartRecord / MV_CC_InputOneFrame / MV_CC_StopRecord）
+
+    取图线程把原始数据拷贝进有上限的缓冲池，由独立的编码线程送入 SDK 编码器，
+    直接用相机原生像素格式录像，不需要先转换为 BGR 再交给 OpenCV 的 VideoWriter。
+    缓冲池满时丢弃新帧并计数，不阻塞采集。
+
+    通常通过 HikCamera.start_record() 或 VideoCapture.startRecord() 使用。
+    """
+
+    def __init__(self, camera, path, fps=None, bitrate=4096, queue_size=16):
+        """
+        参数:
+            camera: HikCamera, 已打开的相机
+            path: str, 录像文件路径（.avi）
+            fps: float, 录像帧率 [1/16-1000]，None 时使用相机当前帧率
+            bitrate: int, 码率 kbps [128-16384]
+            queue_size: int, 等待编码的最大帧数
+        """
+        self.camera = camera
+        self.path = path
+        self.fps = fps
+        self.bitrate = bitrate
+        self.queue_size = queue_size
+
+        self._pool = _BufferPool(queue_size)
+        self._queue = queue.Queue()
+        self._thread = None
+        self._running = False
+        self._accepting = False
+        self._geometry = None
+
+        self._stats_lock = threading.Lock()
+        self._stats = {'frames_input': 0, 'frames_dropped': 0, 'input_errors': 0,
+                       'input_time': 0.0, 'start_time': None, 'stop_time': None}
+
+    def _on_raw(self, raw, info):
+        """取图线程回调：拷贝原始数据并交给编码线程"""
+        if (info['width'], info['height'], info['pixel_type']) != self._geometry:
+            # 录像过程中图像尺寸或像素格式变化，编码器无法接收
+            with self._stats_lock:
+                self._stats['frames_dropped'] += 1
+            return False
+
+        buf = self._pool.acquire(raw.size)
+        if buf is None:
+            with self._stats_lock:
+                self._stats['frames_dropped'] += 1
+            return False
+        memmove(buf.ctypes.data, raw.ctypes.data, raw.size)
+        with self._stats_lock:
+            if not self._accepting:
+                self._pool.release(buf)
+                return False
+            self._queue.put((buf, raw.size))
+        return False
+
+    def _input_func(self):
+        """编码线程函数"""
+        stInputFrameInfo = MV_CC_INPUT_FRAME_INFO()
+        memset(byref(stInputFrameInfo), 0, sizeof(stInputFrameInfo))
+
+        while True:
+            item = self._queue.get()
+            if item is None:
+                break
+            buf, nbytes = item
+            t0 = time.perf_counter()
+            stInputFrameInfo.pData = buf.ctypes.data_as(POINTER(c_ubyte))
+            stInputFrameInfo.nDataLen = nbytes
+            ret = self.camera.cam.MV_CC_InputOneFrame(stInputFrameInfo)
+            elapsed = time.perf_counter() - t0
+            self._pool.release(buf)
+
+            with self._stats_lock:
+                if ret == 0:
+                    self._stats['frames_input'] += 1
+                    self._stats['input_time'] += elapsed
+                else:
+                    self._stats['input_errors'] += 1
+                    if self._stats['input_errors'] <= 5:
+                        print(f"录像输入帧失败! ret[0x{ret:x}]")
+
+    def start(self):
+        """
+        开始录像
+
+        返回:
+            bool: 是否成功开始
+        """
+        if self._running:
+            return True
+        if not self.camera.isOpened():
+            print("相机未打开，无法录像")
+            return False
+
+        width, height, pixel_type = self.camera._query_geometry()
+        if width is None:
+            print("无法获取图像尺寸，无法录像")
+            return False
+        fps = self.fps or self.camera.get(CAP_PROP_FPS) or 25.0
+
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        stRecordParam = MV_CC_RECORD_PARAM()
+        memset(byref(stRecordParam), 0, sizeof(stRecordParam))
+        stRecordParam.enPixelType = pixel_type
+        stRecordParam.nWidth = width
+        stRecordParam.nHeight = height
+        stRecordParam.fFrameRate = min(max(float(fps), 1 / 16), 1000.0)
+        stRecordParam.nBitRate = min(max(int(self.bitrate), 128), 16 * 1024)
+        stRecordParam.enRecordFmtType = MV_FormatType_AVI
+        stRecordParam.strFilePath = self.path.encode('utf-8')
+
+        ret = self.camera.cam.MV_CC_StartRecord(stRecordParam)
+        if ret != 0:
+            print(f"开始录像失败! ret[0x{ret:x}]")
+            return False
+
+        self._geometry = (width, height, pixel_type)
+        self.fps = stRecordParam.fFrameRate
+        self._stats['start_time'] = time.perf_counter()
+        self._running = True
+        self._accepting = True
+        self._thread = threading.Thread(target=self._input_func)
+        self._thread.daemon = True
+        self._thread.start()
+        self.camera.add_raw_listener(self._on_raw)
+        print(f"开始录像: {self.path} ({width}x{height}, {self.fps:.1f} fps, {stRecordParam.nBitRate} kbps)")
+        return True
+
+    def stop(self):
+        """停止录像，编码完队列中剩余的帧并关闭文件"""
+        if not self._running:
+            return
+
+        self.camera.remove_raw_listener(self._on_raw)
+        with self._stats_lock:
+            self._accepting = False
+            self._queue.put(None)
+        self._thread.join()
+        self._running = False
+        self._stats['stop_time'] = time.perf_counter()
+
+        ret = self.camera.cam.MV_CC_StopRecord()
+        if ret != 0:
+            print(f"停止录像失败! ret[0x{ret:x}]")
+
+        stats = self.get_stats()
+        print(f"停止录像: {stats['frames_input']} 帧, 丢弃 {stats['frames_dropped']} 帧")
+
+    def is_recording(self):
+        """是否正在录像"""
+        return self._running
+
+    def get_stats(self):
+        """
+        获取录像统计
+
+        返回:
+            dict: frames_input / frames_dropped / input_errors / queue_depth(待编码帧数) /
+                  throughput(编码帧率 fps) / avg_input_ms(单帧编码耗时)
+        """
+        with self._stats_lock:
+            stats = dict(self._stats)
+        start, stop = stats.pop('start_time'), stats.pop('stop_time')
+        input_time = stats.pop('input_time')
+        elapsed = ((stop or time.perf_counter()) - start) if start else 0.0
+        stats['queue_depth'] = self._queue.qsize()
+        stats['throughput'] = stats['frames_input'] / elapsed if elapsed > 0 else 0.0
+        stats['avg_input_ms'] = input_time / stats['frames_input'] * 1000 if stats['frames_input'] else 0.0
+        return stats
+
+
+# ================================
+# 后台图像保存
+# ================================
+
+# 按文件扩展名确定 SDK 图片格式
+SAVE_IMAGE_TYPES = {
+    '.bmp': MV_Image_Bmp,
+    '.jpg': MV_Image_Jpeg,
+    '.jpeg': MV_Image_Jpeg,
+    '.png': MV_Image_Png,
+    '.tif': MV_Image_Tif,
+    '.tiff': MV_Image_Tif,
+}
+
+SAVE_POLICY_DROP = 'drop'    # 队列满时丢弃新的保存请求
+SAVE_POLICY_BLOCK = 'block'  # 队列满时阻塞调用方，直到有空位
+
+
+def _require_cv2():
+    """内部方法：按需导入 OpenCV（核心功能不依赖 OpenCV）"""
+    try:
+        import cv2
+    except ImportError:
+        raise ImportError("该功能需要 OpenCV，请先安装: pip install opencv-python")
+    return cv2
+
+
+def _sdk_encode_image(cam, data, info, image_type, quality=90, method=1):
+    """
+    内部方法：用 SDK 把原始帧编码为图片
+
+    参数:
+        cam: MvCamera, 相机句柄
+        data: numpy.ndarray, C 连续的原始帧数据
+        info: dict, 帧信息（width / height / pixel_type）
+        image_type: int, MV_Image_Bmp / MV_Image_Jpeg / MV_Image_Png / MV_Image_Tif
+        quality: int, JPEG 质量 (50-99]
+        method: int, Bayer 插值方法 0-快速 1-均衡 2-最优
+
+    返回:
+        bytes: 编码后的图片数据，失败返回 None
+    """
+    width, height = info['width'], info['height']
+    # 输出上限按不压缩的 BMP/TIF 估算：Mono 输出单通道、其余输出 3 通道，PNG/TIF 保留高位深；
+    # 每行按 4 字节对齐，再留出文件头、调色板和 PNG 行过滤字节、deflate 分块的余量
+    fmt = get_pixel_format(info['pixel_type'])
+    channels = 1 if fmt is not None and fmt.is_mono else 3
+    sample_bytes = 2 if fmt is not None and fmt.bit_depth > 8 and image_type in (MV_Image_Png, MV_Image_Tif) else 1
+    image_size = ((width * channels * sample_bytes + 3) & ~3) * height
+    buffer_size = image_size + image_size // 1000 + height + 4096
+    out_buf = (c_ubyte * buffer_size)()
+
+    stSaveParam = MV_SAVE_IMAGE_PARAM_EX3()
+    memset(byref(stSaveParam), 0, sizeof(stSaveParam))
+    stSaveParam.pData = data.ctypes.data_as(POINTER(c_ubyte))
+    stSaveParam.nDataLen = data.nbytes
+    stSaveParam.enPixelType = info['pixel_type']
+    stSaveParam.nWidth = width
+    stSaveParam.nHeight = height
+    stSaveParam.pImageBuffer = cast(out_buf, POINTER(c_ubyte))
+    stSaveParam.nBufferSize = buffer_size
+    stSaveParam.enImageType = image_type
+    stSaveParam.nJpgQuality = min(max(int(quality), 51), 99)
+    stSaveParam.iMethodValue = method
+
+    ret = cam.MV_CC_SaveImageEx3(stSaveParam)
+    if ret != 0:
+        print(f"SDK 编码图片失败! ret[0x{ret:x}]")
+        return None
+    return string_at(out_buf, stSaveParam.nImageLen)
+
+
+class SnapshotService:
+    """
+    后台图像保存服务
+
+    编码和写文件在线程池中异步完成，调用方只负责拷贝一份图像并入队，
+    不会因为"保存每个 NG 件"之类的需求拖慢取图循环。
+    队列有上限，满时按策略丢弃或阻塞。
+
+    支持两种输入:
+        - BGR / 灰度 numpy 图像: 用 OpenCV 编码
+        - 原始帧（raw + info，如原始数据监听器收到的数据）: 用 SDK 编码，需要指定 camera
+
+    使用示例:
+        saver = SnapshotService(workers=2, queue_size=32)
+        while True:
+            ret, frame = cap.read()
+            if is_ng(frame):
+                saver.submit(frame, f"ng/{time.time():.3f}.jpg", quality=90)
+        saver.close()
+    """
+
+    def __init__(self, camera=None, workers=2, queue_size=32, policy=SAVE_POLICY_DROP,
+                 block_timeout=None, jpeg_quality=95, png_compression=3):
+        """
+        参数:
+            camera: HikCamera, 保存原始帧时用于 SDK 编码，只保存 BGR 图像时可为 None
+            workers: int, 编码线程数（OpenCV 编码和文件写入期间会释放 GIL）
+            queue_size: int, 排队加正在保存的最大请求数
+            policy: str, SAVE_POLICY_DROP 或 SAVE_POLICY_BLOCK
+            block_timeout: float, 阻塞策略下的最长等待时间（秒），None 表示一直等待
+            jpeg_quality: int, 默认 JPEG 质量 (0-100)
+            png_compression: int, 默认 PNG 压缩级别 (0-9)
+        """
+        if policy not in (SAVE_POLICY_DROP, SAVE_POLICY_BLOCK):
+            raise ValueError(f"不支持的队列策略: {policy}")
+
+        self.camera = camera
+        self.queue_size = queue_size
+        self.policy = policy
+        self.block_timeout = block_timeout
+        self.jpeg_quality = jpeg_quality
+        self.png_compression = png_compression
+
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='snapshot')
+        self._slots = threading.BoundedSemaphore(queue_size)
+        self._cond = threading.Condition()
+        self._pending = 0
+        self._closed = False
+
+        self._start_time = time.perf_counter()
+        self._stats = {'submitted': 0, 'saved': 0, 'dropped': 0, 'failed': 0,
+                       'bytes_written': 0, 'save_time': 0.0}
+
+    def _encode(self, image, ext, info, quality, compression):
+        """内部方法：编码图像，返回图片数据"""
+        if info is not None:
+            quality = self.jpeg_quality if quality is None else quality
+            return _sdk_encode_image(self.camera.cam, image, info, SAVE_IMAGE_TYPES[ext], quality)
+
+        cv2 = _require_cv2()
+        params = []
+        if SAVE_IMAGE_TYPES[ext] == MV_Image_Jpeg:
+            params = [cv2.IMWRITE_JPEG_QUALITY, self.jpeg_quality if quality is None else quality]
+        elif SAVE_IMAGE_TYPES[ext] == MV_Image_Png:
+            params = [cv2.IMWRITE_PNG_COMPRESSION, self.png_compression if compression is None else compression]
+        ok, encoded = cv2.imencode(ext, image, params)
+        return encoded.tobytes() if ok else None
+
+    def _save(self, image, path, ext, info, quality, compression):
+        """工作线程函数：编码并写入文件"""
+        t0 = time.perf_counter()
+        data = self._encode(image, ext, info, quality, compression)
+        if data is None:
+            raise RuntimeError(f"编码图片失败: {path}")
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(path, 'wb') as f:
+            f.write(data)
+
+        with self._cond:
+            self._stats['bytes_written'] += len(data)
+            self._stats['save_time'] += time.perf_counter() - t0
+        return path
+
+    def _on_done(self, future):
+        """内部方法：保存完成回调，归还队列空位"""
+        error = future.exception()
+        if error is not None:
+            print(f"保存图像出错: {error}")
+        with self._cond:
+            self._stats['failed' if error is not None else 'saved'] += 1
+            self._pending -= 1
+            self._cond.notify_all()
+        self._slots.release()
+
+    def submit(self, image, path, info=None, quality=None, compression=None, copy=True):
+        """
+        提交一个保存请求
+
+        参数:
+            image: numpy.ndarray, BGR / 灰度图像，或原始帧数据（此时需要 info）
+            path: str, 目标文件路径，格式由扩展名决定（.bmp/.jpg/.png/.tif）
+            info: dict, 原始帧信息，不为 None 时按原始帧用 SDK 编码
+            quality: int, JPEG 质量，None 使用默认值
+            compression: int, PNG 压缩级别，None 使用默认值
+            copy: bool, 是否拷贝图像（调用方会复用缓冲时必须为 True）
+
+        返回:
+            concurrent.futures.Future: 结果为保存的路径；请求被丢弃时返回 None
+        """
+        if self._closed:
+            print("保存服务已关闭")
+            return None
+
+        ext = os.path.splitext(path)[1].lower()
+        if ext not in SAVE_IMAGE_TYPES:
+            print(f"不支持的图片格式: {ext}")
+            return None
+        if info is not None and self.camera is None:
+            print("保存原始帧需要指定相机")
+            return None
+
+        if self.policy == SAVE_POLICY_DROP:
+            acquired = self._slots.acquire(blocking=False)
+        else:
+            acquired = self._slots.acquire(timeout=self.block_timeout)
+        if not acquired:
+            with self._cond:
+                self._stats['dropped'] += 1
+            return None
+
+        if copy:
+            image = np.array(image, copy=True, order='C')
+        with self._cond:
+            self._stats['submitted'] += 1
+            self._pending += 1
+
+        future = self._executor.submit(self._save, image, path, ext, info, quality, compression)
+        future.add_done_callback(self._on_done)
+        return future
+
+    def flush(self, timeout=None):
+        """
+        等待所有已提交的请求保存完成
+
+        返回:
+            bool: 是否在超时前全部完成
+        """
+        with self._cond:
+            return self._cond.wait_for(lambda: self._pending == 0, timeout)
+
+    def get_stats(self):
+        """
+        获取保存统计
+
+        返回:
+            dict: submitted / saved / dropped / failed / backlog(未完成请求数) /
+                  bytes_written / throughput(张/秒) / avg_save_ms(单张编码加写盘耗时)
+        """
+        with self._cond:
+            stats = dict(self._stats)
+            stats['backlog'] = self._pending
+        elapsed = time.perf_counter() - self._start_time
+        save_time = stats.pop('save_time')
+        stats['throughput'] = stats['saved'] / elapsed if elapsed > 0 else 0.0
+        stats['avg_save_ms'] = save_time / stats['saved'] * 1000 if stats['saved'] else 0.0
+        return stats
+
+    def close(self, wait=True):
+        """
+        关闭保存服务
+
+        参数:
+            wait: bool, 是否等待已提交的请求保存完成
+        """
+        if self._closed:
+            return
+        self._closed = True
+        self._executor.shutdown(wait=wait)
+
+    def __enter__(self):
+        """上下文管理器支持"""
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        """上下文管理器支持"""
+        self.close()
+        return False
+
+
+# ================================
+# 低分辨率预览
+# ================================
+
+def _superpixel_preview(raw, info, factor):
+    """
+    内部方法：由原始数据直接生成缩小的 BGR 预览图
+
+    Bayer 格式按 2x2 超像素取 R/B 和两个 G 的均值（自身即缩小 2 倍），再按剩余倍数抽样；
+    Mono8 / BGR8 / RGB8 直接抽样。
+
+    返回:
+        numpy.ndarray: 预览图像，不支持的像素格式返回 None
+    """
+    width, height, pixel_type = info['width'], info['height'], info['pixel_type']
+    pattern = get_bayer_pattern(pixel_type)
+
+    if pattern is not None and pixel_type in _CV2_BAYER_TO_BGR:
+        bayer = raw.reshape(height, width)
+        step = max(factor // 2, 1) * 2
+        (ry, rx), (by, bx) = _BAYER_RB_OFFSETS[pattern]
+        r = bayer[ry::step, rx::step]
+        b = bayer[by::step, bx::step]
+        g1 = bayer[ry::step, bx::step]
+        g2 = bayer[by::step, rx::step]
+        h = min(r.shape[0], b.shape[0], g1.shape[0], g2.shape[0])
+        w = min(r.shape[1], b.shape[1], g1.shape[1], g2.shape[1])
+        preview = np.empty((h, w, 3), dtype=np.uint8)
+        preview[:, :, 0] = b[:h, :w]
+        preview[:, :, 1] = (g1[:h, :w].astype(np.uint16) + g2[:h, :w]) >> 1
+        preview[:, :, 2] = r[:h, :w]
+        return preview
+
+    step = max(factor, 1)
+    if pixel_type == PixelType_Gvsp_Mono8:
+        return np.repeat(raw.reshape(height, width)[::step, ::step, np.newaxis], 3, axis=2)
+    if pixel_type == PixelType_Gvsp_BGR8_Packed:
+        return np.ascontiguousarray(raw.reshape(height, width, 3)[::step, ::step])
+    if pixel_type == PixelType_Gvsp_RGB8_Packed:
+        return np.ascontiguousarray(raw.reshape(height, width, 3)[::step, ::step, ::-1])
+    return None
+
+
+class PreviewStream:
+    """
+    低分辨率预览流
+
+    取图线程中只在预览到期（按 max_fps 限速）时把原始数据拷贝到一个复用缓冲，
+    超像素去马赛克和抽样在预览线程中完成，不拖慢全分辨率的取图和转换。
+    不支持直接预览的像素格式退回为对最新 BGR 帧抽样。
+
+    通常通过 HikCamera.enable_preview() 使用。
+    """
+
+    def __init__(self, camera, factor=4, max_fps=15.0, callback=None):
+        """
+        参数:
+            camera: HikCamera, 已打开的相机
+            factor: int, 缩小倍数
+            max_fps: float, 最大预览帧率
+            callback: callable(preview, info), 每个预览帧的回调
+        """
+        self.camera = camera
+        self.factor = max(int(factor), 1)
+        self.interval = 1.0 / max_fps if max_fps else 0.0
+        self.callback = callback
+
+        self._buffer = None
+        self._buffer_info = None
+        self._busy = False
+        self._last_time = 0.0
+        self._running = False
+        self._thread = None
+        self._cond = threading.Condition()
+
+        self.latest = None
+        self.latest_info = None
+        self.seq = 0
+        self._stats = {'frames': 0, 'skipped': 0, 'process_time': 0.0}
+
+    def _on_raw(self, raw, info):
+        """取图线程回调：按限速拷贝原始数据"""
+        now = info['recv_time']
+        if self._busy or now - self._last_time < self.interval:
+            return False
+
+        if self._buffer is None or self._buffer.size < raw.size:
+            self._buffer = np.empty(raw.size, dtype=np.uint8)
+        memmove(self._buffer.ctypes.data, raw.ctypes.data, raw.size)
+        with self._cond:
+            self._last_time = now
+            self._buffer_info = info
+            self._busy = True
+            self._cond.notify_all()
+        return False
+
+    def _thread_func(self):
+        """预览线程函数"""
+        while True:
+            with self._cond:
+                self._cond.wait_for(lambda: self._busy or not self._running)
+                if not self._running:
+                    break
+                info = self._buffer_info
+
+            t0 = time.perf_counter()
+            preview = _superpixel_preview(self._buffer[:info['frame_len']], info, self.factor)
+            if preview is None:
+                # 不支持的像素格式：对最新 BGR 帧抽样
+                frame = self.camera.latest_frame
+                if frame is not None:
+                    preview = np.ascontiguousarray(frame[::self.factor, ::self.factor])
+
+            with self._cond:
+                self._busy = False
+                if preview is None:
+                    self._stats['skipped'] += 1
+                    continue
+                self.latest = preview
+                self.latest_info = info
+                self.seq += 1
+                self._stats['frames'] += 1
+                self._stats['process_time'] += time.perf_counter() - t0
+                self._cond.notify_all()
+
+            if self.callback is not None:
+                try:
+                    self.callback(preview, info)
+                except Exception as e:
+                    print(f"预览回调出错: {e}")
+
+    def read(self, timeout=1.0):
+        """
+        等待并读取下一帧预览
+
+        返回:
+            tuple: (ret, preview)
+        """
+        with self._cond:
+            seq = self.seq
+            if not self._cond.wait_for(lambda: self.seq != seq or not self._running, timeout):
+                return False, None
+            if self.latest is None:
+                return False, None
+            return True, self.latest
+
+    def start(self):
+        """开始预览"""
+        if self._running:
+            return
+        self._running = True
+        self._thread = threading.Thread(target=self._thread_func)
+        self._thread.daemon = True
+        self._thread.start()
+        self.camera.add_raw_listener(self._on_raw)
+
+    def stop(self):
+        """停止预览"""
+        if not self._running:
+            return
+        self.camera.remove_raw_listener(self._on_raw)
+        with self._cond:
+            self._running = False
+            self._cond.notify_all()
+        self._thread.join()
+
+    def get_stats(self):
+        """
+        获取预览统计
+
+        返回:
+            dict: frames / skipped / avg_process_ms(单帧预览生成耗时)
+        """
+        with self._cond:
+            stats = dict(self._stats)
+        process_time = stats.pop('process_time')
+        stats['avg_process_ms'] = process_time / stats['frames'] * 1000 if stats['frames'] else 0.0
+        return stats
+
+
+# ================================
+# 并行 JPEG 编码
+# ================================
+
+ENCODE_METHOD_CV2 = 'cv2'  # cv2.imencode
+ENCODE_METHOD_SDK = 'sdk'  # MV_CC_SaveImageEx3 编码到内存
+
+
+class JpegEncoder:
+    """
+    并行 JPEG 编码器
+
+    挂在 HikCamera 的帧监听器上，把每帧的 JPEG 编码分散到线程池（编码期间释放 GIL），
+    由分发线程按帧顺序把结果交给各个消费者。
+    每个消费者可以指定自己的质量和缩放比例，同一帧相同参数只编码一次，
+    编码结果按帧缓存，多个消费者（远程预览、归档等）共享同一份编码。
+    待编码帧数超过上限时丢弃新帧，不阻塞取图线程。
+
+    使用示例:
+        encoder = JpegEncoder(cam, workers=4)
+        encoder.add_consumer(lambda jpg, info: ws.send(jpg), quality=70, scale=0.5)
+        encoder.add_consumer(lambda jpg, info: archive.write(jpg), quality=95)
+        encoder.start()
+    """
+
+    def __init__(self, camera, workers=4, method=ENCODE_METHOD_CV2, max_pending=None, cache_size=8):
+        """
+        参数:
+            camera: HikCamera, 已打开的相机
+            workers: int, 编码线程数
+            method: str, ENCODE_METHOD_CV2 或 ENCODE_METHOD_SDK
+            max_pending: int, 最多同时在编码的帧数，默认 workers * 2
+            cache_size: int, 缓存最近多少帧的编码结果
+        """
+        if method not in (ENCODE_METHOD_CV2, ENCODE_METHOD_SDK):
+            raise ValueError(f"不支持的编码方式: {method}")
+
+        self.camera = camera
+        self.workers = workers
+        self.method = method
+        self.max_pending = max_pending or workers * 2
+        self.cache_size = cache_size
+
+        self._consumers = []
+        self._executor = None
+        self._dispatcher = None
+        self._running = False
+        self._pending = collections.deque()
+        self._cond = threading.Condition()
+        self._cache = collections.OrderedDict()
+
+        self._stats = {'frames_encoded': 0, 'frames_dropped': 0, 'encodes': 0, 'encode_time': 0.0,
+                       'cache_hits': 0, 'cache_misses': 0, 'start_time': None}
+
+    def add_consumer(self, callback, quality=80, scale=1.0):
+        """
+        添加消费者
+
+        参数:
+            callback: callable(jpeg, info), 在分发线程中按帧顺序调用，jpeg 为 bytes
+            quality: int, JPEG 质量
+            scale: float, 缩放比例（0-1]
+
+        返回:
+            object: 消费者句柄，用于 remove_consumer()
+        """
+        consumer = (callback, int(quality), float(scale))
+        self._consumers = self._consumers + [consumer]
+        return consumer
+
+    def remove_consumer(self, consumer):
+        """移除消费者"""
+        self._consumers = [c for c in self._consumers if c is not consumer]
+
+    def _resize(self, image, scale):
+        """内部方法：缩小图像"""
+        if scale >= 1.0:
+            return image
+        try:
+            cv2 = _require_cv2()
+        except ImportError:
+            step = max(int(round(1.0 / scale)), 1)
+            return np.ascontiguousarray(image[::step, ::step])
+        height, width = image.shape[:2]
+        size = (max(int(width * scale), 1), max(int(height * scale), 1))
+        return cv2.resize(image, size, interpolation=cv2.INTER_AREA)
+
+    def _encode(self, image, quality):
+        """内部方法：编码一张 BGR 图像"""
+        if self.method == ENCODE_METHOD_SDK:
+            height, width = image.shape[:2]
+            info = {'width': width, 'height': height, 'pixel_type': PixelType_Gvsp_BGR8_Packed}
+            return _sdk_encode_image(self.camera.cam, np.ascontiguousarray(image), info, MV_Image_Jpeg, quality)
+
+        cv2 = _require_cv2()
+        ok, encoded = cv2.imencode('.jpg', image, [cv2.IMWRITE_JPEG_QUALITY, quality])
+        return encoded.tobytes() if ok else None
+
+    def _encode_frame(self, image, variants):
+        """工作线程函数：按所需的 (质量, 缩放) 组合编码一帧"""
+        t0 = time.perf_counter()
+        encoded = {}
+        for quality, scale in variants:
+            encoded[(quality, scale)] = self._encode(self._resize(image, scale), quality)
+        with self._cond:
+            self._stats['encodes'] += len(variants)
+            self._stats['encode_time'] += time.perf_counter() - t0
+        return encoded
+
+    def _on_frame(self, image, info):
+        """帧监听器：提交编码任务"""
+        variants = sorted({(quality, scale) for _, quality, scale in self._consumers})
+        if not variants:
+            return
+
+        with self._cond:
+            if not self._running:
+                return
+            if len(self._pending) >= self.max_pending:
+                self._stats['frames_dropped'] += 1
+                return
+            future = self._executor.submit(self._encode_frame, image, variants)
+            self._pending.append((future, info))
+            self._cond.notify_all()
+
+    def _dispatch_func(self):
+        """分发线程函数：按提交顺序等待编码结果并交给消费者"""
+        while True:
+            with self._cond:
+                self._cond.wait_for(lambda: self._pending or not self._running)
+                if not self._pending:
+                    break
+                future, info = self._pending[0]
+
+            try:
+                encoded = future.result()
+            except Exception as e:
+                print(f"JPEG 编码出错: {e}")
+                encoded = {}
+
+            with self._cond:
+                self._pending.popleft()
+                self._stats['frames_encoded'] += 1
+                self._cache[info['seq']] = (encoded, info)
+                while len(self._cache) > self.cache_size:
+                    self._cache.popitem(last=False)
+
+            for callback, quality, scale in self._consumers:
+                data = encoded.get((quality, scale))
+                if data is None:
+                    continue
+                try:
+                    callback(data, info)
+                except Exception as e:
+                    print(f"JPEG 消费者出错: {e}")
+
+    def get_encoded(self, quality=80, scale=1.0, seq=None):
+        """
+        从缓存取某帧已编码的 JPEG（不触发编码）
+
+        参数:
+            quality, scale: 编码参数，需与某个消费者一致
+            seq: int, 帧序号（info['seq']），None 表示最新一帧
+
+        返回:
+            Tuple[bytes, dict]: (JPEG 数据, 帧信息)，缓存中没有时返回 (None, None)
+        """
+        with self._cond:
+            if seq is None:
+                entry = self._cache[next(reversed(self._cache))] if self._cache else None
+            else:
+                entry = self._cache.get(seq)
+            data = entry[0].get((int(quality), float(scale))) if entry is not None else None
+            self._stats['cache_hits' if data is not None else 'cache_misses'] += 1
+        if data is None:
+            return None, None
+        return data, entry[1]
+
+    def start(self):
+        """开始编码"""
+        if self._running:
+            return
+        self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='jpeg')
+        self._running = True
+        self._stats['start_time'] = time.perf_counter()
+        self._dispatcher = threading.Thread(target=self._dispatch_func)
+        self._dispatcher.daemon = True
+        self._dispatcher.start()
+        self.camera.add_frame_listener(self._on_frame)
+
+    def stop(self):
+        """停止编码，交付已提交的帧"""
+        if not self._running:
+            return
+        self.camera.remove_frame_listener(self._on_frame)
+        with self._cond:
+            self._running = False
+            self._cond.notify_all()
+        self._dispatcher.join()
+        self._executor.shutdown(wait=True)
+
+    def get_stats(self):
+        """
+        获取编码统计
+
+        返回:
+            dict: frames_encoded / frames_dropped / encodes(编码次数，含多种参数) / pending /
+                  cache_hits / cache_misses / fps(交付帧率) / avg_encode_ms(单帧全部参数的编码耗时)
+        """
+        with self._cond:
+            stats = dict(self._stats)
+            stats['pending'] = len(self._pending)
+        start = stats.pop('start_time')
+        encode_time = stats.pop('encode_time')
+        elapsed = time.perf_counter() - start if start else 0.0
+        stats['fps'] = stats['frames_encoded'] / elapsed if elapsed > 0 else 0.0
+        stats['avg_encode_ms'] = encode_time / stats['frames_encoded'] * 1000 if stats['frames_encoded'] else 0.0
+        return stats
+
+    def __enter__(self):
+        """上下文管理器支持"""
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        """上下文管理器支持"""
+        self.stop()
+        return False
+
+
+# ================================
+# 像素格式转换引擎
+# ================================
+
+# YUV422 像素格式 -> OpenCV 转换码
+_CV2_YUV422_TO_BGR = {
+    PixelType_Gvsp_YUV422_Packed: 'COLOR_YUV2BGR_UYVY',
+    PixelType_Gvsp_YUV422_YUYV_Packed: 'COLOR_YUV2BGR_YUYV',
+}
+
+# Bayer 插值质量 -> OpenCV 转换码后缀
+_CV2_BAYER_QUALITY = {
+    'bilinear': '',
+    'vng': '_VNG',
+    'ea': '_EA',
+}
+
+
+class ConversionEngine(abc.ABC):
+    """
+    像素格式转换引擎接口
+
+    取图线程在 BGR8 输出模式下调用 convert() 把原始数据转换为 BGR 图像，
+    通过 HikCamera.set_conversion_engine() 设置。
+    子类必须实现 supports() 和 convert()，否则构造时即报错，而不是在取图线程中出错。
+    """
+
+    name = 'base'
+
+    @abc.abstractmethod
+    def supports(self, pixel_type):
+        """
+        是否支持该像素格式
+
+        返回:
+            bool: 不支持时取图线程退回 SDK 转换
+        """
+
+    @abc.abstractmethod
+    def convert(self, raw, info, out=None):
+        """
+        转换一帧
+
+        参数:
+            raw: numpy.ndarray, 一维 uint8 原始数据（只在调用期间有效）
+            info: dict, 帧信息（width / height / pixel_type）
+            out: numpy.ndarray, 可选的 (H, W, 3) uint8 输出数组
+
+        返回:
+            numpy.ndarray: BGR 图像，失败返回 None
+        """
+
+    def close(self):
+        """释放引擎资源"""
+        pass
+
+
+class SdkConversionEngine(ConversionEngine):
+    """SDK 转换引擎（MV_CC_ConvertPixelTypeEx），支持所有格式，主要用于性能对比"""
+
+    name = 'sdk'
+
+    def __init__(self, camera):
+        """
+        参数:
+            camera: HikCamera, 提供 SDK 句柄的已打开相机
+        """
+        self.camera = camera
+
+    def supports(self, pixel_type):
+        return True
+
+    def convert(self, raw, info, out=None):
+        return self.camera.convert_raw(raw, info, out)
+
+
+class NumpyConversionEngine(ConversionEngine):
+    """
+    NumPy / OpenCV 转换引擎
+
+    支持 8/10/12/16 位 Bayer（含 Packed）、YUV422（UYVY / YUYV）、Mono 和 RGB8/BGR8。
+    Bayer 用 cv2.cvtColor 去马赛克，插值质量可按引擎单独设置；高位深数据先右移到 8 位。
+    strips > 1 时按行分条在线程池中并行转换（OpenCV 转换期间释放 GIL），
+    Bayer 分条上下各多取 2 行，保证条带边界与整帧转换结果一致。
+    未安装 OpenCV 时 Bayer 退回纯 NumPy 双线性去马赛克（较慢）。
+    """
+
+    name = 'numpy'
+
+    def __init__(self, strips=1, quality='bilinear'):
+        """
+        参数:
+            strips: int, 并行分条数（线程数）
+            quality: str, Bayer 插值 'bilinear' / 'vng' / 'ea'
+        """
+        if quality not in _CV2_BAYER_QUALITY:
+            raise ValueError(f"不支持的插值质量: {quality}")
+        try:
+            self._cv2 = _require_cv2()
+        except ImportError:
+            self._cv2 = None
+
+        self.strips = max(int(strips), 1)
+        self.quality = quality
+        self._executor = ThreadPoolExecutor(max_workers=self.strips, thread_name_prefix='convert') \
+            if self.strips > 1 else None
+
+    def supports(self, pixel_type):
+        fmt = get_pixel_format(pixel_type)
+        if fmt is None or fmt.compressed:
+            return False
+        if fmt.bayer_pattern is not None or (fmt.is_mono and fmt.bit_depth >= 8 and fmt.bpp in (8, 12, 16)):
+            return True
+        if pixel_type in (PixelType_Gvsp_BGR8_Packed, PixelType_Gvsp_RGB8_Packed):
+            return True
+        return self._cv2 is not None and pixel_type in _CV2_YUV422_TO_BGR
+
+    def _run_strips(self, func, height):
+        """内部方法：按行分条执行 func(y0, y1)，条带起始行保持偶数以不打乱 Bayer 排列"""
+        if self._executor is None or height < self.strips * 4:
+            func(0, height)
+            return
+        step = (height + self.strips - 1) // self.strips
+        step += step & 1
+        bounds = [(y, min(y + step, height)) for y in range(0, height, step)]
+        for future in [self._executor.submit(func, y0, y1) for y0, y1 in bounds]:
+            future.result()
+
+    def convert(self, raw, info, out=None):
+        width, height, pixel_type = info['width'], info['height'], info['pixel_type']
+        if not isinstance(out, np.ndarray) or out.shape != (height, width, 3) or \
+                out.dtype != np.uint8 or not out.flags.c_contiguous:
+            out = np.empty((height, width, 3), dtype=np.uint8)
+        cv2 = self._cv2
+
+        if pixel_type in _CV2_YUV422_TO_BGR:
+            src = raw[:width * height * 2].reshape(height, width, 2)
+            code = getattr(cv2, _CV2_YUV422_TO_BGR[pixel_type])
+            self._run_strips(lambda y0, y1: cv2.cvtColor(src[y0:y1], code, dst=out[y0:y1]), height)
+            return out
+        if pixel_type == PixelType_Gvsp_BGR8_Packed:
+            np.copyto(out, raw[:out.size].reshape(out.shape))
+            return out
+        if pixel_type == PixelType_Gvsp_RGB8_Packed:
+            np.copyto(out, raw[:out.size].reshape(out.shape)[:, :, ::-1])
+            return out
+
+        mosaic = unpack_raw(raw, info)
+        if mosaic is None:
+            return None
+        if mosaic.dtype != np.uint8:
+            mosaic = (mosaic >> (get_bit_depth(pixel_type) - 8)).astype(np.uint8)
+
+        pattern = get_bayer_pattern(pixel_type)
+        if pattern is None:
+            # Mono
+            if cv2 is not None:
+                return cv2.cvtColor(mosaic, cv2.COLOR_GRAY2BGR, dst=out)
+            out[:] = mosaic[:, :, np.newaxis]
+            return out
+        if cv2 is None:
+            np.copyto(out, demosaic(mosaic, pattern))
+            return out
+
+        code = getattr(cv2, _CV2_BAYER_CODES[pattern] + _CV2_BAYER_QUALITY[self.quality])
+
+        def convert_strip(y0, y1):
+            # 上下各多取 2 行保证边界插值正确
+            a0, a1 = max(y0 - 2, 0), min(y1 + 2, height)
+            converted = cv2.cvtColor(mosaic[a0:a1], code)
+            out[y0:y1] = converted[y0 - a0:y1 - a0]
+
+        if self._executor is None:
+            cv2.cvtColor(mosaic, code, dst=out)
+        else:
+            self._run_strips(convert_strip, height)
+        return out
+
+    def close(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+
+
+def _pixel_type_name(pixel_type):
+    """内部方法：像素格式的常量名（去掉 PixelType_Gvsp_ 前缀）"""
+    fmt = get_pixel_format(pixel_type)
+    return fmt.name if fmt is not None else f"0x{pixel_type:x}"
+
+
+def _synthetic_raw(pixel_type, width, height):
+    """内部方法：生成测试用的随机原始数据"""
+    fmt = get_pixel_format(pixel_type)
+    raw = np.random.default_rng(0).integers(0, 256, get_frame_size(width, height, pixel_type), dtype=np.uint8)
+    if fmt is not None and fmt.dtype == np.uint16 and fmt.bit_depth < 16:
+        # 非 Packed 高位深数据的取值不能超过有效位数
+        raw.view(np.uint16)[:] &= (1 << fmt.bit_depth) - 1
+    return raw
+
+
+def benchmark_conversion(engines, pixel_types, sizes=((2448, 2048),), repeat=10, verbose=True):
+    """
+    比较各转换引擎在不同像素格式和分辨率下的耗时
+
+    用随机数据测试，不需要采集；SDK 引擎需要一个已打开的相机。
+
+    参数:
+        engines: list of ConversionEngine
+        pixel_types: list of int, 要测试的像素格式
+        sizes: list of (width, height)
+        repeat: int, 每项重复次数
+        verbose: bool, 是否打印结果表
+
+    返回:
+        list of dict: 每项含 engine / pixel_type / format / width / height / ms / fps，
+                      引擎不支持或转换失败的项 ms 为 None
+    """
+    results = []
+    for width, height in sizes:
+        for pixel_type in pixel_types:
+            raw = _synthetic_raw(pixel_type, width, height)
+            info = {'width': width, 'height': height, 'pixel_type': pixel_type}
+            out = np.empty((height, width, 3), dtype=np.uint8)
+            for engine in engines:
+                ms = None
+                if engine.supports(pixel_type) and engine.convert(raw, info, out) is not None:
+                    t0 = time.perf_counter()
+                    for _ in range(repeat):
+                        engine.convert(raw, info, out)
+                    ms = (time.perf_counter() - t0) / repeat * 1000
+                results.append({'engine': engine.name + (f"x{engine.strips}" if getattr(engine, 'strips', 1) > 1 else ''),
+                                'pixel_type': pixel_type, 'format': _pixel_type_name(pixel_type),
+                                'width': width, 'height': height, 'ms': ms,
+                                'fps': 1000.0 / ms if ms else None})
+
+    if verbose:
+        print(f"{'格式':<20s} {'分辨率':>11s} {'引擎':<10s} {'耗时(ms)':>9s} {'帧率':>8s}")
+        for r in results:
+            size = f"{r['width']}x{r['height']}"
+            if r['ms'] is None:
+                print(f"{r['format']:<20s} {size:>11s} {r['engine']:<10s} {'不支持':>9s}")
+            else:
+                print(f"{r['format']:<20s} {size:>11s} {r['engine']:<10s} {r['ms']:9.2f} {r['fps']:8.1f}")
+    return results
+
+
+# ================================
+# 录制回放
+# ================================
+
+# 相机 Bayer 排列 -> OpenCV 转换码（OpenCV 的 Bayer 命名以第二行第二列起算，与相机命名错开）
+_CV2_BAYER_CODES = {
+    'RG': 'COLOR_BayerBG2BGR',
+    'GR': 'COLOR_BayerGB2BGR',
+    'GB': 'COLOR_BayerGR2BGR',
+    'BG': 'COLOR_BayerRG2BGR',
+}
+
+# 8 位 Bayer 像素格式 -> OpenCV 转换码
+_CV2_BAYER_TO_BGR = {
+    PixelType_Gvsp_BayerRG8: _CV2_BAYER_CODES['RG'],
+    PixelType_Gvsp_BayerGR8: _CV2_BAYER_CODES['GR'],
+    PixelType_Gvsp_BayerGB8: _CV2_BAYER_CODES['GB'],
+    PixelType_Gvsp_BayerBG8: _CV2_BAYER_CODES['BG'],
+}
+
+
+# 各排列中 R 和 B 像素在 2x2 单元内的位置 (行, 列)
+_BAYER_RB_OFFSETS = {
+    'RG': ((0, 0), (1, 1)),
+    'GR': ((0, 1), (1, 0)),
+    'GB': ((1, 0), (0, 1)),
+    'BG': ((1, 1), (0, 0)),
+}
+
+
+def get_bayer_pattern(pixel_type):
+    """
+    获取像素格式的 Bayer 排列
+
+    参数:
+        pixel_type: int, GVSP 像素格式
+
+    返回:
+        str: 'RG' / 'GR' / 'GB' / 'BG'，非 Bayer 格式返回 None
+    """
+    fmt = get_pixel_format(pixel_type)
+    return fmt.bayer_pattern if fmt is not None else None
+
+
+def demosaic(bayer, pattern):
+    """
+    纯 NumPy 双线性去马赛克（不依赖 OpenCV 和 SDK）
+
+    参数:
+        bayer: numpy.ndarray, (H, W) 的 uint8 或 uint16 Bayer 图像
+        pattern: str, Bayer 排列 'RG' / 'GR' / 'GB' / 'BG'
+
+    返回:
+        numpy.ndarray: (H, W, 3) 的 BGR 图像，数据类型与输入相同
+    """
+    height, width = bayer.shape
+    (ry, rx), (by, bx) = _BAYER_RB_OFFSETS[pattern]
+    src = bayer.astype(np.float32)
+
+    r = np.zeros_like(src)
+    r[ry::2, rx::2] = src[ry::2, rx::2]
+    b = np.zeros_like(src)
+    b[by::2, bx::2] = src[by::2, bx::2]
+    g = src - r - b
+
+    def convolve(plane, kernel):
+        # 反射填充保持 2x2 排列的奇偶性
+        padded = np.pad(plane, 1, mode='reflect')
+        out = np.zeros_like(plane)
+        for dy in range(3):
+            for dx in range(3):
+                if kernel[dy][dx]:
+                    out += kernel[dy][dx] * padded[dy:dy + height, dx:dx + width]
+        return out
+
+    kernel_rb = ((0.25, 0.5, 0.25), (0.5, 1.0, 0.5), (0.25, 0.5, 0.25))
+    kernel_g = ((0, 0.25, 0), (0.25, 1.0, 0.25), (0, 0.25, 0))
+
+    bgr = np.stack([convolve(b, kernel_rb), convolve(g, kernel_g), convolve(r, kernel_rb)], axis=-1)
+    max_value = np.iinfo(bayer.dtype).max
+    return np.clip(bgr + 0.5, 0, max_value).astype(bayer.dtype)
+
+
+def save_raw_frame(path, raw, info):
+    """
+    保存单帧原始数据（相机原生像素格式）和帧信息
+
+    保存为 .npz 文件，包含原始数据、像素格式、Bayer 排列、宽高和时间戳，
+    可用 load_raw_frame() 读回，再用 HikCamera.convert_raw() 或 demosaic() 转换。
+
+    参数:
+        path: str, 目标文件路径（.npz）
+        raw: numpy.ndarray, 原始数据
+        info: dict, 帧信息
+    """
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    meta = {key: info[key] for key in ('width', 'height', 'pixel_type', 'frame_num',
+                                       'dev_timestamp', 'host_timestamp', 'trigger_index')
+            if key in info}
+    meta['bayer_pattern'] = get_bayer_pattern(info['pixel_type'])
+    np.savez(path, raw=np.ascontiguousarray(raw).reshape(-1).view(np.uint8), meta=json.dumps(meta))
+
+
+def load_raw_frame(path):
+    """
+    读取 save_raw_frame() 保存的原始帧
+
+    返回:
+        Tuple[np.ndarray, dict]: (原始数据, 帧信息)
+    """
+    with np.load(path) as data:
+        info = json.loads(str(data['meta']))
+        raw = data['raw']
+    shape, dtype = _raw_frame_layout(info['width'], info['height'], info['pixel_type'])
+    raw = raw.view(dtype)
+    if raw.size == int(np.prod(shape)):
+        raw = raw.reshape(shape)
+    return raw, info
+
+
+def _raw_to_bgr(raw, info, out=None):
+    """
+    内部方法：不经过 SDK，把原始帧转换为 BGR 图像
+
+    优先使用 OpenCV；未安装 OpenCV 时，Mono8 / 8 位 Bayer / RGB8 / BGR8 用 NumPy 转换。
+
+    参数:
+        raw: numpy.ndarray, 原始帧数据
+        info: dict, 帧信息（width / height / pixel_type）
+        out: numpy.ndarray, 可选的输出数组，匹配时直接写入（OpenCV 路径），不匹配时重新分配
+
+    返回:
+        numpy.ndarray: BGR 图像，不支持的像素格式返回 None
+    """
+    width, height, pixel_type = info['width'], info['height'], info['pixel_type']
+    try:
+        cv2 = _require_cv2()
+    except ImportError:
+        if pixel_type == PixelType_Gvsp_Mono8:
+            return np.repeat(raw.reshape(height, width, 1), 3, axis=2)
+        if pixel_type in _CV2_BAYER_TO_BGR:
+            return demosaic(raw.reshape(height, width), get_bayer_pattern(pixel_type))
+        if pixel_type == PixelType_Gvsp_BGR8_Packed:
+            return _copy_to_output(raw.reshape(height, width, 3), out)
+        if pixel_type == PixelType_Gvsp_RGB8_Packed:
+            return raw.reshape(height, width, 3)[:, :, ::-1].copy()
+        print(f"未安装 OpenCV，无法转换像素格式: 0x{pixel_type:x}")
+        return None
+
+    if pixel_type == PixelType_Gvsp_Mono8:
+        return cv2.cvtColor(raw.reshape(height, width), cv2.COLOR_GRAY2BGR, dst=out)
+    if pixel_type in _CV2_BAYER_TO_BGR:
+        return cv2.cvtColor(raw.reshape(height, width), getattr(cv2, _CV2_BAYER_TO_BGR[pixel_type]), dst=out)
+    if pixel_type == PixelType_Gvsp_BGR8_Packed:
+        return _copy_to_output(raw.reshape(height, width, 3), out)
+    if pixel_type == PixelType_Gvsp_RGB8_Packed:
+        return cv2.cvtColor(raw.reshape(height, width, 3), cv2.COLOR_RGB2BGR, dst=out)
+    if pixel_type == PixelType_Gvsp_YUV422_Packed:
+        return cv2.cvtColor(raw.reshape(height, width, 2), cv2.COLOR_YUV2BGR_UYVY, dst=out)
+    if pixel_type == PixelType_Gvsp_YUV422_YUYV_Packed:
+        return cv2.cvtColor(raw.reshape(height, width, 2), cv2.COLOR_YUV2BGR_YUYV, dst=out)
+
+    print(f"不支持转换的像素格式: 0x{pixel_type:x}")
+    return None
+
+
+class RecordingReader:
+    """
+    原始录制回放器
+
+    内存映射 RawRecorder 的分段文件，借助帧索引随机访问任意一帧，
+    原始数据以零拷贝 numpy 视图返回，只有取 BGR 图像时才做去马赛克。
+    提供与 VideoCapture 相同的接口（read/grab/retrieve/get/set），
+    支持 CAP_PROP_POS_FRAMES / CAP_PROP_FRAME_COUNT / CAP_PROP_POS_MSEC 等属性，
+    现有的处理代码可以像读取在线相机一样读取录制文件。
+
+    使用示例:
+        reader = RecordingReader("D:/rec/line1")
+        reader.set(CAP_PROP_POS_FRAMES, 1000)
+        while True:
+            ret, frame = reader.read()
+            if not ret:
+                break
+
+        raw, info = reader.get_raw(reader.nearest(host_timestamp_ms))
+    """
+
+    def __init__(self, path):
+        """
+        参数:
+            path: str, 录制文件路径前缀（同 RawRecorder），也可以是 .json / .idx 文件路径
+        """
+        self.path = None
+        self.header = None
+        self.index = None
+        self._segments = []
+        self._maps = {}
+        self._pos = 0
+        self._grabbed = None
+        self.last_info = None
+        self.open(path)
+
+    def open(self, path):
+        """
+        打开录制文件
+
+        返回:
+            bool: 是否成功打开
+        """
+        self.release()
+        root, ext = os.path.splitext(path)
+        if ext in ('.json', '.idx'):
+            path = root
+
+        try:
+            with open(path + '.json', 'r', encoding='utf-8') as f:
+                self.header = json.load(f)
+        except OSError:
+            # 录制被异常中断时没有头信息，按命名规则推断分段文件
+            print(f"未找到录制头信息: {path}.json")
+            self.header = None
+
+        try:
+            self.index = np.fromfile(path + '.idx', dtype=RECORD_INDEX_DTYPE)
+        except OSError as e:
+            print(f"打开录制索引失败: {e}")
+            return False
+
+        if self.header is not None:
+            self._segments = self.header['segments']
+        else:
+            count = int(self.index['segment'].max()) + 1 if len(self.index) else 0
+            self._segments = [f"{os.path.basename(path)}_{i:05d}.seg" for i in range(count)]
+
+        self.path = path
+        self._pos = 0
+        return True
+
+    def isOpened(self):
+        """检查录制文件是否已打开"""
+        return self.index is not None
+
+    def __len__(self):
+        """录制的总帧数"""
+        return 0 if self.index is None else len(self.index)
+
+    def _segment_map(self, segment):
+        """内部方法：按需内存映射分段文件"""
+        mm = self._maps.get(segment)
+        if mm is None:
+            directory = os.path.dirname(self.path) or '.'
+            mm = np.memmap(os.path.join(directory, self._segments[segment]), dtype=np.uint8, mode='r')
+            self._maps[segment] = mm
+        return mm
+
+    def get_info(self, n):
+        """
+        获取第 n 帧的信息
+
+        返回:
+            dict: 与在线采集相同字段的帧信息，另含 index（帧序号）
+        """
+        record = self.index[n]
+        return {
+            'index': int(n),
+            'frame_num': int(record['frame_num']),
+            'width': int(record['width']),
+            'height': int(record['height']),
+            'pixel_type': int(record['pixel_type']),
+            'frame_len': int(record['length']),
+            'dev_timestamp': int(record['dev_timestamp']),
+            'host_timestamp': int(record['host_timestamp']),
+            'trigger_index': int(record['trigger_index']),
+            'lost_packet': int(record['lost_packet']),
+            'bayer_pattern': get_bayer_pattern(int(record['pixel_type'])),
+        }
+
+    def get_raw(self, n):
+        """
+        获取第 n 帧的原始数据（零拷贝，只读）
+
+        返回:
+            Tuple[np.ndarray, dict]: (原始数据视图, 帧信息)
+        """
+        info = self.get_info(n)
+        offset = int(self.index[n]['offset'])
+        mm = self._segment_map(int(self.index[n]['segment']))
+        shape, dtype = _raw_frame_layout(info['width'], info['height'], info['pixel_type'])
+        raw = mm[offset:offset + info['frame_len']].view(dtype)
+        if raw.size == int(np.prod(shape)):
+            raw = raw.reshape(shape)
+        return raw, info
+
+    def get_frame(self, n, image=None):
+        """
+        获取第 n 帧的 BGR 图像（访问时才去马赛克）
+
+        参数:
+            image: numpy.ndarray, 可选的输出数组，匹配时直接写入
+
+        返回:
+            Tuple[np.ndarray, dict]: (BGR 图像, 帧信息)，不支持的像素格式图像为 None
+        """
+        raw, info = self.get_raw(n)
+        return _raw_to_bgr(raw, info, out=image), info
+
+    def export(self, directory, ext='.png', start=0, stop=None, step=1, camera=None, saver=None):
+        """
+        把录制的原始帧转换并导出为图片文件
+
+        参数:
+            directory: str, 导出目录，文件名为 {帧序号:06d}{ext}
+            ext: str, 图片格式扩展名（.bmp/.jpg/.png/.tif）
+            start, stop, step: int, 导出的帧范围
+            camera: HikCamera, 指定时用 SDK（MV_CC_ConvertPixelTypeEx）转换，否则用 OpenCV / NumPy 转换
+            saver: SnapshotService, 编码写盘服务，None 时内部创建（阻塞策略，不丢帧）
+
+        返回:
+            int: 导出的帧数
+        """
+        own_saver = saver is None
+        if own_saver:
+            saver = SnapshotService(policy=SAVE_POLICY_BLOCK)
+
+        count = 0
+        try:
+            for n in range(start, len(self) if stop is None else min(stop, len(self)), step):
+                raw, info = self.get_raw(n)
+                image = camera.convert_raw(raw, info) if camera is not None else _raw_to_bgr(raw, info)
+                if image is None:
+                    continue
+                if saver.submit(image, os.path.join(directory, f"{n:06d}{ext}"), copy=False) is not None:
+                    count += 1
+            saver.flush()
+        finally:
+            if own_saver:
+                saver.close()
+        return count
+
+    def nearest(self, timestamp, field='host_timestamp'):
+        """
+        查找时间戳最接近的帧
+
+        参数:
+            timestamp: int, 目标时间戳
+            field: str, 'host_timestamp'（毫秒）或 'dev_timestamp'（设备 tick）
+
+        返回:
+            int: 帧序号，录制为空时返回 -1
+        """
+        if not len(self):
+            return -1
+        stamps = self.index[field]
+        i = int(np.searchsorted(stamps, timestamp))
+        if i == 0:
+            return 0
+        if i >= len(stamps):
+            return len(stamps) - 1
+        # 比较两侧相邻帧（避免无符号相减溢出）
+        before, after = int(stamps[i - 1]), int(stamps[i])
+        return i - 1 if timestamp - before <= after - timestamp else i
+
+    def grab(self):
+        """
+        定位到下一帧（兼容 OpenCV）
+
+        返回:
+            bool: 是否还有帧
+        """
+        if not self.isOpened() or self._pos >= len(self):
+            self._grabbed = None
+            return False
+        self._grabbed = self._pos
+        self._pos += 1
+        return True
+
+    def retrieve(self, image=None, flag=0):
+        """
+        解码上次 grab() 的帧（兼容 OpenCV）
+
+        返回:
+            Tuple[bool, np.ndarray]: (是否成功, BGR 图像)
+        """
+        if self._grabbed is None:
+            return False, None
+        frame, self.last_info = self.get_frame(self._grabbed, image)
+        if frame is None:
+            return False, None
+        return True, frame
+
+    def read(self, image=None):
+        """
+        顺序读取下一帧（兼容 OpenCV）
+
+        返回:
+            Tuple[bool, np.ndarray]: (是否成功, BGR 图像)
+        """
+        if not self.grab():
+            return False, None
+        return self.retrieve(image)
+
+    def get(self, propId):
+        """
+        获取回放属性（兼容 OpenCV）
+
+        支持 CAP_PROP_POS_FRAMES / CAP_PROP_FRAME_COUNT / CAP_PROP_POS_MSEC /
+        CAP_PROP_FRAME_WIDTH / CAP_PROP_FRAME_HEIGHT / CAP_PROP_FPS
+
+        返回:
+            float: 属性值，不支持的属性返回 0.0
+        """
+        if not len(self):
+            return 0.0
+
+        if propId == CAP_PROP_POS_FRAMES:
+            return float(self._pos)
+        if propId == CAP_PROP_FRAME_COUNT:
+            return float(len(self))
+
+        stamps = self.index['host_timestamp']
+        if propId == CAP_PROP_POS_MSEC:
+            current = min(self._pos, len(self) - 1)
+            return float(stamps[current] - stamps[0])
+        if propId == CAP_PROP_FPS:
+            duration = float(stamps[-1] - stamps[0])
+            return (len(self) - 1) * 1000.0 / duration if duration > 0 else 0.0
+
+        current = self.index[min(self._pos, len(self) - 1)]
+        if propId == CAP_PROP_FRAME_WIDTH:
+            return float(current['width'])
+        if propId == CAP_PROP_FRAME_HEIGHT:
+            return float(current['height'])
+        return 0.0
+
+    def set(self, propId, value):
+        """
+        设置回放属性（兼容 OpenCV）
+
+        支持 CAP_PROP_POS_FRAMES（跳到指定帧）和 CAP_PROP_POS_MSEC（跳到最接近的时间点）
+
+        返回:
+            bool: 是否设置成功
+        """
+        if not self.isOpened():
+            return False
+
+        if propId == CAP_PROP_POS_FRAMES:
+            self._pos = min(max(int(value), 0), len(self))
+            return True
+        if propId == CAP_PROP_POS_MSEC:
+            if len(self):
+                self._pos = self.nearest(int(self.index['host_timestamp'][0]) + int(value))
+            return True
+        return False
+
+    def release(self):
+        """关闭录制文件并解除内存映射"""
+        self._maps.clear()
+        self.index = None
+        self._grabbed = None
+
+    def __enter__(self):
+        """上下文管理器支持"""
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        """上下文管理器支持"""
+        self.release()
+        return False
+
+    def __repr__(self):
+        """字符串表示"""
+        if self.isOpened():
+            return f"<RecordingReader {self.path} [{len(self)} frames]>"
+        return "<RecordingReader (closed)>"
+
+
+# ================================
+# 平场与暗场校正
+# ================================
+
+# 增益图的定点小数位数（Q4.12，最大增益约 16 倍）
+FLAT_FIELD_GAIN_SHIFT = 12
+
+
+def _calibration_path(directory, kind, key):
+    """
+    内部方法：按相机序列号、ROI 和像素格式生成标定缓存文件路径
+
+    参数:
+        directory: str, 缓存目录
+        kind: str, 标定类型（如 'flat_field'）
+        key: dict, HikCamera.get_calibration_key() 的返回值
+
+    返回:
+        str: .npz 文件路径
+    """
+    serial = ''.join(c if c.isalnum() or c in '-_' else '_' for c in str(key.get('serial') or 'unknown'))
+    name = f"{kind}_{serial}_{key['offset_x']}_{key['offset_y']}_{key['width']}x{key['height']}"
+    if key.get('pixel_type') is not None:
+        name += f"_{_pixel_type_name(key['pixel_type'])}"
+    return os.path.join(directory, name + '.npz')
+
+
+class FlatFieldCorrection:
+    """
+    平场 / 暗场校正（修正暗角和固定图案噪声）
+
+    corrected = (raw - offset) * gain，offset 为暗场均值，gain 由平场 (flat - dark) 归一化到均值得到；
+    Bayer 格式按 2x2 单元的 4 个颜色平面分别归一化，不改变白平衡。
+    偏移图与原始数据同类型，增益图为 Q4.12 定点 uint16，校正全程整数运算，结果可原地写回原始数据。
+
+    只支持按像素排列的单通道格式（Mono / Bayer 8/10/12/16 位，不含 Packed）。
+
+    使用示例:
+        dark = cam.acquire_calibration_frame(32)   # 盖上镜头盖
+        flat = cam.acquire_calibration_frame(32)   # 对准均匀光源
+        cam.calibrate_flat_field(dark, flat, directory='calib')
+
+        # 之后直接从缓存加载，不需要重新计算
+        cam.restore_flat_field('calib')
+    """
+
+    def __init__(self, offset, gain, bit_depth=8, key=None):
+        """
+        参数:
+            offset: numpy.ndarray, (height, width) 偏移图，类型与原始数据一致（uint8 / uint16）
+            gain: numpy.ndarray, (height, width) uint16 增益图（Q4.12 定点，4096 表示 1 倍）
+            bit_depth: int, 原始数据的有效位数（校正结果截断到该范围）
+            key: dict, 标定对应的相机序列号、ROI 和像素格式
+        """
+        offset = np.ascontiguousarray(offset)
+        gain = np.ascontiguousarray(gain, dtype=np.uint16)
+        if offset.ndim != 2 or offset.shape != gain.shape:
+            raise ValueError(f"偏移图和增益图形状不一致: {offset.shape} / {gain.shape}")
+
+        self.offset = offset
+        self.gain = gain
+        self.bit_depth = int(bit_depth)
+        self.max_value = (1 << self.bit_depth) - 1
+        self.key = dict(key) if key else None
+
+        # (2^bit_depth - 1) * 65535 超过 int32 时用 int64 中间结果
+        work_dtype = np.int32 if self.bit_depth <= 15 else np.int64
+        # (raw - offset) * gain + 0.5 = raw * gain + bias，bias 预先算好，每帧少做一次减法和截断
+        self._bias = (1 << (FLAT_FIELD_GAIN_SHIFT - 1)) - offset.astype(work_dtype) * gain
+        self._work = np.empty(offset.shape, dtype=work_dtype)
+        self._lock = threading.Lock()
+
+    def apply(self, image, out=None):
+        """
+        校正一帧图像
+
+        参数:
+            image: numpy.ndarray, (height, width) 原始数据，形状和类型需与偏移图一致
+            out: numpy.ndarray, 输出数组，None 表示原地写回 image
+
+        返回:
+            numpy.ndarray: 校正后的图像（out 或 image）
+        """
+        if image.shape != self.offset.shape or image.dtype != self.offset.dtype:
+            raise ValueError(f"图像 {image.shape} {image.dtype} 与校正图 {self.offset.shape} {self.offset.dtype} 不匹配")
+        if out is None:
+            out = image
+
+        with self._lock:
+            work = self._work
+            np.multiply(image, self.gain, out=work, dtype=work.dtype)
+            work += self._bias
+            np.right_shift(work, FLAT_FIELD_GAIN_SHIFT, out=work)
+            np.clip(work, 0, self.max_value, out=work)
+            np.copyto(out, work, casting='unsafe')
+        return out
+
+    def save(self, path):
+        """
+        保存校正图（.npz），之后用 load_flat_field() 读回，不需要重新计算
+
+        参数:
+            path: str, 目标文件路径
+        """
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        meta = {'bit_depth': self.bit_depth, 'gain_shift': FLAT_FIELD_GAIN_SHIFT, 'key': self.key}
+        np.savez(path, offset=self.offset, gain=self.gain, meta=json.dumps(meta))
+
+    def __repr__(self):
+        height, width = self.offset.shape
+        return f"<FlatFieldCorrection {width}x{height} {self.bit_depth}bit>"
+
+
+def compute_flat_field(dark, flat, pixel_type, key=None):
+    """
+    由暗场和平场均值图计算校正图
+
+    参数:
+        dark: numpy.ndarray, 暗场均值图（盖上镜头采集），None 表示不减暗场
+        flat: numpy.ndarray, 平场均值图（均匀光照采集），None 表示只做暗场校正
+        pixel_type: int, 原始数据的像素格式
+        key: dict, 标定对应的相机序列号、ROI 和像素格式
+
+    返回:
+        FlatFieldCorrection: 校正对象
+    """
+    fmt = get_pixel_format(pixel_type)
+    if fmt is None or fmt.channels != 1 or fmt.packed or fmt.compressed or fmt.bit_depth < 8:
+        raise ValueError(f"平场校正不支持像素格式: {_pixel_type_name(pixel_type)}")
+    bit_depth = fmt.bit_depth
+    dtype = np.uint8 if bit_depth <= 8 else np.uint16
+
+    reference = dark if dark is not None else flat
+    if reference is None:
+        raise ValueError("暗场和平场至少需要提供一个")
+    shape = np.shape(reference)
+
+    if dark is None:
+        dark = np.zeros(shape, dtype=np.float32)
+    dark = np.asarray(dark, dtype=np.float32)
+    offset = np.clip(np.rint(dark), 0, (1 << bit_depth) - 1).astype(dtype)
+
+    if flat is None:
+        gain = np.full(shape, 1 << FLAT_FIELD_GAIN_SHIFT, dtype=np.uint16)
+    else:
+        signal = np.asarray(flat, dtype=np.float32) - dark
+        np.maximum(signal, 1.0, out=signal)
+        ratio = np.empty(shape, dtype=np.float32)
+        # Bayer 各颜色平面分别归一化
+        planes = ((slice(dy, None, 2), slice(dx, None, 2)) for dy in (0, 1) for dx in (0, 1)) \
+            if fmt.is_bayer else ((slice(None), slice(None)),)
+        for plane in planes:
+            np.divide(signal[plane].mean(), signal[plane], out=ratio[plane])
+        gain = np.clip(np.rint(ratio * (1 << FLAT_FIELD_GAIN_SHIFT)), 0, 0xffff).astype(np.uint16)
+
+    return FlatFieldCorrection(offset, gain, bit_depth, key)
+
+
+def load_flat_field(path):
+    """
+    读取 FlatFieldCorrection.save() 保存的校正图
+
+    返回:
+        FlatFieldCorrection: 校正对象
+    """
+    with np.load(path) as data:
+        meta = json.loads(str(data['meta']))
+        offset = data['offset']
+        gain = data['gain']
+    if meta.get('gain_shift', FLAT_FIELD_GAIN_SHIFT) != FLAT_FIELD_GAIN_SHIFT:
+        raise ValueError(f"增益图定点格式不一致: {path}")
+    return FlatFieldCorrection(offset, gain, meta['bit_depth'], meta.get('key'))
+
+
+# ================================
+# 多帧累加
+# ================================
+
+def _raw_pixels(raw, info, scratch=None):
+    """
+    内部方法：把原始数据按像素排列读出
 
-        # 清理缓存
-        if self.buf_save_image is not None:
-            del self.buf_save_image
-            self.buf_save_image = None
+    按字节对齐的格式直接返回映射原始数据的视图（不复制）；Packed 格式解包到 scratch。
 
-        print(f"相机 [{self.index}] 已释放")
+    返回:
+        numpy.ndarray: 像素数组，不支持的格式返回 None
+    """
+    shape, dtype = _raw_frame_layout(info['width'], info['height'], info['pixel_type'])
+    if len(shape) == 1:
+        return unpack_raw(raw, info, scratch)
+    nbytes = int(np.prod(shape)) * np.dtype(dtype).itemsize
+    if raw.size < nbytes:
+        return None
+    return raw[:nbytes].view(dtype).reshape(shape)
 
-    def get(self, propId):
+
+class FrameAccumulator:
+    """
+    多帧累加器（低照度多帧降噪等）
+
+    在取图线程中把每帧直接累加到预先分配的数组里：原始数据来源直接读 SDK 缓存的视图，
+    输出帧来源直接读每帧独立的图像，都不做逐帧复制（中值模式需要保存 N 帧，每帧复制一次）。
+
+    模式:
+        - ACCUMULATE_MEAN / ACCUMULATE_SUM: uint32 累加，N 帧后完成
+        - ACCUMULATE_EWMA: float32 指数加权滑动平均，N 帧后完成，之后继续更新直到 stop()
+        - ACCUMULATE_MIN / ACCUMULATE_MAX: 逐像素最小 / 最大值，N 帧后完成
+        - ACCUMULATE_MEDIAN: 保存 N 帧后求逐像素中值
+
+    使用示例:
+        acc = FrameAccumulator(cam, frames=16, mode=ACCUMULATE_MEAN)
+        acc.start()
+        mean = acc.wait(timeout=5.0)
+
+        # 或者
+        mean = cam.accumulate(16)
+    """
+
+    def __init__(self, camera, frames=16, mode=ACCUMULATE_MEAN, alpha=0.1, source=SOURCE_RAW):
         """
-        获取相机属性（类似OpenCV的cap.get()）
+        参数:
+            camera: HikCamera, 已打开的相机
+            frames: int, 累加帧数 N
+            mode: str, 累加模式（ACCUMULATE_*）
+            alpha: float, EWMA 模式新帧的权重 (0, 1]
+            source: str, SOURCE_RAW 累加原始数据（Packed 解包为 uint16），SOURCE_FRAME 累加转换后的输出帧
+        """
+        if mode not in _ACCUMULATE_MODES:
+            raise ValueError(f"不支持的累加模式: {mode}")
+        if source not in (SOURCE_RAW, SOURCE_FRAME):
+            raise ValueError(f"不支持的数据来源: {source}")
+        if not 0.0 < alpha <= 1.0:
+            raise ValueError(f"alpha 应在 (0, 1] 范围内: {alpha}")
+
+        self.camera = camera
+        self.frames = max(int(frames), 1)
+        self.mode = mode
+        self.alpha = float(alpha)
+        self.source = source
+
+        self._lock = threading.Lock()
+        self._done = threading.Event()
+        self._running = False
+        self._acc = None
+        self._work = None
+        self._scratch = None
+        self.count = 0
+        self.error = None
+        self.info = None
+
+    def reset(self):
+        """清空累加结果（保留已分配的数组，尺寸不变时直接复用）"""
+        with self._lock:
+            self.count = 0
+            self.error = None
+            self.info = None
+            self._done.clear()
+
+    def _allocate(self, image):
+        """内部方法：按首帧的形状和类型分配累加数组"""
+        shape = image.shape
+        if self.mode in (ACCUMULATE_MEAN, ACCUMULATE_SUM):
+            dtype = np.uint32
+        elif self.mode == ACCUMULATE_EWMA:
+            dtype = np.float32
+        else:
+            dtype = image.dtype
+        if self.mode == ACCUMULATE_MEDIAN:
+            shape = (self.frames,) + shape
+        if self._acc is None or self._acc.shape != shape or self._acc.dtype != dtype:
+            self._acc = np.empty(shape, dtype=dtype)
+            self._work = np.empty(image.shape, dtype=np.float32) if self.mode == ACCUMULATE_EWMA else None
+
+    def _add(self, image, info):
+        """内部方法：累加一帧（在取图线程中调用）"""
+        with self._lock:
+            if self.error is not None or (self._done.is_set() and self.mode != ACCUMULATE_EWMA):
+                return
+            if self.count == 0:
+                self._allocate(image)
+            elif image.shape != self._acc.shape[-image.ndim:]:
+                self.error = f"累加过程中图像尺寸发生变化: {image.shape}"
+                self._done.set()
+                return
+
+            acc = self._acc
+            mode = self.mode
+            if mode == ACCUMULATE_MEDIAN:
+                acc[self.count] = image
+            elif self.count == 0:
+                np.copyto(acc, image, casting='unsafe')
+            elif mode in (ACCUMULATE_MEAN, ACCUMULATE_SUM):
+                np.add(acc, image, out=acc, casting='unsafe')
+            elif mode == ACCUMULATE_EWMA:
+                # acc = (1 - alpha) * acc + alpha * image
+                np.multiply(image, self.alpha, out=self._work, casting='unsafe')
+                acc *= 1.0 - self.alpha
+                acc += self._work
+            elif mode == ACCUMULATE_MIN:
+                np.minimum(acc, image, out=acc)
+            else:
+                np.maximum(acc, image, out=acc)
+
+            self.count += 1
+            self.info = info
+            if self.count >= self.frames:
+                self._done.set()
+
+    def _on_raw(self, raw, info):
+        """取图线程回调：累加原始数据"""
+        image = _raw_pixels(raw, info, self._scratch)
+        if image is None:
+            with self._lock:
+                self.error = f"累加不支持像素格式: {_pixel_type_name(info['pixel_type'])}"
+                self._done.set()
+            return False
+        if image.base is None:
+            self._scratch = image
+        self._add(image, info)
+        return False
+
+    def _on_frame(self, image, info):
+        """取图线程回调：累加输出帧"""
+        self._add(image, info)
+
+    def start(self):
+        """开始累加（从下一帧开始）"""
+        if self._running:
+            return
+        self.reset()
+        self._running = True
+        if self.source == SOURCE_RAW:
+            self.camera.add_raw_listener(self._on_raw)
+        else:
+            self.camera.add_frame_listener(self._on_frame)
+
+    def stop(self):
+        """停止累加"""
+        if not self._running:
+            return
+        if self.source == SOURCE_RAW:
+            self.camera.remove_raw_listener(self._on_raw)
+        else:
+            self.camera.remove_frame_listener(self._on_frame)
+        self._running = False
+
+    def is_complete(self):
+        """是否已累加满 N 帧"""
+        return self._done.is_set() and self.error is None
+
+    def get_result(self):
+        """
+        获取当前累加结果（未累加满 N 帧时为已有帧的结果）
+
+        返回:
+            numpy.ndarray: 均值 / EWMA / 中值为 float32（偶数帧的中值是两帧的平均，可能为半整数），
+                           累加和为 uint32，最小 / 最大与输入同类型；
+                           还没有帧时返回 None
+        """
+        with self._lock:
+            count = self.count
+            if count == 0:
+                return None
+            if self.mode == ACCUMULATE_MEAN:
+                return (self._acc / np.float32(count)).astype(np.float32, copy=False)
+            if self.mode == ACCUMULATE_MEDIAN:
+                return np.median(self._acc[:count], axis=0).astype(np.float32)
+            return self._acc.copy()
+
+    def wait(self, timeout=None):
+        """
+        等待累加满 N 帧并返回结果（非 EWMA 模式完成后自动停止监听）
 
         参数:
-            propId: 属性ID
-                - 3: CV_CAP_PROP_FRAME_WIDTH (宽度)
-                - 4: CV_CAP_PROP_FRAME_HEIGHT (高度)
-                - 5: CV_CAP_PROP_FPS (帧率)
-                - 15: CV_CAP_PROP_EXPOSURE (曝光时间)
-                - 17: CV_CAP_PROP_GAIN (增益)
+            timeout: float, 最长等待时间（秒），None 表示一直等待
 
         返回:
-            float: 属性值
+            numpy.ndarray: 累加结果，超时或出错返回 None
         """
-        if not self.is_opened:
-            return 0.0
+        finished = self._done.wait(timeout)
+        if self.mode != ACCUMULATE_EWMA:
+            self.stop()
+        if self.error is not None:
+            print(self.error)
+            return None
+        if not finished:
+            print(f"多帧累加超时（{self.count}/{self.frames} 帧）")
+            return None
+        return self.get_result()
+
+    def get_stats(self):
+        """
+        获取累加状态
+
+        返回:
+            dict: mode / frames / count / complete / error
+        """
+        return {'mode': self.mode, 'frames': self.frames, 'count': self.count,
+                'complete': self.is_complete(), 'error': self.error}
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.stop()
+        return False
+
+
+# ================================
+# 镜头畸变校正
+# ================================
+
+class LensUndistortion:
+    """
+    镜头畸变校正（重映射）
 
+    按标定参数用 cv2.initUndistortRectifyMap 生成定点映射表（CV_16SC2），
+    每种 (ROI 偏移, 分辨率) 只生成一次并缓存在内存中；指定 cache_dir 时再按
+    序列号 + ROI + 分辨率保存到磁盘，下次启动直接加载。之后每帧只需一次 cv2.remap，
+    strips > 1 时按行分条在线程池中并行（OpenCV 重映射期间释放 GIL），
+    适用于 OpenCV 内部并行被关闭（cv2.setNumThreads(1)）或被其他处理占满的场合。
+
+    相机内参按全幅传感器坐标给出，ROI 偏移会自动换算到主点上；
+    Binning / 抽样需与标定时一致。
+
+    使用示例:
+        undistort = LensUndistortion(K, dist, alpha=0.0, strips=4, cache_dir='calib')
+        cam.set_undistort(undistort)
+        ret, frame = cam.read()   # 已校正
+    """
+
+    def __init__(self, camera_matrix, dist_coeffs, new_camera_matrix=None, alpha=None, strips=1,
+                 interpolation=None, cache_dir=None, serial=None):
+        """
+        参数:
+            camera_matrix: array-like, 3x3 相机内参（全幅传感器坐标）
+            dist_coeffs: array-like, 畸变系数 (k1, k2, p1, p2[, k3...])
+            new_camera_matrix: array-like, 校正后的内参，None 时与 camera_matrix 相同（同 cv2.undistort）
+            alpha: float, 不为 None 时用 cv2.getOptimalNewCameraMatrix 按 alpha 计算校正后的内参
+                   （0 裁掉全部无效区域，1 保留全部原始像素）
+            strips: int, 并行分条数（线程数）
+            interpolation: int, cv2 插值方式，默认 cv2.INTER_LINEAR
+            cache_dir: str, 映射表磁盘缓存目录，None 表示只缓存在内存中
+            serial: str, 相机序列号（用于磁盘缓存文件名），HikCamera.set_undistort() 会自动填写
+        """
+        self._cv2 = _require_cv2()
+        self.camera_matrix = np.asarray(camera_matrix, dtype=np.float64).reshape(3, 3)
+        self.dist_coeffs = np.asarray(dist_coeffs, dtype=np.float64).reshape(-1)
+        self.new_camera_matrix = None if new_camera_matrix is None else \
+            np.asarray(new_camera_matrix, dtype=np.float64).reshape(3, 3)
+        self.alpha = alpha
+        self.interpolation = self._cv2.INTER_LINEAR if interpolation is None else interpolation
+        self.cache_dir = cache_dir
+        self.serial = serial
+
+        self.strips = max(int(strips), 1)
+        self._executor = ThreadPoolExecutor(max_workers=self.strips, thread_name_prefix='remap') \
+            if self.strips > 1 else None
+        self._maps = {}
+        self._lock = threading.Lock()
+
+    def _build_maps(self, width, height, offset_x, offset_y):
+        """内部方法：按 ROI 生成定点映射表"""
+        cv2 = self._cv2
+        # 全幅坐标下的内参换算到 ROI 坐标：主点减去 ROI 偏移
+        shift = np.array([[1.0, 0.0, -offset_x], [0.0, 1.0, -offset_y], [0.0, 0.0, 1.0]])
+        camera_matrix = shift @ self.camera_matrix
+        if self.alpha is not None:
+            new_matrix, _ = cv2.getOptimalNewCameraMatrix(camera_matrix, self.dist_coeffs, (width, height),
+                                                          self.alpha, (width, height))
+        elif self.new_camera_matrix is not None:
+            new_matrix = shift @ self.new_camera_matrix
+        else:
+            new_matrix = camera_matrix
+        return cv2.initUndistortRectifyMap(camera_matrix, self.dist_coeffs, None, new_matrix,
+                                           (width, height), cv2.CV_16SC2)
+
+    def _load_maps(self, path):
+        """内部方法：读取磁盘缓存的映射表，标定参数不一致时返回 None"""
         try:
-            if propId == 3:  # Width
-                return float(self.st_frame_info.nWidth)
-            elif propId == 4:  # Height
-                return float(self.st_frame_info.nHeight)
-            elif propId == 5:  # FPS
-                stFloatValue = MVCC_FLOATVALUE()
-                ret = self.cam.MV_CC_GetFloatValue("AcquisitionFrameRate", stFloatValue)
-                if ret == 0:
-                    return stFloatValue.fCurValue
-            elif propId == 15:  # Exposure
-                stFloatValue = MVCC_FLOATVALUE()
-                ret = self.cam.MV_CC_GetFloatValue("ExposureTime", stFloatValue)
-                if ret == 0:
-                    return stFloatValue.fCurValue
-            elif propId == 17:  # Gain
-                stFloatValue = MVCC_FLOATVALUE()
-                ret = self.cam.MV_CC_GetFloatValue("Gain", stFloatValue)
-                if ret == 0:
-                    return stFloatValue.fCurValue
-        except Exception as e:
-            print(f"获取属性失败: {e}")
+            with np.load(path) as data:
+                params = {name: data[name] for name in ('camera_matrix', 'dist_coeffs', 'new_camera_matrix')}
+                meta = json.loads(str(data['meta']))
+                maps = (data['map1'], data['map2'])
+        except (OSError, KeyError, ValueError) as e:
+            print(f"读取畸变映射表缓存失败: {e}")
+            return None
+        new_matrix = self.new_camera_matrix if self.new_camera_matrix is not None else np.zeros((3, 3))
+        if meta.get('alpha') != self.alpha or \
+                not np.array_equal(params['camera_matrix'], self.camera_matrix) or \
+                not np.array_equal(params['dist_coeffs'], self.dist_coeffs) or \
+                not np.array_equal(params['new_camera_matrix'], new_matrix):
+            return None
+        return maps
+
+    def _save_maps(self, path, maps):
+        """内部方法：把映射表和生成它的标定参数一起保存"""
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        new_matrix = self.new_camera_matrix if self.new_camera_matrix is not None else np.zeros((3, 3))
+        np.savez(path, map1=maps[0], map2=maps[1], camera_matrix=self.camera_matrix,
+                 dist_coeffs=self.dist_coeffs, new_camera_matrix=new_matrix,
+                 meta=json.dumps({'alpha': self.alpha}))
+
+    def get_maps(self, width, height, offset_x=0, offset_y=0):
+        """
+        获取指定 ROI 的映射表（内存缓存 -> 磁盘缓存 -> 重新生成）
 
-        return 0.0
+        返回:
+            tuple: (map1, map2)，map1 为 (height, width, 2) int16，map2 为 (height, width) uint16
+        """
+        roi = (int(offset_x), int(offset_y), int(width), int(height))
+        maps = self._maps.get(roi)
+        if maps is not None:
+            return maps
+
+        with self._lock:
+            maps = self._maps.get(roi)
+            if maps is not None:
+                return maps
+
+            path = None
+            if self.cache_dir is not None:
+                key = {'serial': self.serial, 'offset_x': roi[0], 'offset_y': roi[1],
+                       'width': roi[2], 'height': roi[3]}
+                path = _calibration_path(self.cache_dir, 'undistort', key)
+                if os.path.exists(path):
+                    maps = self._load_maps(path)
+            if maps is None:
+                maps = self._build_maps(width, height, offset_x, offset_y)
+                if path is not None:
+                    self._save_maps(path, maps)
+            self._maps[roi] = maps
+            return maps
+
+    def apply(self, image, offset_x=0, offset_y=0, out=None):
+        """
+        校正一帧图像
 
-    def set(self, propId, value):
+        参数:
+            image: numpy.ndarray, BGR 或单通道图像
+            offset_x, offset_y: int, 图像在全幅传感器上的 ROI 偏移
+            out: numpy.ndarray, 可选的输出数组（不能与 image 相同）
+
+        返回:
+            numpy.ndarray: 校正后的图像
         """
-        设置相机属性（类似OpenCV的cap.set()）
+        height, width = image.shape[:2]
+        map1, map2 = self.get_maps(width, height, offset_x, offset_y)
+        if not isinstance(out, np.ndarray) or out.shape != image.shape or out.dtype != image.dtype \
+                or not out.flags.c_contiguous:
+            out = np.empty_like(image)
+
+        cv2 = self._cv2
+        if self._executor is None or height < self.strips * 4:
+            cv2.remap(image, map1, map2, self.interpolation, dst=out)
+            return out
+
+        # 映射表给出的是源图中的绝对坐标，每个条带读取整幅源图、只写自己的输出行
+        step = (height + self.strips - 1) // self.strips
+        futures = [self._executor.submit(cv2.remap, image, map1[y:y + step], map2[y:y + step],
+                                         self.interpolation, dst=out[y:y + step])
+                   for y in range(0, height, step)]
+        for future in futures:
+            future.result()
+        return out
+
+    def clear_cache(self):
+        """清空内存中的映射表（磁盘缓存保留）"""
+        with self._lock:
+            self._maps = {}
+
+    def close(self):
+        """关闭分条线程池"""
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+
+
+# ================================
+# 软件自动曝光
+# ================================
+
+def _sample_luma(raw, info, samples=16384):
+    """
+    内部方法：在原始数据的稀疏网格上抽样 8 位亮度
+
+    每行、每列按相同步长抽样约 samples 个点，高位深数据取高 8 位；
+    10/12 位 Packed 格式直接取每 3 字节中的第 1 个字节（偶数像素的高 8 位），不解包。
+    8 位数据返回映射原始数据的视图，仅在原始数据有效期间可用。
+
+    返回:
+        numpy.ndarray: 抽样结果（行 x 列，RGB 格式为行 x 列 x 3），不支持的像素格式返回 None
+    """
+    width, height = info['width'], info['height']
+    fmt = get_pixel_format(info['pixel_type'])
+    if fmt is None or fmt.compressed or width <= 0 or height <= 0:
+        return None
+    step = max(int((width * height / max(samples, 1)) ** 0.5), 1)
+    if fmt.is_bayer and step % 2 == 0:
+        # Bayer 数据用奇数步长，避免只采到同一种颜色
+        step += 1
+
+    if fmt.packed and fmt.channels == 1 and fmt.bpp == 12 and width % 2 == 0:
+        row_bytes = width * 3 // 2
+        if raw.size < row_bytes * height:
+            return None
+        # 每 3 字节的第 1、3 个字节分别是偶数、奇数像素的高 8 位。列步长总是偶数个像素，
+        # 按 (行序号 // 2) % 2 交替取两种字节：配合奇数行步长，Bayer 的四个位置都能采到
+        rows = raw[:row_bytes * height].reshape(height, row_bytes)[::step]
+        col_step = 3 * max(step // 2, 1)
+        cols = len(range(2, row_bytes, col_step))
+        values = np.empty((rows.shape[0], cols), dtype=np.uint8)
+        for phase, offset in ((0, 0), (1, 0), (2, 2), (3, 2)):
+            values[phase::4] = rows[phase::4, offset::col_step][:, :cols]
+    else:
+        if fmt.packed or fmt.dtype is None or fmt.dtype.kind != 'u':
+            return None
+        pixels = _raw_pixels(raw, info)
+        if pixels is None:
+            return None
+        values = pixels[::step, ::step]
+        if fmt.is_yuv and fmt.channels == 2:
+            # 只取亮度：UYVY 的 Y 在第 2 个字节，YUYV 在第 1 个字节
+            values = values[..., 0 if 'YUYV' in fmt.name else 1]
+        elif values.ndim == 3:
+            values = values[..., :3]
+        if values.dtype != np.uint8:
+            values = values >> max(fmt.bit_depth - 8, 0)
+            np.minimum(values, 255, out=values)
+    return values
+
+
+def _sample_brightness(raw, info, samples=16384):
+    """
+    内部方法：在原始数据的稀疏网格上统计 8 位亮度直方图
+
+    返回:
+        numpy.ndarray: 256 级直方图，不支持的像素格式返回 None
+    """
+    values = _sample_luma(raw, info, samples)
+    if values is None:
+        return None
+    return np.bincount(values.ravel(), minlength=256)[:256]
+
+
+# 测光方式
+METERING_AUTO = 'auto'            # 有 Chunk 平均亮度时用 Chunk，否则用抽样直方图
+METERING_CHUNK = 'chunk'          # 只用帧信息中的 nAverageBrightness
+METERING_HISTOGRAM = 'histogram'  # 只用原始数据抽样直方图
+
+
+class AutoExposureController:
+    """
+    软件自动曝光 / 自动增益闭环控制器
+
+    在取图线程中测光（Chunk 平均亮度或稀疏抽样直方图，每帧远小于 1 ms），
+    按亮度误差在对数域成比例调节总曝光量：先调曝光时间，曝光到上限后再加增益。
+    参数写入在独立线程中进行（只保留最新的目标值），不阻塞取图，也不需要 sleep。
+
+    Chunk 中带有 fExposureTime / fGain 时按帧实际使用的参数计算，新参数生效前的帧自动跳过；
+    没有 Chunk 时在每次写入后跳过 settle_frames 帧。开启时会关闭相机的 ExposureAuto / GainAuto。
 
+    通常通过 HikCamera.enable_auto_exposure() 使用。
+    """
+
+    def __init__(self, camera, target=110.0, tolerance=0.05, damping=0.8, metering=METERING_AUTO,
+                 min_exposure=None, max_exposure=None, min_gain=None, max_gain=None,
+                 max_saturation=0.02, samples=16384, settle_frames=2):
+        """
         参数:
-            propId: 属性ID
-                - 5: CV_CAP_PROP_FPS (帧率)
-                - 15: CV_CAP_PROP_EXPOSURE (曝光时间)
-                - 17: CV_CAP_PROP_GAIN (增益)
-            value: 属性值
+            camera: HikCamera, 已打开的相机
+            target: float, 目标平均亮度（0-255）
+            tolerance: float, 相对误差在此范围内视为已收敛，不再调整
+            damping: float, 每次修正误差的比例（对数域，0-1，越大收敛越快、越容易振荡）
+            metering: str, METERING_AUTO / METERING_CHUNK / METERING_HISTOGRAM
+            min_exposure, max_exposure: float, 曝光时间范围（us），None 取相机节点范围
+            min_gain, max_gain: float, 增益范围（dB），None 取相机节点范围
+            max_saturation: float, 过曝像素（>= 250）比例上限，超过时不再增加曝光，超过两倍时降低曝光
+            samples: int, 直方图抽样点数
+            settle_frames: int, 没有 Chunk 曝光信息时，每次写入后跳过的帧数
+        """
+        if metering not in (METERING_AUTO, METERING_CHUNK, METERING_HISTOGRAM):
+            raise ValueError(f"不支持的测光方式: {metering}")
+        self.camera = camera
+        self.target = float(target)
+        self.tolerance = float(tolerance)
+        self.damping = min(max(float(damping), 0.05), 1.0)
+        self.metering = metering
+        self.max_saturation = float(max_saturation)
+        self.samples = int(samples)
+        self.settle_frames = int(settle_frames)
+        self._user_limits = {'min_exposure': min_exposure, 'max_exposure': max_exposure,
+                             'min_gain': min_gain, 'max_gain': max_gain}
+        self._limits = None
+
+        self.exposure = None
+        self.gain = None
+        self.brightness = None
+        self.converged = False
+
+        self._cond = threading.Condition()
+        self._pending = None
+        self._applied = None
+        self._running = False
+        self._thread = None
+        self._frames_since_update = 0
+        self._stats = {'frames': 0, 'updates': 0, 'skipped': 0, 'set_errors': 0,
+                       'process_time': 0.0, 'process_time_max': 0.0}
+
+    def _read_float_node(self, name):
+        """内部方法：读取浮点节点，返回 (当前值, 最小值, 最大值)，失败返回 None"""
+        stFloatValue = MVCC_FLOATVALUE()
+        if self.camera.cam.MV_CC_GetFloatValue(name, stFloatValue) != 0:
+            return None
+        return stFloatValue.fCurValue, stFloatValue.fMin, stFloatValue.fMax
+
+    def _measure(self, raw, info):
+        """内部方法：测光，返回 (平均亮度, 过曝比例)，无法测光返回 None"""
+        if self.metering != METERING_HISTOGRAM and info.get('average_brightness'):
+            return float(info['average_brightness']), 0.0
+        if self.metering == METERING_CHUNK:
+            return None
+        hist = _sample_brightness(raw, info, self.samples)
+        if hist is None:
+            return None
+        count = int(hist.sum())
+        if count == 0:
+            return None
+        mean = float(hist @ np.arange(256)) / count
+        return mean, int(hist[250:].sum()) / count
+
+    def _on_raw(self, raw, info):
+        """取图线程回调：测光并计算新的曝光 / 增益"""
+        t0 = time.perf_counter()
+        self._stats['frames'] += 1
+        try:
+            self._update(raw, info)
+        finally:
+            elapsed = time.perf_counter() - t0
+            self._stats['process_time'] += elapsed
+            self._stats['process_time_max'] = max(self._stats['process_time_max'], elapsed)
+        return False
+
+    def _update(self, raw, info):
+        """内部方法：一帧的闭环控制"""
+        frame_exposure, frame_gain = info.get('exposure_time') or 0.0, info.get('gain')
+        with self._cond:
+            pending = self._pending is not None
+            exposure, gain = self.exposure, self.gain
+        if frame_exposure > 0:
+            # Chunk 给出了这一帧实际的曝光时间：与最新写入值不一致说明新参数还没生效
+            if pending or abs(frame_exposure - exposure) > max(exposure * 0.01, 1.0) or \
+                    (frame_gain and abs(frame_gain - gain) > 0.05):
+                self._stats['skipped'] += 1
+                return
+        else:
+            self._frames_since_update += 1
+            if pending or self._frames_since_update <= self.settle_frames:
+                self._stats['skipped'] += 1
+                return
+
+        measured = self._measure(raw, info)
+        if measured is None:
+            self._stats['skipped'] += 1
+            return
+        brightness, saturated = measured
+        self.brightness = brightness
+
+        ratio = self.target / max(brightness, 1.0)
+        if saturated > 2 * self.max_saturation:
+            ratio = min(ratio, 0.8)
+        elif saturated > self.max_saturation:
+            # 过曝比例在上限附近时只允许降低，避免在过曝和目标亮度之间来回振荡
+            ratio = min(ratio, 1.0)
+        if abs(ratio - 1.0) <= self.tolerance:
+            self.converged = True
+            return
+        self.converged = False
+
+        # 对数域按比例修正：总曝光量 = 曝光时间 * 线性增益
+        ratio = min(max(ratio, 0.125), 8.0) ** self.damping
+        limits = self._limits
+        total = exposure * 10.0 ** (gain / 20.0) * ratio
+        new_exposure = min(max(total / 10.0 ** (limits['min_gain'] / 20.0), limits['min_exposure']),
+                           limits['max_exposure'])
+        new_gain = min(max(20.0 * np.log10(total / new_exposure), limits['min_gain']), limits['max_gain'])
+        if abs(new_exposure - exposure) < 1.0 and abs(new_gain - gain) < 0.01:
+            return
+
+        self._frames_since_update = 0
+        with self._cond:
+            self.exposure, self.gain = float(new_exposure), float(new_gain)
+            self._pending = (self.exposure, self.gain)
+            self._cond.notify_all()
+
+    def _shrink_limits(self, name, requested, applied, node):
+        """
+        内部方法：写入失败后收紧范围（调用者持有 self._cond）
+
+        先按读回的节点范围收紧（最大曝光会随帧率变化）；节点范围仍包含失败的值时，
+        以当前实际值为界，避免每帧重复写入同一个无效值。重新 start() 后恢复。
+        """
+        limits = self._limits
+        if node is not None:
+            limits['min_' + name] = max(limits['min_' + name], node[1])
+            limits['max_' + name] = min(limits['max_' + name], node[2])
+        if requested > applied and requested <= limits['max_' + name]:
+            limits['max_' + name] = max(applied, limits['min_' + name])
+        elif requested < applied and requested >= limits['min_' + name]:
+            limits['min_' + name] = min(applied, limits['max_' + name])
+
+    def _setter_func(self):
+        """写参数线程函数：只写最新的目标值"""
+        while True:
+            with self._cond:
+                self._cond.wait_for(lambda: self._pending is not None or not self._running)
+                if not self._running:
+                    break
+                exposure, gain = self._pending
+
+            cam = self.camera.cam
+            ret = cam.MV_CC_SetFloatValue("ExposureTime", float(exposure))
+            ret_gain = cam.MV_CC_SetFloatValue("Gain", float(gain))
+
+            # 写入可能失败（超过帧率限制的最大曝光等）或被相机按步长取整，读回实际值，
+            # 否则 Chunk 中的实际曝光永远和目标值对不上，之后的帧会一直被跳过
+            actual_exposure = self._read_float_node("ExposureTime")
+            actual_gain = self._read_float_node("Gain")
+            with self._cond:
+                if ret != 0 or ret_gain != 0:
+                    self._stats['set_errors'] += 1
+                else:
+                    self._stats['updates'] += 1
+                if self._pending == (exposure, gain):
+                    self._pending = None
+                    applied_exposure, applied_gain = self._applied
+                    if actual_exposure is not None:
+                        applied_exposure = actual_exposure[0]
+                    elif ret == 0:
+                        applied_exposure = exposure
+                    if actual_gain is not None:
+                        applied_gain = actual_gain[0]
+                    elif ret_gain == 0:
+                        applied_gain = gain
+                    self._applied = (applied_exposure, applied_gain)
+                    self.exposure, self.gain = applied_exposure, applied_gain
+                    if ret != 0:
+                        self._shrink_limits('exposure', exposure, applied_exposure, actual_exposure)
+                    if ret_gain != 0:
+                        self._shrink_limits('gain', gain, applied_gain, actual_gain)
+                self._frames_since_update = 0
+
+    def start(self):
+        """
+        开始自动曝光
 
         返回:
-            bool: 是否设置成功
+            bool: 是否成功开始（读取曝光 / 增益节点失败时返回 False）
         """
-        if not self.is_opened:
+        if self._running:
+            return True
+        cam = self.camera.cam
+        exposure = self._read_float_node("ExposureTime")
+        gain = self._read_float_node("Gain")
+        if exposure is None or gain is None:
+            print("读取曝光时间 / 增益节点失败，无法开启软件自动曝光")
             return False
 
-        try:
-            if propId == 5:  # FPS
-                ret = self.cam.MV_CC_SetFloatValue("AcquisitionFrameRate", float(value))
-                return ret == 0
-            elif propId == 15:  # Exposure
-                ret = self.cam.MV_CC_SetEnumValue("ExposureAuto", 0)  # 关闭自动曝光
-                time.sleep(0.1)
-                ret = self.cam.MV_CC_SetFloatValue("ExposureTime", float(value))
-                return ret == 0
-            elif propId == 17:  # Gain
-                ret = self.cam.MV_CC_SetFloatValue("Gain", float(value))
-                return ret == 0
-        except Exception as e:
-            print(f"设置属性失败: {e}")
+        # 关闭相机自身的自动曝光和自动增益
+        cam.MV_CC_SetEnumValue("ExposureAuto", 0)
+        cam.MV_CC_SetEnumValue("GainAuto", 0)
+
+        limits = self._limits = dict(self._user_limits)
+        limits['min_exposure'] = max(limits['min_exposure'] or exposure[1], exposure[1], 1.0)
+        limits['max_exposure'] = min(limits['max_exposure'] or exposure[2], exposure[2])
+        limits['min_gain'] = max(gain[1] if limits['min_gain'] is None else limits['min_gain'], gain[1])
+        limits['max_gain'] = min(gain[2] if limits['max_gain'] is None else limits['max_gain'], gain[2])
+        self._applied = (exposure[0], gain[0])
+        self.exposure = min(max(exposure[0], limits['min_exposure']), limits['max_exposure'])
+        self.gain = min(max(gain[0], limits['min_gain']), limits['max_gain'])
+        self.converged = False
+        # 当前值超出限制范围时先写入限制后的值
+        self._pending = None if (self.exposure, self.gain) == self._applied else (self.exposure, self.gain)
+        self._frames_since_update = 0
+
+        self._running = True
+        self._thread = threading.Thread(target=self._setter_func)
+        self._thread.daemon = True
+        self._thread.start()
+        self.camera.add_raw_listener(self._on_raw)
+        return True
 
-        return False
+    def stop(self):
+        """停止自动曝光（保持当前曝光和增益）"""
+        if not self._running:
+            return
+        self.camera.remove_raw_listener(self._on_raw)
+        with self._cond:
+            self._running = False
+            self._cond.notify_all()
+        if self._thread is not None:
+            self._thread.join(timeout=2.0)
+            self._thread = None
+
+    def get_stats(self):
+        """
+        获取控制统计
 
-    def __del__(self):
-        """析构函数：确保资源被释放"""
-        if self.is_opened:
-            self.release()
+        返回:
+            dict: frames / updates / skipped / set_errors / brightness / exposure / gain / converged /
+                  avg_process_ms / max_process_ms（每帧测光和计算耗时）
+        """
+        stats = dict(self._stats)
+        measured = stats['frames'] - stats['skipped']
+        stats['avg_process_ms'] = stats['process_time'] / stats['frames'] * 1000 if stats['frames'] else 0.0
+        stats['max_process_ms'] = stats.pop('process_time_max') * 1000
+        del stats['process_time']
+        stats.update(measured=measured, brightness=self.brightness, exposure=self.exposure, gain=self.gain,
+                     converged=self.converged)
+        return stats
 
 
 # ================================
-# OpenCV 完整常量定义（参考 cv2.__init__.pyi）
+# 帧变化检测
 # ================================
 
-# VideoCaptureProperties - 基础属性
-CAP_PROP_POS_MSEC = 0
-CAP_PROP_POS_FRAMES = 1
-CAP_PROP_POS_AVI_RATIO = 2
-CAP_PROP_FRAME_WIDTH = 3
-CAP_PROP_FRAME_HEIGHT = 4
-CAP_PROP_FPS = 5
-CAP_PROP_FOURCC = 6
-CAP_PROP_FRAME_COUNT = 7
-CAP_PROP_FORMAT = 8
-CAP_PROP_MODE = 9
-CAP_PROP_BRIGHTNESS = 10
-CAP_PROP_CONTRAST = 11
-CAP_PROP_SATURATION = 12
-CAP_PROP_HUE = 13
-CAP_PROP_GAIN = 14
-CAP_PROP_EXPOSURE = 15
-CAP_PROP_CONVERT_RGB = 16
-CAP_PROP_WHITE_BALANCE_BLUE_U = 17
-CAP_PROP_RECTIFICATION = 18
-CAP_PROP_MONOCHROME = 19
-CAP_PROP_SHARPNESS = 20
-CAP_PROP_AUTO_EXPOSURE = 21
-CAP_PROP_GAMMA = 22
-CAP_PROP_TEMPERATURE = 23
-CAP_PROP_TRIGGER = 24
-CAP_PROP_TRIGGER_DELAY = 25
-CAP_PROP_WHITE_BALANCE_RED_V = 26
-CAP_PROP_ZOOM = 27
-CAP_PROP_FOCUS = 28
-CAP_PROP_GUID = 29
-CAP_PROP_ISO_SPEED = 30
-CAP_PROP_BACKLIGHT = 32
-CAP_PROP_PAN = 33
-CAP_PROP_TILT = 34
-CAP_PROP_ROLL = 35
-CAP_PROP_IRIS = 36
-CAP_PROP_SETTINGS = 37
-CAP_PROP_BUFFERSIZE = 38
-CAP_PROP_AUTOFOCUS = 39
-CAP_PROP_SAR_NUM = 40
-CAP_PROP_SAR_DEN = 41
-CAP_PROP_BACKEND = 42
-CAP_PROP_CHANNEL = 43
-CAP_PROP_AUTO_WB = 44
-CAP_PROP_WB_TEMPERATURE = 45
+class FrameChangeGate:
+    """
+    帧变化检测（传送带空载等场景跳过几乎不变的帧）
 
-# VideoCaptureAPIs
-CAP_ANY = 0
-CAP_HIKVISION = 9900  # 自定义后端
+    在取图线程中、像素格式转换之前，对原始数据稀疏抽样（与软件自动曝光相同的抽样方式，不解包、不复制），
+    按 grid 划分网格求每格平均亮度作为帧签名，与上一个通过的帧比较，
+    最大格差值小于 threshold 的帧视为没有变化。每帧耗时远小于 1 ms。
 
+    与上一个通过的帧（而不是上一帧）比较，缓慢移动的物体也会在累计变化超过阈值时通过。
+    每帧的帧信息中都会写入 changed 和 change_score（最大格差值，0-255）。
 
-class VideoCapture:
+    GATE_DROP 模式下丢弃的帧仍会交给其它原始数据监听器（原始数据录制等不受影响），
+    但 read() 只会在有变化的帧到来时返回。
+
+    通常通过 HikCamera.enable_change_gate() 使用。
     """
-    OpenCV 完全兼容的 VideoCapture 类
 
-    完全实现 cv2.VideoCapture 的所有方法和接口，可以直接替代使用。
+    def __init__(self, camera, threshold=4.0, grid=(16, 12), mode=GATE_DROP, normalize_brightness=True,
+                 max_skip=0, samples=16384):
+        """
+        参数:
+            camera: HikCamera, 已打开的相机
+            threshold: float, 变化阈值（任一格平均亮度差，0-255）
+            grid: tuple, 网格列数和行数 (cols, rows)
+            mode: str, GATE_MARK / GATE_DROP
+            normalize_brightness: bool, 比较前减去整帧平均亮度，忽略曝光调整、灯光闪烁等整体亮度变化
+            max_skip: int, 连续跳过这么多帧后强制通过一帧（0 表示不强制）
+            samples: int, 抽样点数
+        """
+        if mode not in (GATE_MARK, GATE_DROP):
+            raise ValueError(f"不支持的处理方式: {mode}")
+        cols, rows = grid
+        if cols <= 0 or rows <= 0:
+            raise ValueError(f"网格大小无效: {grid}")
+        self.camera = camera
+        self.threshold = float(threshold)
+        self.grid = (int(cols), int(rows))
+        self.mode = mode
+        self.normalize_brightness = normalize_brightness
+        self.max_skip = int(max_skip)
+        self.samples = int(samples)
+
+        self._reference = None
+        self._skip_run = 0
+        self._running = False
+        self._stats = {'frames': 0, 'hits': 0, 'skips': 0, 'forced': 0, 'unsupported': 0,
+                       'process_time': 0.0, 'process_time_max': 0.0}
+        self.last_score = None
+
+    def _signature(self, raw, info):
+        """内部方法：计算帧签名（每格平均亮度，float32 行 x 列），不支持的像素格式返回 None"""
+        values = _sample_luma(raw, info, self.samples)
+        if values is None:
+            return None
+        cols = min(self.grid[0], values.shape[1])
+        rows = min(self.grid[1], values.shape[0])
+        tile_h, tile_w = values.shape[0] // rows, values.shape[1] // cols
+        tiles = values[:rows * tile_h, :cols * tile_w].reshape(rows, tile_h, cols, tile_w, -1)
+        signature = tiles.mean(axis=(1, 3, 4), dtype=np.float32)
+        if self.normalize_brightness:
+            signature -= signature.mean()
+        return signature
+
+    def _on_raw(self, raw, info):
+        """取图线程回调：计算签名并判断是否有变化，GATE_DROP 模式下返回 True 丢弃该帧"""
+        t0 = time.perf_counter()
+        stats = self._stats
+        stats['frames'] += 1
+        try:
+            signature = self._signature(raw, info)
+            if signature is None:
+                # 不支持的像素格式（压缩格式等）一律放行
+                stats['unsupported'] += 1
+                info['changed'] = True
+                info['change_score'] = None
+                return False
+
+            reference = self._reference
+            if reference is None or reference.shape != signature.shape:
+                score = float('inf')
+            else:
+                score = float(np.abs(signature - reference).max())
+            self.last_score = score
+
+            changed = score >= self.threshold
+            if not changed and self.max_skip > 0 and self._skip_run >= self.max_skip:
+                stats['forced'] += 1
+                changed = True
+
+            info['changed'] = changed
+            info['change_score'] = score
+            if changed:
+                self._reference = signature
+                self._skip_run = 0
+                stats['hits'] += 1
+                return False
+
+            self._skip_run += 1
+            stats['skips'] += 1
+            return self.mode == GATE_DROP
+        finally:
+            elapsed = time.perf_counter() - t0
+            stats['process_time'] += elapsed
+            stats['process_time_max'] = max(stats['process_time_max'], elapsed)
+
+    def reset(self):
+        """清除参考帧，下一帧一定通过"""
+        self._reference = None
+        self._skip_run = 0
+
+    def start(self):
+        """开始检测"""
+        if self._running:
+            return
+        self.reset()
+        self._running = True
+        self.camera.add_raw_listener(self._on_raw)
 
-    初始化方式（与 OpenCV 完全相同）：
-        VideoCapture()                    # 空初始化
-        VideoCapture(0)                   # 相机索引
-        VideoCapture(0, CAP_HIKVISION)   # 相机索引 + API
+    def stop(self):
+        """停止检测"""
+        if not self._running:
+            return
+        self.camera.remove_raw_listener(self._on_raw)
+        self._running = False
 
-    使用示例：
-        # 就像使用 cv2.VideoCapture 一样
-        cap = VideoCapture(0)
+    def get_stats(self):
+        """
+        获取检测统计
 
-        if not cap.isOpened():
-            print("无法打开相机")
-            exit()
+        返回:
+            dict: frames / hits（有变化通过）/ skips（无变化跳过或标记）/ forced（max_skip 强制通过）/
+                  unsupported / skip_ratio / last_score / avg_process_ms / max_process_ms
+        """
+        stats = dict(self._stats)
+        stats['avg_process_ms'] = stats['process_time'] / stats['frames'] * 1000 if stats['frames'] else 0.0
+        stats['max_process_ms'] = stats.pop('process_time_max') * 1000
+        del stats['process_time']
+        stats['skip_ratio'] = stats['skips'] / stats['frames'] if stats['frames'] else 0.0
+        stats['last_score'] = self.last_score
+        return stats
 
-        while True:
-            ret, frame = cap.read()
-            if ret:
-                cv2.imshow('Camera', frame)
-            if cv2.waitKey(1) & 0xFF == ord('q'):
-                break
+    def reset_stats(self):
+        """清零统计"""
+        self._stats = {'frames': 0, 'hits': 0, 'skips': 0, 'forced': 0, 'unsupported': 0,
+                       'process_time': 0.0, 'process_time_max': 0.0}
+
+
+# ================================
+# asyncio 接口
+# ================================
+
+class AsyncVideoCapture:
+    """
+    asyncio 版 VideoCapture
+
+    帧由 HikCamera 已有的取图线程通过 loop.call_soon_threadsafe 直接投递到事件循环中的队列，
+    读取时不占用额外的线程池线程，单个事件循环即可消费多路相机的全部帧。
+    打开、关闭和设置参数等低频阻塞操作在默认线程池中执行。
 
-        cap.release()
-        cv2.destroyAllWindows()
+    使用示例:
+        async def main():
+            async with AsyncVideoCapture() as cap:
+                await cap.open("serial:DA0001")
+                await cap.set(CAP_PROP_EXPOSURE, 8000)
 
-    支持的方法（完全兼容 OpenCV）：
-        - open(index, apiPreference=CAP_ANY) -> bool
-        - isOpened() -> bool
-        - release() -> None
-        - grab() -> bool
-        - retrieve(image=None, flag=0) -> Tuple[bool, np.ndarray]
-        - read(image=None) -> Tuple[bool, np.ndarray]
-        - set(propId, value) -> bool
-        - get(propId) -> float
-        - getBackendName() -> str
-        - setExceptionMode(enable) -> None
-        - getExceptionMode() -> bool
+                ret, frame = await cap.read()
+
+                async for frame in cap.frames(max_frames=100):
+                    process(frame)
+
+        asyncio.run(main())
+
+    注意：返回的图像数组与其他消费者共享，需要原地修改时请先 copy()。
     """
 
-    def __init__(self, index=None, apiPreference=CAP_ANY):
-        """
-        初始化 VideoCapture 对象
+    # release() 放入队列的结束标记，唤醒正在等待的 read()
+    _CLOSED = object()
 
+    def __init__(self, queue_size=1):
+        """
         参数:
-            index: int, 相机索引（0, 1, 2...）或 None
-            apiPreference: int, API偏好（CAP_ANY, CAP_HIKVISION等）
+            queue_size: int, 事件循环侧缓存的最大帧数，满时丢弃最旧的帧（1 表示只保留最新帧）
         """
+        self._cap = VideoCapture()
+        self._loop = None
+        self._queue = None
+        self._queue_size = queue_size
         self._camera = None
-        self._exception_mode = False
-        self._grabbed_frame = None
-
-        # 如果提供了 index，自动打开
-        if index is not None:
-            self.open(index, apiPreference)
+        self.frames_received = 0
+        self.frames_dropped = 0
+
+    def _listener(self, image, info):
+        """取图线程回调：把帧投递到事件循环"""
+        loop = self._loop
+        if loop is not None and not loop.is_closed():
+            loop.call_soon_threadsafe(self._on_frame, image, info)
+
+    def _on_frame(self, image, info):
+        """事件循环回调：入队，满时丢弃最旧的帧"""
+        if self._queue is None:
+            return
+        if self._queue.full():
+            self._queue.get_nowait()
+            self.frames_dropped += 1
+        self._queue.put_nowait((image, info))
+        self.frames_received += 1
 
-    def open(self, index, apiPreference=CAP_ANY):
+    async def open(self, index, apiPreference=CAP_ANY):
         """
-        打开相机（完全兼容 OpenCV）
+        打开相机
 
         参数:
-            index: int, 相机索引
+            index: int 或 str, 相机索引或设备标识
             apiPreference: int, API偏好
 
         返回:
             bool: 是否成功打开
         """
-        try:
-            self._camera = HikCamera(index)
-            return self._camera.isOpened()
-        except Exception as e:
-            if self._exception_mode:
-                raise
-            print(f"打开相机失败: {e}")
-            return False
+        self._loop = asyncio.get_running_loop()
+        self._queue = asyncio.Queue(maxsize=self._queue_size)
+
+        ret = await self._loop.run_in_executor(None, self._cap.open, index, apiPreference)
+        if ret:
+            self._camera = self._cap._camera
+            self._camera.add_frame_listener(self._listener)
+        return ret
 
     def isOpened(self):
         """
-        检查相机是否已打开（完全兼容 OpenCV）
+        检查相机是否已打开
 
         返回:
             bool: 相机是否已打开
         """
-        return self._camera is not None and self._camera.isOpened()
-
-    def release(self):
-        """
-        释放相机资源（完全兼容 OpenCV）
-        """
-        if self._camera is not None:
-            self._camera.release()
-            self._camera = None
-        self._grabbed_frame = None
+        return self._cap.isOpened()
 
-    def grab(self):
+    async def read(self, timeout=None):
         """
-        抓取下一帧但不解码（完全兼容 OpenCV）
+        读取下一帧（不阻塞事件循环）
 
-        用于多相机同步采集场景。
+        参数:
+            timeout: float, 超时时间（秒），None 表示一直等待
 
         返回:
-            bool: 是否成功抓取
+            tuple: (ret, frame)
         """
-        if not self.isOpened():
-            return False
-
-        ret, frame = self._camera.read()
-        if ret:
-            self._grabbed_frame = frame
-            return True
-        return False
+        ret, frame, _ = await self.read_with_info(timeout)
+        return ret, frame
 
-    def retrieve(self, image=None, flag=0):
+    async def read_with_info(self, timeout=None):
         """
-        解码并返回上次 grab() 的帧（完全兼容 OpenCV）
+        读取下一帧及其元数据
 
         参数:
-            image: 预分配的图像（暂不支持）
-            flag: 标志（暂不支持）
+            timeout: float, 超时时间（秒），None 表示一直等待
 
         返回:
-            Tuple[bool, np.ndarray]: (是否成功, 图像数组)
+            tuple: (ret, frame, info)
         """
-        if self._grabbed_frame is None:
-            return False, None
-        return True, self._grabbed_frame.copy()
-
-    def read(self, image=None):
+        frame_queue = self._queue
+        if frame_queue is None or not self.isOpened():
+            return False, None, None
+        try:
+            item = await asyncio.wait_for(frame_queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return False, None, None
+        if item is self._CLOSED:
+            # 放回结束标记，让其他等待者也能返回
+            frame_queue.put_nowait(item)
+            return False, None, None
+        image, info = item
+        return True, image, info
+
+    async def frames(self, max_frames=None, timeout=None, with_info=False):
         """
-        读取一帧图像（完全兼容 OpenCV）
-
-        等同于 grab() + retrieve()
+        异步帧迭代器
 
         参数:
-            image: 预分配的图像（暂不支持）
+            max_frames: int, 最多输出的帧数，None 表示不限
+            timeout: float, 等待单帧的超时（秒），超时后迭代结束
+            with_info: bool, 为 True 时输出 (frame, info)
 
-        返回:
-            Tuple[bool, np.ndarray]: (是否成功, 图像数组)
+        用法:
+            async for frame in cap.frames():
+                ...
         """
-        if not self.isOpened():
-            return False, None
-
-        return self._camera.read()
-
-    def set(self, propId, value):
+        count = 0
+        while max_frames is None or count < max_frames:
+            ret, image, info = await self.read_with_info(timeout)
+            if not ret:
+                return
+            count += 1
+            yield (image, info) if with_info else image
+
+    async def set(self, propId, value):
         """
-        设置相机属性（完全兼容 OpenCV）
-
-        参数:
-            propId: int, 属性ID（CAP_PROP_*常量）
-            value: float, 属性值
+        设置相机属性（在线程池中执行）
 
         返回:
             bool: 是否设置成功
         """
-        if not self.isOpened():
-            return False
-
-        return self._camera.set(propId, value)
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, self._cap.set, propId, value)
 
-    def get(self, propId):
+    async def get(self, propId):
         """
-        获取相机属性（完全兼容 OpenCV）
-
-        参数:
-            propId: int, 属性ID（CAP_PROP_*常量）
+        获取相机属性（在线程池中执行）
 
         返回:
             float: 属性值
         """
-        if not self.isOpened():
-            return 0.0
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, self._cap.get, propId)
 
-        # 特殊处理 BACKEND 属性
-        if propId == CAP_PROP_BACKEND:
-            return float(CAP_HIKVISION)
+    async def release(self):
+        """释放相机（在线程池中执行），正在等待的 read() 返回 (False, None)"""
+        if self._camera is not None:
+            self._camera.remove_frame_listener(self._listener)
+            self._camera = None
 
-        return self._camera.get(propId)
+        # 清空队列并放入结束标记，唤醒所有等待中的读取
+        frame_queue, self._queue = self._queue, None
+        if frame_queue is not None:
+            while not frame_queue.empty():
+                frame_queue.get_nowait()
+            frame_queue.put_nowait(self._CLOSED)
 
-    def getBackendName(self):
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(None, self._cap.release)
+
+    async def __aenter__(self):
+        """异步上下文管理器支持"""
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        """异步上下文管理器支持"""
+        await self.release()
+        return False
+
+
+# ================================
+# 多相机并行启动
+# ================================
+
+class CameraFleet:
+    """
+    多相机并行启动
+
+    在线程池中并行完成每台相机的 打开 -> 配置 -> 开始采集 -> 等待首帧，
+    单台相机失败或超时不影响其他相机，整体启动耗时约等于最慢的一台相机。
+
+    使用示例:
+        def configure(cam):
+            cam.set(CAP_PROP_EXPOSURE, 8000)
+
+        fleet = CameraFleet(["serial:DA0001", "serial:DA0002", 2], configure=configure)
+        results = fleet.open()
+        for r in results:
+            print(r['source'], r['ok'], r['first_frame_time'])
+
+        cam = fleet.cameras["serial:DA0001"]
+        ret, frame = cam.read()
+
+        fleet.release()
+    """
+
+    def __init__(self, sources, configure=None, max_workers=None, timeout=10.0):
         """
-        获取后端名称（完全兼容 OpenCV）
+        参数:
+            sources: list, 设备标识列表（索引或 "serial:xxx" / "ip:x.x.x.x" / "name:xxx"）
+            configure: callable(cam), 开始采集前对每台相机执行的配置函数，可为 None
+            max_workers: int, 线程池大小，默认与相机数量相同
+            timeout: float, 单台相机从开始打开到收到首帧的超时时间（秒）
+        """
+        self.sources = list(sources)
+        self.configure = configure
+        self.max_workers = max_workers or max(1, len(self.sources))
+        self.timeout = timeout
 
-        返回:
-            str: 后端名称 "HIKVISION"
+        self.cameras = {}
+        self.results = []
+        self._lock = threading.Lock()
+
+    def _bring_up(self, job):
         """
-        return "HIKVISION"
+        工作线程：打开、配置、开始采集并等待首帧
 
-    def setExceptionMode(self, enable):
+        job 为 open() 内部的任务状态，不直接返回给调用者；
+        结果在持有 self._lock 时一次写入，已被 open() 判为超时的任务不会标记成功，相机在这里释放。
         """
-        设置异常模式（完全兼容 OpenCV）
+        start_time = time.perf_counter()
+        job['start_time'] = start_time
+        cam = None
+        ok = False
+        error = None
+        open_time = None
+        first_frame_time = None
+        try:
+            cam = HikCamera(job['source'], auto_start=False)
+            if not cam.isOpened():
+                error = "打开相机失败"
+            else:
+                open_time = time.perf_counter() - start_time
+
+                if self.configure is not None:
+                    self.configure(cam)
+
+                if not cam.start():
+                    error = "开始取流失败"
+                elif not cam.wait_first_frame(max(0.0, self.timeout - (time.perf_counter() - start_time))):
+                    error = "等待首帧超时"
+                else:
+                    first_frame_time = cam.first_frame_time - start_time
+                    ok = True
+        except Exception as e:
+            error = f"启动异常: {e}"
+
+        with self._lock:
+            timed_out = job['timed_out']
+            job.update(camera=cam, ok=ok and not timed_out, error=error, open_time=open_time,
+                       first_frame_time=first_frame_time, finished=True)
+        if timed_out:
+            self._discard(job['source'], cam)
+        return job
+
+    def _discard(self, source, cam):
+        """释放启动失败或超时的相机"""
+        if cam is not None:
+            try:
+                cam.release()
+            except Exception as e:
+                print(f"释放相机 [{source}] 出错: {e}")
+
+    def open(self):
+        """
+        并行启动所有相机
+
+        返回:
+            list: 每台相机一个结果字典（open() 返回后不再变化）
+                {'source', 'ok', 'error', 'camera',
+                 'open_time'(秒), 'first_frame_time'(秒, 从开始打开到收到首帧)}
+        """
+        # 只广播枚举一次，避免每个线程各自枚举
+        HikCamera.registry.refresh()
+
+        jobs = [{'source': src, 'start_time': None, 'timed_out': False, 'finished': False,
+                 'ok': False, 'error': None, 'camera': None, 'open_time': None, 'first_frame_time': None}
+                for src in self.sources]
+
+        t0 = time.perf_counter()
+        executor = ThreadPoolExecutor(max_workers=self.max_workers)
+        futures = {executor.submit(self._bring_up, job): job for job in jobs}
+
+        pending = set(futures)
+        while pending:
+            done, pending = wait(pending, timeout=0.05, return_when=FIRST_COMPLETED)
+            now = time.perf_counter()
+            for future in list(pending):
+                job = futures[future]
+                start_time = job['start_time']
+                if start_time is not None and now - start_time > self.timeout:
+                    # SDK 调用无法中断：标记超时，工作线程完成后自行释放相机
+                    with self._lock:
+                        if not job['finished']:
+                            job['timed_out'] = True
+                    pending.discard(future)
+        executor.shutdown(wait=False)
+
+        results = []
+        for job in jobs:
+            with self._lock:
+                job = dict(job)
+            if job['timed_out']:
+                job.update(ok=False, error="启动超时", camera=None, first_frame_time=None)
+            elif not job['ok']:
+                self._discard(job['source'], job['camera'])
+                job['camera'] = None
+            results.append({key: job[key] for key in
+                            ('source', 'ok', 'error', 'camera', 'open_time', 'first_frame_time')})
+
+        with self._lock:
+            self.results = results
+            self.cameras = {r['source']: r['camera'] for r in results if r['ok']}
+
+        n_ok = len(self.cameras)
+        print(f"并行启动完成: {n_ok}/{len(results)} 台相机就绪, 耗时 {time.perf_counter() - t0:.2f} 秒")
+        for r in results:
+            if r['ok']:
+                print(f"  [{r['source']}] 打开 {r['open_time']:.2f}s, 首帧 {r['first_frame_time']:.2f}s")
+            else:
+                print(f"  [{r['source']}] 失败: {r['error']}")
+
+        return results
+
+    def release(self):
+        """并行释放所有相机"""
+        with self._lock:
+            cameras = list(self.cameras.values())
+            self.cameras = {}
+
+        if cameras:
+            with ThreadPoolExecutor(max_workers=len(cameras)) as executor:
+                list(executor.map(lambda cam: cam.release(), cameras))
+
+    def __enter__(self):
+        """上下文管理器支持"""
+        self.open()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        """上下文管理器支持"""
+        self.release()
+        return False
+
+
+# ================================
+# 多相机同步采集
+# ================================
+
+# 帧组匹配依据
+MATCH_DEV_TIMESTAMP = 'dev_timestamp'    # 设备时间戳（需相机间 PTP 时钟同步），容差单位为设备时钟 tick
+MATCH_HOST_TIMESTAMP = 'host_timestamp'  # 主机时间戳，容差单位为毫秒
+MATCH_TRIGGER_INDEX = 'trigger_index'    # 触发计数（硬件/动作命令同步触发），容差单位为计数
+
+
+class MultiCapture:
+    """
+    多相机同步采集
+
+    订阅多路 HikCamera 的帧，按设备时间戳、主机时间戳或触发计数在容差窗口内
+    匹配为帧组。超时仍不完整的帧组按配置丢弃或标记后输出，并统计帧组的
+    完整率、时间离散度和组装延迟。
+
+    使用示例:
+        mc = MultiCapture(["serial:DA0001", "serial:DA0002"],
+                          match=MATCH_TRIGGER_INDEX, tolerance=0)
+        while True:
+            ret, frame_set = mc.read(timeout=1.0)
+            if ret:
+                left, right = frame_set['frames']
+        print(mc.get_stats())
+        mc.release()
+    """
 
+    def __init__(self, sources, match=MATCH_HOST_TIMESTAMP, tolerance=5, set_timeout=0.2,
+                 drop_incomplete=True, max_pending=16, max_sets=8):
+        """
         参数:
-            enable: bool, True=抛出异常，False=返回错误码
+            sources: list, 设备标识（索引 / "serial:xxx" 等）或已打开的 HikCamera 对象
+            match: str, 匹配依据，MATCH_DEV_TIMESTAMP / MATCH_HOST_TIMESTAMP / MATCH_TRIGGER_INDEX
+            tolerance: 同一帧组内各相机匹配值的最大偏差（单位见 match 说明）
+            set_timeout: float, 帧组等待缺失相机的最长时间（秒），超时视为不完整
+            drop_incomplete: bool, True 丢弃不完整帧组；False 输出并在 'complete' 中标记
+            max_pending: int, 每路相机等待匹配的最大帧数
+            max_sets: int, 已组装待读取帧组的最大数量，超出时丢弃最旧的帧组
         """
-        self._exception_mode = enable
+        if match not in (MATCH_DEV_TIMESTAMP, MATCH_HOST_TIMESTAMP, MATCH_TRIGGER_INDEX):
+            raise ValueError(f"无效的匹配依据: {match!r}")
+
+        self.match = match
+        self.tolerance = tolerance
+        self.set_timeout = set_timeout
+        self.drop_incomplete = drop_incomplete
+        self.max_pending = max_pending
+
+        self.cameras = []
+        self._owned = []
+        for src in sources:
+            if isinstance(src, HikCamera):
+                self.cameras.append(src)
+            else:
+                cam = HikCamera(src)
+                self.cameras.append(cam)
+                self._owned.append(cam)
+
+        self._cond = threading.Condition()
+        self._pending = [collections.deque() for _ in self.cameras]
+        self._sets = collections.deque(maxlen=max_sets)
+        self._reset_stats()
+
+        self._listeners = []
+        for i, cam in enumerate(self.cameras):
+            listener = self._make_listener(i)
+            self._listeners.append(listener)
+            cam.add_frame_listener(listener)
+
+    def _reset_stats(self):
+        """内部方法：清空统计"""
+        self._stats = {
+            'sets_complete': 0,
+            'sets_incomplete': 0,
+            'sets_dropped': 0,
+            'sets_overwritten': 0,
+            'frames_unmatched': 0,
+            'latency_sum': 0.0,
+            'latency_max': 0.0,
+            'spread_sum': 0,
+            'spread_max': 0,
+        }
+
+    def _make_listener(self, cam_idx):
+        """内部方法：生成第 cam_idx 路相机的帧监听器"""
+        def listener(image, info):
+            with self._cond:
+                pending = self._pending[cam_idx]
+                pending.append((info[self.match], image, info))
+                if len(pending) > self.max_pending:
+                    pending.popleft()
+                    self._stats['frames_unmatched'] += 1
+                self._assemble(time.perf_counter())
+        return listener
+
+    def _assemble(self, now):
+        """内部方法：尝试组装帧组（调用者持有 self._cond）"""
+        while all(self._pending[i] for i in range(len(self._pending))) or \
+                any(q and now - q[0][2]['recv_time'] > self.set_timeout for q in self._pending):
+            heads = [q[0][0] for q in self._pending if q]
+            if not heads:
+                break
+            ref = min(heads)
+
+            entries = [q[0] if q and q[0][0] <= ref + self.tolerance else None for q in self._pending]
+
+            complete = all(e is not None for e in entries)
+            if not complete:
+                # 同一相机的帧按顺序到达：缺失相机的队首已经超出窗口，说明这一帧已丢失，立即输出；
+                # 只有缺失相机还没有任何待匹配帧时才等待到 set_timeout
+                waiting = any(not q for q, e in zip(self._pending, entries) if e is None)
+                oldest = min(e[2]['recv_time'] for e in entries if e is not None)
+                if waiting and now - oldest <= self.set_timeout:
+                    break
+
+            for q, e in zip(self._pending, entries):
+                if e is not None:
+                    q.popleft()
+            self._emit(entries, complete, now)
+
+    def _emit(self, entries, complete, now):
+        """内部方法：输出一个帧组并更新统计（调用者持有 self._cond）"""
+        present = [e for e in entries if e is not None]
+        keys = [e[0] for e in present]
+        spread = max(keys) - min(keys)
+        latency = now - min(e[2]['recv_time'] for e in present)
+
+        if complete:
+            self._stats['sets_complete'] += 1
+        else:
+            self._stats['sets_incomplete'] += 1
+            if self.drop_incomplete:
+                self._stats['sets_dropped'] += 1
+                self._stats['frames_unmatched'] += len(present)
+                return
+
+        self._stats['latency_sum'] += latency
+        self._stats['latency_max'] = max(self._stats['latency_max'], latency)
+        self._stats['spread_sum'] += spread
+        self._stats['spread_max'] = max(self._stats['spread_max'], spread)
+
+        if len(self._sets) == self._sets.maxlen:
+            self._stats['sets_overwritten'] += 1
+        self._sets.append({
+            'frames': [e[1] if e is not None else None for e in entries],
+            'infos': [e[2] if e is not None else None for e in entries],
+            'complete': complete,
+            'missing': [i for i, e in enumerate(entries) if e is None],
+            'key': min(keys),
+            'spread': spread,
+            'latency': latency,
+        })
+        self._cond.notify_all()
+
+    def read(self, timeout=1.0):
+        """
+        读取下一个帧组
 
-    def getExceptionMode(self):
+        参数:
+            timeout: float, 最长等待时间（秒）
+
+        返回:
+            tuple: (ret, frame_set)
+                ret: bool, 是否读取成功
+                frame_set: dict
+                    'frames': list, 按相机顺序的图像（不完整帧组中缺失的相机为 None）
+                    'infos': list, 对应的帧元数据
+                    'complete': bool, 是否所有相机都有帧
+                    'missing': list, 缺失帧的相机序号
+                    'key': 帧组匹配值
+                    'spread': 帧组内匹配值的最大偏差
+                    'latency': float, 从最早一帧到达到帧组组装完成的时间（秒）
         """
-        获取异常模式状态（完全兼容 OpenCV）
+        deadline = time.perf_counter() + timeout
+        with self._cond:
+            while not self._sets:
+                now = time.perf_counter()
+                self._assemble(now)
+                if self._sets:
+                    break
+                remaining = deadline - now
+                if remaining <= 0:
+                    return False, None
+                # 按帧组超时时间分段等待，以便及时输出超时的不完整帧组
+                self._cond.wait(min(remaining, self.set_timeout / 2 or remaining))
+            return True, self._sets.popleft()
+
+    def get_stats(self):
+        """
+        获取帧组统计
 
         返回:
-            bool: 当前异常模式
+            dict: sets_complete / sets_incomplete / sets_dropped / sets_overwritten /
+                  frames_unmatched / completeness(完整率) / latency_avg / latency_max(秒) /
+                  spread_avg / spread_max
         """
-        return self._exception_mode
+        with self._cond:
+            stats = dict(self._stats)
+        emitted = stats['sets_complete'] + stats['sets_incomplete'] - stats['sets_dropped']
+        total = stats['sets_complete'] + stats['sets_incomplete']
+        stats['completeness'] = stats['sets_complete'] / total if total else 0.0
+        stats['latency_avg'] = stats.pop('latency_sum') / emitted if emitted else 0.0
+        stats['spread_avg'] = stats.pop('spread_sum') / emitted if emitted else 0.0
+        return stats
+
+    def reset_stats(self):
+        """清空帧组统计"""
+        with self._cond:
+            self._reset_stats()
+
+    def release(self):
+        """注销监听器，并释放由 MultiCapture 打开的相机"""
+        for cam, listener in zip(self.cameras, self._listeners):
+            cam.remove_frame_listener(listener)
+        self._listeners = []
+        for cam in self._owned:
+            cam.release()
+        self._owned = []
+        with self._cond:
+            for q in self._pending:
+                q.clear()
+            self._sets.clear()
 
     def __enter__(self):
         """上下文管理器支持"""
@@ -767,25 +6070,358 @@ class VideoCapture:
         self.release()
         return False
 
-    def __del__(self):
-        """析构函数"""
-        self.release()
 
-    def __repr__(self):
-        """字符串表示"""
-        if self.isOpened():
-            width = int(self.get(CAP_PROP_FRAME_WIDTH))
-            height = int(self.get(CAP_PROP_FRAME_HEIGHT))
-            return f"<VideoCapture HIKVISION [{width}x{height}]>"
-        return "<VideoCapture (closed)>"
+# ================================
+# GigE 动作命令同步触发
+# ================================
+
+# 动作命令返回状态说明（MV_ACTION_CMD_RESULT.nStatus）
+ACTION_CMD_STATUS = {
+    0x0000: "成功",
+    0x8001: "设备不支持该命令",
+    0x8013: "设备未与主时钟同步，无法使用定时动作",
+    0x8015: "设备队列或数据包溢出",
+    0x8016: "定时动作的执行时间已过",
+}
+
+
+def _ip_to_int(str_ip):
+    """将点分十进制 IP 字符串转换为 32 位整数"""
+    parts = [int(p) for p in str_ip.split('.')]
+    return (parts[0] << 24) | (parts[1] << 16) | (parts[2] << 8) | parts[3]
+
+
+class ActionCommandScheduler:
+    """
+    GigE Vision 动作命令同步触发
+
+    为一组 GigE 相机配置相同的 ActionDeviceKey / ActionGroupKey / ActionGroupMask，
+    并将触发源设为动作命令。之后通过一次广播（可选指定设备时间执行）同时触发所有相机，
+    消除逐台发送 TriggerSoftware 带来的毫秒级曝光偏差，并把各相机的响应帧收集为一组。
+
+    使用示例:
+        cams = [HikCamera("serial:DA0001"), HikCamera("serial:DA0002")]
+        scheduler = ActionCommandScheduler(cams, device_key=0x1, group_key=0x1, group_mask=0x1)
+        scheduler.configure()
+
+        ret, frame_set = scheduler.fire(timeout=1.0)
+        if ret:
+            for frame in frame_set['frames']:
+                ...
+        scheduler.release()
+    """
+
+    def __init__(self, cameras, device_key=1, group_key=1, group_mask=0xFFFFFFFF,
+                 broadcast_address="255.255.255.255", ack_timeout=100, net_ip=None,
+                 action_selector=0, trigger_source="Action1"):
+        """
+        参数:
+            cameras: list, 已打开的 HikCamera 对象
+            device_key: int, 动作设备密钥（ActionDeviceKey）
+            group_key: int, 动作组键（ActionGroupKey）
+            group_mask: int, 动作组掩码（ActionGroupMask）
+            broadcast_address: str, 动作命令广播地址
+            ack_timeout: int, 等待相机应答的超时（毫秒），0 表示不需要应答
+            net_ip: str, 指定发送动作命令的网卡 IP，None 表示所有网卡
+            action_selector: int, 相机上配置的动作序号（ActionSelector）
+            trigger_source: str, 对应的触发源枚举名称
+        """
+        self.cameras = list(cameras)
+        self.device_key = device_key
+        self.group_key = group_key
+        self.group_mask = group_mask
+        self.broadcast_address = broadcast_address
+        self.ack_timeout = ack_timeout
+        self.net_ip = net_ip
+        self.action_selector = action_selector
+        self.trigger_source = trigger_source
+
+        self._results_buf = (MV_ACTION_CMD_RESULT * MV_MAX_DEVICE_NUM)()
+
+        # 按动作批次收集各相机的响应帧
+        self._cond = threading.Condition()
+        self._slot = None
+        self._issue_time = None
+        self._action_time = None  # 定时动作的设备执行时刻（tick），None 表示立即执行或尚未发出
+        self._scheduled = False
+        # 每台相机最后收到的触发计数、此后已发出但没有收到响应帧的动作次数、本批次预期的触发计数
+        self._last_index = [None] * len(self.cameras)
+        self._pending_actions = [0] * len(self.cameras)
+        self._expected = [None] * len(self.cameras)
+        self._seen = [[] for _ in self.cameras]
+        self._tick_frequency = None
+        self._stats = {'fired': 0, 'complete': 0, 'incomplete': 0, 'skew_max': 0.0, 'skew_sum': 0.0,
+                       'skew_count': 0}
+
+        self._listeners = []
+        for i, cam in enumerate(self.cameras):
+            listener = self._make_listener(i)
+            self._listeners.append(listener)
+            cam.add_frame_listener(listener)
+
+    def _make_listener(self, cam_idx):
+        """
+        内部方法：把本次动作命令对应的帧放入当前批次
+
+        已知该相机的触发计数时只接受 nTriggerIndex 等于预期计数的帧（之前动作迟到的帧被丢弃）；
+        首次触发或相机不输出触发计数时，定时动作按设备时间戳不早于执行时刻判断，
+        立即执行的动作接受发出命令后到达的第一帧。
+        """
+        def listener(image, info):
+            with self._cond:
+                if self._slot is None or self._slot[cam_idx] is not None:
+                    return
+                if info['recv_time'] < self._issue_time:
+                    return
+                expected = self._expected[cam_idx]
+                index = info['trigger_index']
+                # 上次和这次都是 0 说明相机没有输出触发计数
+                if expected is not None and (self._last_index[cam_idx] or index):
+                    if index != expected:
+                        self._seen[cam_idx].append(index)
+                        return
+                elif self._scheduled:
+                    if self._action_time is None or info['dev_timestamp'] < self._action_time:
+                        return
+                self._slot[cam_idx] = (image, info)
+                self._cond.notify_all()
+        return listener
+
+    def _get_tick_frequency(self):
+        """内部方法：读取并缓存设备时钟频率（Hz），读取失败返回 None"""
+        if self._tick_frequency is None:
+            stFrequency = MVCC_INTVALUE_EX()
+            if self.cameras[0].cam.MV_CC_GetIntValueEx("GevTimestampTickFrequency", stFrequency) == 0 \
+                    and stFrequency.nCurValue > 0:
+                self._tick_frequency = stFrequency.nCurValue
+        return self._tick_frequency
+
+    def configure(self):
+        """
+        配置所有相机的动作命令参数和触发模式
+
+        返回:
+            list: 每台相机是否配置成功
+        """
+        results = []
+        for cam in self.cameras:
+            if not cam.isOpened():
+                results.append(False)
+                continue
+            ok = True
+            steps = [
+                (cam.cam.MV_CC_SetIntValue, "ActionSelector", self.action_selector),
+                (cam.cam.MV_CC_SetIntValue, "ActionDeviceKey", self.device_key),
+                (cam.cam.MV_CC_SetIntValue, "ActionGroupKey", self.group_key),
+                (cam.cam.MV_CC_SetIntValue, "ActionGroupMask", self.group_mask),
+                (cam.cam.MV_CC_SetEnumValue, "TriggerMode", MV_TRIGGER_MODE_ON),
+                (cam.cam.MV_CC_SetEnumValueByString, "TriggerSource", self.trigger_source),
+            ]
+            for setter, key, value in steps:
+                ret = setter(key, value)
+                if ret != 0:
+                    print(f"相机 [{cam.index}] 设置 {key} 失败! ret[0x{ret:x}]")
+                    ok = False
+                    break
+            if ok:
+                # 丢弃切换触发模式前已缓存的连续采集帧
+                cam.cam.MV_CC_ClearImageBuffer()
+            results.append(ok)
+        return results
+
+    def get_device_time(self, cam_idx=0):
+        """
+        锁存并读取相机的设备时间戳
+
+        参数:
+            cam_idx: int, 用作时间基准的相机序号（各相机需通过 PTP 同步时钟）
+
+        返回:
+            tuple: (timestamp, tick_frequency)，失败返回 (None, None)
+        """
+        cam = self.cameras[cam_idx].cam
+        ret = cam.MV_CC_SetCommandValue("GevTimestampControlLatch")
+        if ret != 0:
+            print(f"锁存设备时间戳失败! ret[0x{ret:x}]")
+            return None, None
+
+        stTimestamp = MVCC_INTVALUE_EX()
+        stFrequency = MVCC_INTVALUE_EX()
+        ret = cam.MV_CC_GetIntValueEx("GevTimestampValue", stTimestamp)
+        if ret == 0:
+            ret = cam.MV_CC_GetIntValueEx("GevTimestampTickFrequency", stFrequency)
+        if ret != 0:
+            print(f"读取设备时间戳失败! ret[0x{ret:x}]")
+            return None, None
+        return stTimestamp.nCurValue, stFrequency.nCurValue
+
+    def issue(self, delay=None):
+        """
+        广播一次动作命令
+
+        参数:
+            delay: float, 延迟执行时间（秒）。指定时以相机设备时钟计算执行时刻（需 PTP 同步），
+                   None 表示相机收到命令后立即执行
+
+        返回:
+            list: 相机应答列表，每个元素为 {'address', 'status', 'ok', 'message'}；
+                  发送失败返回 None
+        """
+        stActionCmdInfo = MV_ACTION_CMD_INFO()
+        memset(byref(stActionCmdInfo), 0, sizeof(stActionCmdInfo))
+        stActionCmdInfo.nDeviceKey = self.device_key
+        stActionCmdInfo.nGroupKey = self.group_key
+        stActionCmdInfo.nGroupMask = self.group_mask
+        stActionCmdInfo.pBroadcastAddress = self.broadcast_address.encode('ascii')
+        stActionCmdInfo.nTimeOut = self.ack_timeout
+        if self.net_ip is not None:
+            stActionCmdInfo.bSpecialNetEnable = 1
+            stActionCmdInfo.nSpecialNetIP = _ip_to_int(self.net_ip)
+
+        if delay is not None:
+            timestamp, frequency = self.get_device_time()
+            if timestamp is None:
+                return None
+            self._tick_frequency = frequency
+            stActionCmdInfo.bActionTimeEnable = 1
+            stActionCmdInfo.nActionTime = timestamp + int(delay * frequency)
+            with self._cond:
+                self._action_time = stActionCmdInfo.nActionTime
+
+        stActionCmdResults = MV_ACTION_CMD_RESULT_LIST()
+        stActionCmdResults.nNumResults = 0
+        stActionCmdResults.pResults = cast(self._results_buf, POINTER(MV_ACTION_CMD_RESULT))
+
+        ret = MvCamera.MV_GIGE_IssueActionCommand(stActionCmdInfo, stActionCmdResults)
+        if ret != 0:
+            print(f"发送动作命令失败! ret[0x{ret:x}]")
+            return None
+
+        results = []
+        for i in range(stActionCmdResults.nNumResults):
+            result = stActionCmdResults.pResults[i]
+            status = result.nStatus & 0xffff
+            results.append({
+                'address': _decode_c_string(result.strDeviceAddress),
+                'status': status,
+                'ok': status == 0,
+                'message': ACTION_CMD_STATUS.get(status, f"未知状态 0x{status:x}"),
+            })
+        return results
+
+    def fire(self, timeout=1.0, delay=None):
+        """
+        发送动作命令并收集每台相机的响应帧
+
+        参数:
+            timeout: float, 等待响应帧的超时时间（秒，不含 delay）
+            delay: float, 同 issue()
+
+        返回:
+            tuple: (ret, frame_set)
+                ret: bool, 所有相机是否都返回了帧
+                frame_set: dict
+                    'frames' / 'infos': 按相机顺序的图像和元数据（未响应的相机为 None）
+                    'missing': list, 未响应的相机序号
+                    'acks': list, issue() 返回的应答列表
+                    'skew': float, 各相机帧设备时间戳（曝光时刻）的最大差值（秒，需 PTP 同步），
+                            相机没有输出设备时间戳或读不到时钟频率时为 None
+                    'recv_skew': float, 各相机帧到达主机的最大时间差（秒）
+                    'latency': float, 从发送命令到最后一帧到达的时间（秒）
+        """
+        n = len(self.cameras)
+        with self._cond:
+            self._slot = [None] * n
+            self._issue_time = time.perf_counter()
+            self._action_time = None
+            self._scheduled = delay is not None
+            self._seen = [[] for _ in range(n)]
+            self._expected = [None if last is None else (last + pending + 1) & 0xffffffff
+                              for last, pending in zip(self._last_index, self._pending_actions)]
+
+        acks = self.issue(delay)
+
+        deadline = time.perf_counter() + timeout + (delay or 0.0)
+        with self._cond:
+            if acks is not None:
+                self._cond.wait_for(lambda: all(e is not None for e in self._slot),
+                                    max(0.0, deadline - time.perf_counter()))
+            slot, self._slot = self._slot, None
+            issue_time = self._issue_time
+
+            # 更新每台相机的触发计数；没有发出命令时不计数
+            for i, entry in enumerate(slot):
+                if entry is not None:
+                    self._last_index[i] = entry[1]['trigger_index']
+                    self._pending_actions[i] = 0
+                elif self._seen[i]:
+                    # 收到过其他计数的帧（漏收命令、计数被推进或复位），以最后收到的计数重新同步
+                    self._last_index[i] = self._seen[i][-1]
+                    self._pending_actions[i] = 0
+                elif acks is not None and self._last_index[i] is not None:
+                    self._pending_actions[i] += 1
+
+        present = [e for e in slot if e is not None]
+        recv_times = [e[1]['recv_time'] for e in present]
+        dev_times = [e[1]['dev_timestamp'] for e in present]
+        frequency = self._get_tick_frequency() if present else None
+        skew = None
+        if present and all(dev_times) and frequency:
+            skew = (max(dev_times) - min(dev_times)) / frequency
+        complete = len(present) == len(slot)
+        frame_set = {
+            'frames': [e[0] if e is not None else None for e in slot],
+            'infos': [e[1] if e is not None else None for e in slot],
+            'missing': [i for i, e in enumerate(slot) if e is None],
+            'acks': acks,
+            'skew': skew,
+            'recv_skew': (max(recv_times) - min(recv_times)) if recv_times else 0.0,
+            'latency': (max(recv_times) - issue_time) if recv_times else 0.0,
+        }
+
+        with self._cond:
+            self._stats['fired'] += 1
+            if complete:
+                self._stats['complete'] += 1
+                if skew is not None:
+                    self._stats['skew_count'] += 1
+                    self._stats['skew_sum'] += skew
+                    self._stats['skew_max'] = max(self._stats['skew_max'], skew)
+            else:
+                self._stats['incomplete'] += 1
+
+        return complete, frame_set
+
+    def get_stats(self):
+        """
+        获取触发统计
+
+        返回:
+            dict: fired / complete / incomplete / skew_avg / skew_max(秒，按设备时间戳统计的完整帧组)
+        """
+        with self._cond:
+            stats = dict(self._stats)
+        skew_count, skew_sum = stats.pop('skew_count'), stats.pop('skew_sum')
+        stats['skew_avg'] = skew_sum / skew_count if skew_count else 0.0
+        return stats
+
+    def release(self):
+        """注销帧监听器（不关闭相机）"""
+        for cam, listener in zip(self.cameras, self._listeners):
+            cam.remove_frame_listener(listener)
+        self._listeners = []
 
 
 # 便捷函数：枚举设备
-def enumerate_devices():
+def enumerate_devices(force=True, verbose=True):
     """
     枚举所有海康相机设备
 
+    参数:
+        force: bool, 是否强制重新枚举（False 时缓存未过期则直接返回缓存）
+        verbose: bool, 是否打印设备列表
+
     返回:
         list: 相机信息列表
     """
-    return HikCamera.enumerate_devices()
+    return HikCamera.enumerate_devices(force=force, verbose=verbose)
@@ -0,0 +1,64 @@
+# -*- coding: utf-8 -*-
+"""
+像素格式转换引擎性能对比
+比较 SDK 转换（SdkConversionEngine）和 NumPy/OpenCV 转换引擎（含分条并行）
+在各像素格式、分辨率下的耗时，为每种相机型号选择最快的引擎
+"""
+import sys
+import os
+import argparse
+
+# 添加父目录到路径
+current_dir = os.path.dirname(os.path.abspath(__file__))
+parent_dir = os.path.dirname(current_dir)
+parent_parent_dir = os.path.dirname(parent_dir)
+if parent_dir not in sys.path:
+    sys.path.insert(0, parent_dir)
+if parent_parent_dir not in sys.path:
+    sys.path.insert(0, parent_parent_dir)
+
+# 导入 HikCv 模块
+import HikCv
+
+
+PIXEL_TYPES = [
+    HikCv.PixelType_Gvsp_BayerRG8,
+    HikCv.PixelType_Gvsp_BayerRG12,
+    HikCv.PixelType_Gvsp_BayerRG12_Packed,
+    HikCv.PixelType_Gvsp_YUV422_Packed,
+    HikCv.PixelType_Gvsp_YUV422_YUYV_Packed,
+    HikCv.PixelType_Gvsp_Mono8,
+]
+
+SIZES = [(1280, 1024), (2448, 2048), (4096, 3000)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="像素格式转换引擎性能对比")
+    parser.add_argument("--camera", type=int, default=None, help="相机索引，指定时加入 SDK 引擎对比")
+    parser.add_argument("--strips", type=int, nargs="+", default=[1, 2, 4], help="NumPy 引擎的分条数")
+    parser.add_argument("--repeat", type=int, default=10)
+    args = parser.parse_args()
+
+    engines = [HikCv.NumpyConversionEngine(strips=n) for n in args.strips]
+
+    cam = None
+    if args.camera is not None:
+        # SDK 转换需要设备句柄，但不需要采集
+        cam = HikCv.HikCamera(args.camera, auto_start=False)
+        if cam.isOpened():
+            engines.insert(0, HikCv.SdkConversionEngine(cam))
+        else:
+            print("相机打开失败，只测试 NumPy 引擎")
+
+    try:
+        HikCv.benchmark_conversion(engines, PIXEL_TYPES, sizes=SIZES, repeat=args.repeat)
+    finally:
+        for engine in engines:
+            engine.close()
+        if cam is not None:
+            cam.release()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+# -*- coding: utf-8 -*-
+"""
+高位深解包性能测试
+不需要连接相机，用随机数据测试 12/10 位 Packed 解包和 16 位去马赛克的耗时，
+判断能否跟上 500 万像素 12 位相机的满帧率
+"""
+import sys
+import os
+import time
+import argparse
+import numpy as np
+
+# 添加父目录到路径
+current_dir = os.path.dirname(os.path.abspath(__file__))
+parent_dir = os.path.dirname(current_dir)
+parent_parent_dir = os.path.dirname(parent_dir)
+if parent_dir not in sys.path:
+    sys.path.insert(0, parent_dir)
+if parent_parent_dir not in sys.path:
+    sys.path.insert(0, parent_parent_dir)
+
+# 导入 HikCv 模块
+import HikCv
+
+
+def bench(name, func, repeat, target_fps):
+    """运行 func repeat 次并打印平均耗时和可达帧率"""
+    func()  # 预热
+    t0 = time.perf_counter()
+    for _ in range(repeat):
+        func()
+    ms = (time.perf_counter() - t0) / repeat * 1000
+    fps = 1000.0 / ms if ms > 0 else float('inf')
+    status = "✓" if fps >= target_fps else "✗"
+    print(f"  {status} {name:<36s} {ms:8.2f} ms  {fps:8.1f} fps")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="高位深解包性能测试")
+    parser.add_argument("--width", type=int, default=2448)
+    parser.add_argument("--height", type=int, default=2048)
+    parser.add_argument("--fps", type=float, default=35.0, help="相机满帧率（判断是否跟得上）")
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    width, height = args.width, args.height
+    print(f"图像尺寸: {width}x{height} ({width * height / 1e6:.1f} MP), 目标帧率: {args.fps} fps")
+
+    rng = np.random.default_rng(0)
+    packed = rng.integers(0, 256, width * height * 3 // 2, dtype=np.uint8)
+    out = np.empty((height, width), dtype=np.uint16)
+    mono16 = rng.integers(0, 4096, width * height, dtype=np.uint16)
+
+    info12 = {'width': width, 'height': height, 'pixel_type': HikCv.PixelType_Gvsp_BayerRG12_Packed}
+    info16 = {'width': width, 'height': height, 'pixel_type': HikCv.PixelType_Gvsp_BayerRG12}
+
+    print("\n解包:")
+    bench("unpack_12bit_packed", lambda: HikCv.unpack_12bit_packed(packed, width, height), args.repeat, args.fps)
+    bench("unpack_12bit_packed (复用输出)", lambda: HikCv.unpack_12bit_packed(packed, width, height, out),
+          args.repeat, args.fps)
+    bench("unpack_10bit_packed (复用输出)", lambda: HikCv.unpack_10bit_packed(packed, width, height, out),
+          args.repeat, args.fps)
+    bench("unpack_raw BayerRG12 (非 Packed)", lambda: HikCv.unpack_raw(mono16.view(np.uint8), info16, out),
+          args.repeat, args.fps)
+
+    print("\n16 位去马赛克:")
+    bench("OUTPUT_BGR16 BayerRG12_Packed", lambda: HikCv._convert_native(packed, info12, HikCv.OUTPUT_BGR16),
+          args.repeat, args.fps)
+    bench("demosaic (纯 NumPy)", lambda: HikCv.demosaic(out, 'RG'), max(args.repeat // 4, 1), args.fps)
+
+
+if __name__ == "__main__":
+    main()